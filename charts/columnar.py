@@ -0,0 +1,36 @@
+# charts/columnar.py
+import numpy as np
+
+def to_list(values):
+    """Convert a float array to a JSON-ready list, with None in place of NaN."""
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    if not missing.any():
+        # tolist() converts in C; only arrays with gaps need the slower object path
+        return values.tolist()
+    return np.where(missing, None, values).tolist()
+
+def to_int_list(values):
+    """Convert a numeric array to a list of ints, with None in place of NaN."""
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    if not missing.any():
+        return values.astype(np.int64).tolist()
+    return np.where(missing, None, np.nan_to_num(values).astype(np.int64)).tolist()
+
+def epoch_ms(index):
+    """Convert a DatetimeIndex to epoch milliseconds."""
+    if len(index) == 0:
+        return []
+    return index.as_unit('ms').asi8.tolist()
+
+def price_columns(hist):
+    """Build parallel OHLCV arrays straight from a price history DataFrame."""
+    return {
+        't': epoch_ms(hist.index),
+        'open': to_list(hist['Open']),
+        'high': to_list(hist['High']),
+        'low': to_list(hist['Low']),
+        'close': to_list(hist['Close']),
+        'volume': to_int_list(hist['Volume']),
+    }
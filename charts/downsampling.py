@@ -0,0 +1,105 @@
+# charts/downsampling.py
+import numpy as np
+import pandas as pd
+from stock_data.profiling import phase
+
+MIN_POINTS = 3
+DOWNSAMPLE_MODES = ('ohlc', 'lttb')
+
+def parse_max_points(value):
+    """Parse the max_points request parameter, returning None when it is not set.
+
+    Raises ValueError on anything but an integer of at least MIN_POINTS.
+    """
+    if not value:
+        return None
+    try:
+        max_points = int(value)
+    except ValueError:
+        raise ValueError("max_points must be an integer")
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_POINTS}")
+    return max_points
+
+def time_positions(index):
+    """Bar positions along the time axis, so gaps like weekends count as distance."""
+    if isinstance(index, pd.DatetimeIndex) and len(index):
+        stamps = index.asi8
+        return (stamps - stamps[0]).astype(float)
+    return np.arange(len(index), dtype=float)
+
+def lttb_indices(y, max_points, x=None):
+    """Pick at most max_points row indices with largest-triangle-three-buckets.
+
+    The first and last rows are always kept. Each bucket in between keeps the
+    row forming the largest triangle with the previously kept row and the
+    average of the next bucket, which preserves peaks and troughs.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if max_points is None or max_points >= n:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    # A missing value must not win a bucket, so carry the neighbouring close over it
+    y = np.nan_to_num(pd.Series(y).ffill().bfill().to_numpy())
+
+    # max_points - 2 buckets between the fixed first and last rows
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    sizes = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / sizes
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / sizes
+
+    selected = np.empty(max_points, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 1 < len(sizes):
+            cx, cy = avg_x[i + 1], avg_y[i + 1]
+        else:
+            cx, cy = x[-1], y[-1]
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def bucket_ohlc(hist, max_points):
+    """Aggregate consecutive bars into at most max_points candles.
+
+    Each candle opens at its first bar, closes at its last, spans the highest
+    high and lowest low, and sums the volume.
+    """
+    n = len(hist)
+    if max_points is None or max_points >= n:
+        return hist
+
+    starts = np.linspace(0, n, max_points, endpoint=False).astype(int)
+    ends = np.append(starts[1:], n) - 1
+    volume = np.add.reduceat(np.nan_to_num(hist['Volume'].to_numpy(dtype=float)), starts)
+
+    candles = pd.DataFrame({
+        'Open': hist['Open'].to_numpy(dtype=float)[starts],
+        # fmax/fmin ignore a missing bar instead of spreading NaN to the whole candle
+        'High': np.fmax.reduceat(hist['High'].to_numpy(dtype=float), starts),
+        'Low': np.fmin.reduceat(hist['Low'].to_numpy(dtype=float), starts),
+        'Close': hist['Close'].to_numpy(dtype=float)[ends],
+        'Volume': volume,
+    }, index=hist.index[starts])
+    candles.attrs = dict(hist.attrs)
+    return candles
+
+def close_indices(hist, max_points):
+    """LTTB row indices of a price history, chosen on its close over time."""
+    return lttb_indices(hist['Close'], max_points, x=time_positions(hist.index))
+
+@phase('pandas')
+def downsample_history(hist, max_points, mode='ohlc'):
+    """Reduce a price history to at most max_points rows for charting."""
+    if max_points is None or len(hist) <= max_points:
+        return hist
+    if mode == 'lttb':
+        return hist.iloc[close_indices(hist, max_points)]
+    return bucket_ohlc(hist, max_points)
@@ -0,0 +1,225 @@
+# charts/indicators.py
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from stock_data.profiling import phase
+
+from .columnar import to_list
+
+MAX_WINDOW = 1000
+MAX_INDICATORS = 20
+
+class IndicatorSpec(namedtuple('IndicatorSpec', ['kind', 'params'])):
+    """One indicator to compute, e.g. ('sma', (50,)) or ('macd', (12, 26, 9))."""
+
+    @property
+    def label(self):
+        """Column label, e.g. SMA50, RSI14, MACD12_26_9, BB20_2."""
+        prefix = 'BB' if self.kind == 'bollinger' else self.kind.upper()
+        return prefix + '_'.join(f'{param:g}' for param in self.params)
+
+# Indicator sets computed for the single-indicator selector on the technical chart page
+DEFAULT_INDICATORS = {
+    'sma': [IndicatorSpec('sma', (20,)), IndicatorSpec('sma', (50,)), IndicatorSpec('sma', (200,))],
+    'ema': [IndicatorSpec('ema', (12,)), IndicatorSpec('ema', (26,))],
+    'rsi': [IndicatorSpec('rsi', (14,))],
+    'macd': [IndicatorSpec('macd', (12, 26, 9))],
+    'bollinger': [IndicatorSpec('bollinger', (20, 2))],
+}
+
+PARAM_COUNTS = {'sma': 1, 'ema': 1, 'rsi': 1, 'macd': 3, 'bollinger': 2}
+
+def parse_indicators(value):
+    """Parse a request value like 'sma:20,sma:50,rsi,macd:12:26:9,bollinger:20:2'.
+
+    A bare name expands to that indicator's default set. Raises ValueError on
+    unknown indicators or bad parameters.
+    """
+    specs = []
+    for item in value.split(','):
+        parts = item.strip().lower().split(':')
+        kind, params = parts[0], parts[1:]
+        if not kind:
+            continue
+        if kind not in PARAM_COUNTS:
+            raise ValueError(f"Unknown indicator '{kind}'")
+
+        if not params:
+            specs.extend(DEFAULT_INDICATORS[kind])
+            continue
+
+        if len(params) != PARAM_COUNTS[kind]:
+            raise ValueError(f"'{kind}' takes {PARAM_COUNTS[kind]} parameter(s)")
+        try:
+            numbers = tuple(float(param) if kind == 'bollinger' and i == 1 else int(param)
+                            for i, param in enumerate(params))
+        except ValueError:
+            raise ValueError(f"Invalid parameters for '{kind}'")
+        if any(number <= 0 or number > MAX_WINDOW for number in numbers):
+            raise ValueError(f"Parameters for '{kind}' must be between 1 and {MAX_WINDOW}")
+        specs.append(IndicatorSpec(kind, numbers))
+
+    # Drop duplicates but keep the requested order
+    specs = list(dict.fromkeys(specs))
+    if len(specs) > MAX_INDICATORS:
+        raise ValueError(f"At most {MAX_INDICATORS} indicators can be requested at once")
+    return specs
+
+def _empty(n):
+    return np.full(n, np.nan)
+
+class _RollingSums:
+    """Cumulative sums of a series and its squares, shared by every rolling window.
+
+    Missing values are left out of the sums and counted, so a window holding
+    one is NaN, as pandas rolling gives, without blanking every later window.
+    """
+
+    def __init__(self, values):
+        valid = ~np.isnan(values)
+        # Shifting by the first value keeps the sums small, so variances stay precise
+        self.offset = values[valid][0] if valid.any() else 0.0
+        shifted = np.where(valid, values - self.offset, 0.0)
+        self.sums = np.concatenate(([0.0], np.cumsum(shifted)))
+        self.squares = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+        self.counts = np.concatenate(([0], np.cumsum(valid)))
+        self.n = len(values)
+
+    def _full(self, window):
+        """Whether each window ending at or after window - 1 holds window values."""
+        return self.counts[window:] - self.counts[:-window] == window
+
+    def mean(self, window):
+        """Rolling mean, NaN until the window is full."""
+        out = _empty(self.n)
+        if window <= self.n:
+            mean = (self.sums[window:] - self.sums[:-window]) / window + self.offset
+            out[window - 1:] = np.where(self._full(window), mean, np.nan)
+        return out
+
+    def std(self, window):
+        """Rolling sample standard deviation (ddof=1, as pandas uses)."""
+        out = _empty(self.n)
+        if 1 < window <= self.n:
+            total = self.sums[window:] - self.sums[:-window]
+            squares = self.squares[window:] - self.squares[:-window]
+            variance = (squares - total * total / window) / (window - 1)
+            out[window - 1:] = np.where(self._full(window), np.sqrt(np.clip(variance, 0, None)), np.nan)
+        return out
+
+def _ema(values, span):
+    """Exponential moving average with adjust=False, matching the chart's existing EMAs."""
+    # The recurrence runs in pandas' compiled ewm rather than a Python loop
+    return pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+@phase('pandas')
+def compute_indicators(close, specs):
+    """Compute every requested indicator over a close price array in one pass.
+
+    Returns a dict keyed by spec label. Each value is a dict of component
+    arrays aligned with close, with NaN where the indicator is undefined.
+    Indicators that need more bars than are available come back all NaN.
+    """
+    close = np.asarray(close, dtype=float)
+    n = len(close)
+    rolling = _RollingSums(close)
+    emas = {}
+    gains = None
+    results = {}
+
+    def ema(span):
+        if span not in emas:
+            emas[span] = _ema(close, span)
+        return emas[span]
+
+    for spec in specs:
+        kind, params = spec.kind, spec.params
+
+        if kind == 'sma':
+            results[spec.label] = {'value': rolling.mean(params[0])}
+
+        elif kind == 'ema':
+            window = params[0]
+            results[spec.label] = {'value': ema(window) if n >= window else _empty(n)}
+
+        elif kind == 'rsi':
+            window = params[0]
+            value = _empty(n)
+            if n > window:
+                if gains is None:
+                    delta = np.diff(close)
+                    gains = (_RollingSums(np.clip(delta, 0, None)), _RollingSums(np.clip(-delta, 0, None)))
+                # Simple moving averages of gains and losses; the first bar has no change
+                avg_gain = gains[0].mean(window)
+                avg_loss = gains[1].mean(window)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    value[1:] = 100 - 100 / (1 + avg_gain / avg_loss)
+            results[spec.label] = {'value': value}
+
+        elif kind == 'macd':
+            fast, slow, signal_span = params
+            if n >= max(fast, slow):
+                line = ema(fast) - ema(slow)
+                signal = _ema(line, signal_span)
+                results[spec.label] = {'value': line, 'signal': signal, 'histogram': line - signal}
+            else:
+                results[spec.label] = {'value': _empty(n), 'signal': _empty(n), 'histogram': _empty(n)}
+
+        elif kind == 'bollinger':
+            window, width = params
+            middle = rolling.mean(window)
+            band = rolling.std(window) * width
+            results[spec.label] = {'middle': middle, 'upper': middle + band, 'lower': middle - band}
+
+    return results
+
+# Point type and fields of the per-point format the technical chart template reads
+LEGACY_FIELDS = {
+    'sma': ('value',),
+    'ema': ('value',),
+    'rsi': ('value',),
+    'macd': ('value', 'signal'),
+    'bollinger': ('middle', 'upper', 'lower'),
+}
+
+def _legacy_type(spec):
+    if spec.kind in ('sma', 'ema'):
+        return spec.label
+    return {'rsi': 'RSI', 'macd': 'MACD', 'bollinger': 'Bollinger'}[spec.kind]
+
+def to_point_list(dates, specs, results):
+    """Convert computed columns to the per-point list format used by the chart template."""
+    points = []
+    for spec in specs:
+        columns = results[spec.label]
+        fields = LEGACY_FIELDS[spec.kind]
+        point_type = _legacy_type(spec)
+
+        valid = np.ones(len(dates), dtype=bool)
+        for field in fields:
+            valid &= ~np.isnan(columns[field])
+        rows = np.flatnonzero(valid)
+
+        values = [columns[field][rows].tolist() for field in fields]
+        for i, row in enumerate(rows):
+            point = {'type': point_type, 'date': dates[row]}
+            for field, column in zip(fields, values):
+                point[field] = column[i]
+            points.append(point)
+    return points
+
+def take_rows(results, rows):
+    """Keep only the given row positions of every computed column."""
+    return {
+        label: {field: values[rows] for field, values in columns.items()}
+        for label, columns in results.items()
+    }
+
+def to_columns(results):
+    """Convert computed columns to JSON-ready lists, with None where undefined."""
+    return {
+        label: {field: to_list(values) for field, values in columns.items()}
+        for label, columns in results.items()
+    }
@@ -0,0 +1,175 @@
+# charts/management/commands/benchmark_indicators.py
+import time
+
+import numpy as np
+import pandas as pd
+from charts.indicators import DEFAULT_INDICATORS, compute_indicators, to_columns, to_point_list
+from django.core.management.base import BaseCommand
+
+
+def legacy_indicator_data(hist, indicator):
+    """The per-element loop technical_data_json used before the indicator engine."""
+    indicator_data = []
+
+    if indicator == 'sma':
+        # Simple Moving Average with 20, 50, 200 day periods
+        sma_periods = [20, 50, 200]
+
+        for period in sma_periods:
+            if len(hist) >= period:
+                sma = hist['Close'].rolling(window=period).mean()
+
+                for date, value in sma.items():
+                    if not pd.isna(value):
+                        indicator_data.append({
+                            'type': f'SMA{period}',
+                            'date': date.strftime('%Y-%m-%d'),
+                            'value': float(value)
+                        })
+
+    elif indicator == 'ema':
+        # Exponential Moving Average with 12, 26 day periods
+        ema_periods = [12, 26]
+
+        for period in ema_periods:
+            if len(hist) >= period:
+                ema = hist['Close'].ewm(span=period, adjust=False).mean()
+
+                for date, value in ema.items():
+                    if not pd.isna(value):
+                        indicator_data.append({
+                            'type': f'EMA{period}',
+                            'date': date.strftime('%Y-%m-%d'),
+                            'value': float(value)
+                        })
+
+    elif indicator == 'rsi':
+        # Relative Strength Index (14-day period)
+        if len(hist) >= 15:  # Need at least 15 data points for 14-day RSI
+            delta = hist['Close'].diff()
+            gain = delta.clip(lower=0)
+            loss = -delta.clip(upper=0)
+
+            avg_gain = gain.rolling(window=14).mean()
+            avg_loss = loss.rolling(window=14).mean()
+
+            rs = avg_gain / avg_loss
+            rsi = 100 - (100 / (1 + rs))
+
+            for date, value in rsi.items():
+                if not pd.isna(value):
+                    indicator_data.append({
+                        'type': 'RSI',
+                        'date': date.strftime('%Y-%m-%d'),
+                        'value': float(value)
+                    })
+
+    elif indicator == 'macd':
+        # MACD (12-day EMA - 26-day EMA), with 9-day EMA signal line
+        if len(hist) >= 26:
+            ema12 = hist['Close'].ewm(span=12, adjust=False).mean()
+            ema26 = hist['Close'].ewm(span=26, adjust=False).mean()
+            macd_line = ema12 - ema26
+            signal_line = macd_line.ewm(span=9, adjust=False).mean()
+
+            for date in macd_line.index:
+                if not pd.isna(macd_line[date]) and not pd.isna(signal_line[date]):
+                    indicator_data.append({
+                        'type': 'MACD',
+                        'date': date.strftime('%Y-%m-%d'),
+                        'value': float(macd_line[date]),
+                        'signal': float(signal_line[date])
+                    })
+
+    elif indicator == 'bollinger':
+        # Bollinger Bands (20-day SMA with 2 standard deviations)
+        if len(hist) >= 20:
+            sma20 = hist['Close'].rolling(window=20).mean()
+            std20 = hist['Close'].rolling(window=20).std()
+
+            upper_band = sma20 + (std20 * 2)
+            lower_band = sma20 - (std20 * 2)
+
+            for date in sma20.index:
+                if not pd.isna(sma20[date]) and not pd.isna(upper_band[date]) and not pd.isna(lower_band[date]):
+                    indicator_data.append({
+                        'type': 'Bollinger',
+                        'date': date.strftime('%Y-%m-%d'),
+                        'middle': float(sma20[date]),
+                        'upper': float(upper_band[date]),
+                        'lower': float(lower_band[date])
+                    })
+    
+    return indicator_data
+
+def synthetic_history(years, seed=0):
+    """Build a random-walk daily bar history covering the given number of years."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=252 * years, tz='America/New_York')
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(dates))))
+    return pd.DataFrame({'Close': close}, index=dates)
+
+def best_of(repeat, func):
+    """Return the fastest of several timed runs, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+class Command(BaseCommand):
+    help = 'Benchmark the technical indicator engine against the previous per-element implementation'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years',
+            type=int,
+            default=12,
+            help='Years of synthetic daily bars to compute indicators over',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per measurement; the fastest is reported',
+        )
+
+    def handle(self, *args, **options):
+        hist = synthetic_history(options['years'])
+        repeat = options['repeat']
+        close = hist['Close'].to_numpy()
+        dates = hist.index.strftime('%Y-%m-%d').tolist()
+        
+        self.stdout.write(f"{len(hist)} daily bars ({options['years']} years), best of {repeat} runs")
+        
+        # Check the engine reproduces the old output before timing anything
+        for indicator, specs in DEFAULT_INDICATORS.items():
+            expected = legacy_indicator_data(hist, indicator)
+            actual = to_point_list(dates, specs, compute_indicators(close, specs))
+            if len(expected) != len(actual):
+                self.stdout.write(self.style.ERROR(f"{indicator}: {len(actual)} points, expected {len(expected)}"))
+                return
+            worst = max(
+                (abs(a[key] - e[key]) for a, e in zip(actual, expected) for key in e if key not in ('type', 'date')),
+                default=0.0,
+            )
+            self.stdout.write(f"{indicator}: {len(actual)} points match (max abs difference {worst:.2e})")
+        
+        self.stdout.write('')
+        self.stdout.write(f"{'Indicator':<12}{'Legacy':>12}{'Engine':>12}{'Speedup':>10}")
+        legacy_total = 0.0
+        for indicator, specs in DEFAULT_INDICATORS.items():
+            legacy = best_of(repeat, lambda: legacy_indicator_data(hist, indicator))
+            engine = best_of(repeat, lambda: to_point_list(dates, specs, compute_indicators(close, specs)))
+            legacy_total += legacy
+            self.stdout.write(f"{indicator:<12}{legacy * 1000:>10.2f}ms{engine * 1000:>10.2f}ms{legacy / engine:>9.1f}x")
+        
+        # Everything the page can show, in a single request and a single pass
+        all_specs = [spec for specs in DEFAULT_INDICATORS.values() for spec in specs]
+        combined = best_of(repeat, lambda: to_columns(compute_indicators(close, all_specs)))
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"All {len(all_specs)} indicators: {legacy_total * 1000:.2f}ms across five legacy requests, "
+            f"{combined * 1000:.2f}ms in one columnar pass ({legacy_total / combined:.1f}x)"
+        ))
\ No newline at end of file
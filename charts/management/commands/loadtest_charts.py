@@ -0,0 +1,141 @@
+# charts/management/commands/loadtest_charts.py
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from stock_data.popularity import flush_access_counts
+
+DEFAULT_TICKERS = ['AAPL', 'MSFT', 'GOOGL', 'META', 'AMZN', 'NVDA', 'TSLA', 'JPM']
+
+def request_mix(tickers):
+    """The chart API requests a page full of charts would make, for every ticker."""
+    urls = []
+    for ticker in tickers:
+        urls += [
+            f'/charts/api/price/{ticker}/?period=ytd&interval=1d',
+            f'/charts/api/financials/{ticker}/?metric=revenue',
+            f'/charts/api/technical/{ticker}/?period=6mo',
+        ]
+    urls.append(f"/charts/api/comparison/?tickers={','.join(tickers)}&metric=pe_ratio")
+    return urls
+
+def p95(values):
+    return statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]
+
+class Command(BaseCommand):
+    help = (
+        'Load test the chart APIs against live upstream data, served by one sync worker '
+        'and then by one event loop, each starting from an empty throwaway database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tickers',
+            nargs='*',
+            default=DEFAULT_TICKERS,
+            help='Tickers to request charts for',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=16,
+            help='Requests kept in flight on the event loop',
+        )
+        parser.add_argument(
+            '--async-only',
+            action='store_true',
+            help='Skip the sync baseline',
+        )
+
+    def handle(self, *args, **options):
+        # Never touch the real database: every fetched row goes to a disposable one
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                # Executor threads write concurrently, which an in-memory database locks out
+                connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'loadtest.sqlite3')
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            setup_test_environment()
+            try:
+                self.run(options)
+            finally:
+                # Otherwise the access counts are flushed at exit, into the real database
+                flush_access_counts()
+                teardown_test_environment()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def reset(self):
+        """Empty the store and caches so each run fetches everything from upstream."""
+        call_command('flush', interactive=False, verbosity=0)
+        for cache in caches.all():
+            cache.clear()
+
+    def run(self, options):
+        urls = request_mix([ticker.upper() for ticker in options['tickers']])
+        self.stdout.write(f"{len(urls)} requests for {len(options['tickers'])} tickers, cold store")
+        self.stdout.write('')
+        self.stdout.write(f"{'Mode':<24}{'Wall':>9}{'Req/s':>8}{'Median':>10}{'p95':>10}{'Upstream':>10}{'Errors':>8}")
+
+        results = {}
+        if not options['async_only']:
+            self.reset()
+            results['sync'] = self.report('sync, 1 worker', self.run_sync(urls))
+
+        self.reset()
+        label = f"async, {options['concurrency']} in flight"
+        results['async'] = self.report(label, asyncio.run(self.run_async(urls, options['concurrency'])))
+
+        if 'sync' in results:
+            self.stdout.write('')
+            self.stdout.write(self.style.SUCCESS(
+                f"One event loop finished {results['sync'] / results['async']:.1f}x faster than one sync worker."
+            ))
+
+    def run_sync(self, urls):
+        """Serve the requests one after another, as a single sync worker would."""
+        client = Client()
+        timings = []
+        started = time.perf_counter()
+        for url in urls:
+            request_started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - request_started, response))
+        return time.perf_counter() - started, timings
+
+    async def run_async(self, urls, concurrency):
+        """Serve the requests on one event loop with up to concurrency in flight."""
+        queue = asyncio.Queue()
+        for url in urls:
+            queue.put_nowait(url)
+        timings = []
+
+        async def worker():
+            client = AsyncClient()
+            while not queue.empty():
+                url = queue.get_nowait()
+                request_started = time.perf_counter()
+                response = await client.get(url)
+                timings.append((time.perf_counter() - request_started, response))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(urls)))))
+        return time.perf_counter() - started, timings
+
+    def report(self, label, outcome):
+        wall, timings = outcome
+        latencies = [seconds * 1000 for seconds, _ in timings]
+        upstream = sum(int(response.get('X-Upstream-Calls', 0)) for _, response in timings)
+        errors = sum(response.status_code >= 500 for _, response in timings)
+        self.stdout.write(
+            f"{label:<24}{wall:>8.2f}s{len(timings) / wall:>8.1f}"
+            f"{statistics.median(latencies):>8.0f}ms{p95(latencies):>8.0f}ms{upstream:>10}{errors:>8}"
+        )
+        return wall
@@ -1,3 +1,141 @@
-from django.test import TestCase
+# charts/tests.py
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .columnar import to_int_list, to_list
+from .downsampling import lttb_indices, time_positions
+from .indicators import compute_indicators, parse_indicators
+
+
+class LttbTests(SimpleTestCase):
+    def test_short_series_are_kept_whole(self):
+        np.testing.assert_array_equal(lttb_indices([1, 2, 3], 5), [0, 1, 2])
+        np.testing.assert_array_equal(lttb_indices([1, 2, 3], None), [0, 1, 2])
+
+    def test_keeps_first_and_last_within_max_points(self):
+        y = np.sin(np.linspace(0, 20, 1000))
+        for max_points in (3, 10, 99, 999):
+            with self.subTest(max_points=max_points):
+                indices = lttb_indices(y, max_points)
+                self.assertEqual(len(indices), max_points)
+                self.assertEqual(indices[0], 0)
+                self.assertEqual(indices[-1], 999)
+                self.assertTrue((np.diff(indices) > 0).all())
+
+    def test_keeps_peaks_and_troughs(self):
+        y = np.zeros(500)
+        y[137] = 50
+        y[311] = -50
+        indices = lttb_indices(y, 20)
+        self.assertIn(137, indices)
+        self.assertIn(311, indices)
+
+    def test_missing_values_do_not_hide_spikes(self):
+        y = np.ones(200)
+        y[48:53] = np.nan
+        y[120] = 10
+        indices = lttb_indices(y, 10)
+        self.assertEqual(len(indices), 10)
+        self.assertIn(120, indices)
+
+    def test_time_positions_count_gaps(self):
+        index = pd.DatetimeIndex(['2024-01-05', '2024-01-08', '2024-01-09'], tz='UTC')
+        positions = time_positions(index)
+        self.assertEqual(positions[0], 0)
+        # The weekend makes the first step three times as long as the second
+        self.assertEqual(positions[1] / (positions[2] - positions[1]), 3)
+
+
+class IndicatorTests(SimpleTestCase):
+    """The vectorized engine must give what the chart's pandas rolling and ewm code gave."""
+
+    def pandas_indicators(self, close):
+        close = pd.Series(close)
+        delta = close.diff()
+        gain = delta.clip(lower=0).rolling(window=14).mean()
+        loss = (-delta.clip(upper=0)).rolling(window=14).mean()
+        macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        signal = macd.ewm(span=9, adjust=False).mean()
+        middle, std = close.rolling(window=20).mean(), close.rolling(window=20).std()
+        return {
+            'SMA5': {'value': close.rolling(window=5).mean()},
+            'SMA20': {'value': close.rolling(window=20).mean()},
+            'EMA12': {'value': close.ewm(span=12, adjust=False).mean()},
+            'RSI14': {'value': 100 - (100 / (1 + gain / loss))},
+            'MACD12_26_9': {'value': macd, 'signal': signal, 'histogram': macd - signal},
+            'BB20_2': {'middle': middle, 'upper': middle + 2 * std, 'lower': middle - 2 * std},
+        }
+
+    def assertMatchesPandas(self, close):
+        specs = parse_indicators('sma:5,sma:20,ema:12,rsi:14,macd:12:26:9,bollinger:20:2')
+        results = compute_indicators(close, specs)
+        for label, columns in self.pandas_indicators(close).items():
+            for field, expected in columns.items():
+                with self.subTest(label=label, field=field):
+                    np.testing.assert_allclose(results[label][field], expected.to_numpy(), rtol=1e-9, atol=1e-9, equal_nan=True)
+
+    def test_matches_pandas(self):
+        rng = np.random.default_rng(0)
+        self.assertMatchesPandas(150 + np.cumsum(rng.normal(0, 2, 300)))
+
+    def test_missing_close_only_blanks_the_windows_holding_it(self):
+        rng = np.random.default_rng(1)
+        close = 100 + np.cumsum(rng.normal(0, 1, 59))
+        close[5] = np.nan
+        self.assertMatchesPandas(close)
+
+        sma = compute_indicators(close, parse_indicators('sma:5'))['SMA5']['value']
+        self.assertEqual(np.isnan(sma).sum(), 9)
+        rsi = compute_indicators(close, parse_indicators('rsi:14'))['RSI14']['value']
+        self.assertFalse(np.isnan(rsi[-10:]).any())
+
+    def test_missing_first_close(self):
+        close = np.arange(1.0, 31.0)
+        close[0] = np.nan
+        self.assertMatchesPandas(close)
+
+    def test_too_few_bars_come_back_empty(self):
+        results = compute_indicators(np.arange(10.0), parse_indicators('sma:20,rsi:14,bollinger:20:2'))
+        self.assertTrue(all(np.isnan(values).all() for columns in results.values() for values in columns.values()))
+
+
+def price_frame(days):
+    index = pd.date_range('2024-01-02', periods=days, freq='D', tz='America/New_York', name='Date')
+    close = 100 + np.arange(days, dtype=float)
+    return pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close, 'Volume': 1000 + np.arange(days)}, index=index)
+
+
+class ColumnarTests(TestCase):
+    """The columnar format carries the same values as the per-bar rows."""
+
+    def get(self, name, **params):
+        # Requests made by tests are kept out of the popularity counts
+        with mock.patch('charts.views.get_price_history', return_value=price_frame(40)), \
+                mock.patch('stock_data.popularity.record_access'):
+            return self.client.get(reverse(f'charts:{name}', args=['KO']), params).json()
+
+    def test_missing_values_become_none(self):
+        self.assertEqual(to_list(np.array([1.5, np.nan, 2.0])), [1.5, None, 2.0])
+        self.assertEqual(to_int_list(np.array([1.0, np.nan])), [1, None])
+        self.assertIsInstance(to_int_list(np.array([3.0]))[0], int)
+
+    def test_price_columns_match_rows(self):
+        rows = self.get('price_data')['data']
+        columns = self.get('price_data', format='columnar')
+        self.assertEqual(columns['format'], 'columnar')
+        self.assertEqual(columns['t'], [row['date'] for row in rows])
+        for field in ('open', 'high', 'low', 'close', 'volume'):
+            self.assertEqual(columns[field], [row[field] for row in rows])
+
+    def test_technical_columns_align_with_prices(self):
+        columns = self.get('technical_data', format='columnar', indicators='sma:5,macd:12:26:9')
+        self.assertEqual(columns['indicators'], ['SMA5', 'MACD12_26_9'])
+        self.assertEqual(len(columns['columns']['SMA5']['value']), len(columns['t']))
+        # Undefined until the window is full
+        self.assertEqual(columns['columns']['SMA5']['value'][:4], [None] * 4)
+        self.assertEqual(columns['columns']['SMA5']['value'][4], 102.0)
+        self.assertEqual(sorted(columns['columns']['MACD12_26_9']), ['histogram', 'signal', 'value'])
@@ -1,16 +1,66 @@
 # charts/views.py
+import asyncio
 import json
 import logging
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
 from django.http import JsonResponse
 from django.shortcuts import render
-from stock_data.utils import get_company_data
+from stock_data.http_cache import STATEMENT_MAX_AGE, conditional_view
+from stock_data.popularity import track_access
+from stock_data.prices import DEFAULT_REFRESH_AFTER, REFRESH_AFTER, get_price_histories, get_price_history, stored_as_of
+from stock_data.profiling import phase
+from stock_data.statements import get_statement, statements_as_of
+from stock_data.upstream import gather_parallel, get_info, run_async
+from stock_data.utils import company_as_of, get_companies_data, get_company_data
+
+from .columnar import price_columns
+from .downsampling import DOWNSAMPLE_MODES, close_indices, downsample_history, lttb_indices, parse_max_points, time_positions
+from .indicators import DEFAULT_INDICATORS, compute_indicators, parse_indicators, take_rows, to_columns, to_point_list
 
 logger = logging.getLogger(__name__)
 
+def _tickers(request):
+    return [t.strip().upper() for t in request.GET.get('tickers', '').split(',') if t.strip()]
+
+def _company_state(request, ticker):
+    return company_as_of(ticker.upper())
+
+def _comparison_page_state(request):
+    # Same default tickers as comparison_chart
+    tickers = _tickers(request) or ['AAPL', 'MSFT', 'GOOGL', 'META', 'AMZN']
+    states = [company_as_of(ticker) for ticker in tickers]
+    return None if None in states else [timestamp for state in states for timestamp in state]
+
+def _price_state(request, ticker):
+    return [stored_as_of(ticker.upper(), request.GET.get('period', 'ytd'), request.GET.get('interval', '1d'))]
+
+def _price_max_age(request, ticker=None):
+    # Bars can only change once the store would fetch the tail again
+    return REFRESH_AFTER.get(request.GET.get('interval', '1d'), DEFAULT_REFRESH_AFTER).total_seconds()
+
+def _statement_period(request):
+    return 'annual' if request.GET.get('period', 'annual') == 'annual' else 'quarterly'
+
+def _financial_state(request, ticker):
+    return statements_as_of(ticker.upper(), _statement_period(request))
+
+def _comparison_state(request):
+    metric = request.GET.get('metric', 'price_ytd')
+    if metric == 'price_ytd':
+        return [stored_as_of(ticker, 'ytd', '1d') for ticker in _tickers(request)]
+    if metric == 'revenue_growth':
+        states = [statements_as_of(ticker, 'annual', ('income',)) for ticker in _tickers(request)]
+        return None if None in states else [timestamp for state in states for timestamp in state]
+    # Info metrics are read from upstream on every request
+    return None
+
+def _technical_state(request, ticker):
+    return [stored_as_of(ticker.upper(), request.GET.get('period', '6mo'), '1d')]
+
+@conditional_view(_company_state)
 def stock_price_chart(request, ticker):
     """Render a page with interactive stock price chart."""
     ticker = ticker.upper()
@@ -37,18 +87,41 @@ def stock_price_chart(request, ticker):
         'default_range': 'ytd'
     })
 
-def price_data_json(request, ticker):
+@track_access()
+@conditional_view(_price_state, max_age=_price_max_age)
+async def price_data_json(request, ticker):
     """Return JSON data for stock price chart."""
     ticker = ticker.upper()
     
     # Get time range parameters
     period = request.GET.get('period', 'ytd')
     interval = request.GET.get('interval', '1d')
+    columnar = request.GET.get('format') == 'columnar'
+    # Candles are merged into buckets by default; lttb keeps real bars for line charts
+    downsample = request.GET.get('downsample', 'ohlc')
+    
+    try:
+        max_points = parse_max_points(request.GET.get('max_points'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if downsample not in DOWNSAMPLE_MODES:
+        return JsonResponse({'error': f"downsample must be one of {', '.join(DOWNSAMPLE_MODES)}"}, status=400)
     
     try:
-        # Fetch data using yfinance
-        ticker_obj = yf.Ticker(ticker)
-        hist = ticker_obj.history(period=period, interval=interval)
+        # Read bars from the local store, fetching only the missing tail
+        hist = await run_async(get_price_history, ticker, period=period, interval=interval)
+        hist = downsample_history(hist, max_points, mode=downsample)
+        
+        if columnar:
+            # Parallel arrays with epoch ms timestamps instead of one object per bar
+            return JsonResponse({
+                'ticker': ticker,
+                'period': period,
+                'interval': interval,
+                'as_of': hist.attrs.get('as_of'),
+                'format': 'columnar',
+                **price_columns(hist),
+            })
         
         # Format data for chart
         data = []
@@ -69,13 +142,15 @@ def price_data_json(request, ticker):
             'ticker': ticker,
             'data': data,
             'period': period,
-            'interval': interval
+            'interval': interval,
+            'as_of': hist.attrs.get('as_of'),
         })
         
     except Exception as e:
         logger.error(f"Error fetching price data for {ticker}: {e}")
         return JsonResponse({'error': str(e)}, status=500)
 
+@conditional_view(_company_state)
 def financial_chart(request, ticker):
     """Render a page with financial metric charts."""
     ticker = ticker.upper()
@@ -103,24 +178,23 @@ def financial_chart(request, ticker):
         'default_metric': 'revenue'
     })
 
-def financial_data_json(request, ticker):
+@track_access()
+@conditional_view(_financial_state, max_age=lambda request, ticker: STATEMENT_MAX_AGE[_statement_period(request)])
+async def financial_data_json(request, ticker):
     """Return JSON data for financial metric charts."""
     ticker = ticker.upper()
     metric = request.GET.get('metric', 'revenue')
     period = request.GET.get('period', 'annual')
     
     try:
-        ticker_obj = yf.Ticker(ticker)
-        
         # Get appropriate financial statements based on metric
-        if period == 'annual':
-            income_stmt = ticker_obj.income_stmt
-            balance_sheet = ticker_obj.balance_sheet
-            cash_flow = ticker_obj.cashflow
-        else:  # quarterly
-            income_stmt = ticker_obj.quarterly_income_stmt
-            balance_sheet = ticker_obj.quarterly_balance_sheet
-            cash_flow = ticker_obj.quarterly_cashflow
+        period_type = 'annual' if period == 'annual' else 'quarterly'
+        # The three statements are stored and fetched independently, so wait on them together
+        income_stmt, balance_sheet, cash_flow = await asyncio.gather(
+            run_async(get_statement, ticker, 'income', period_type),
+            run_async(get_statement, ticker, 'balance', period_type),
+            run_async(get_statement, ticker, 'cashflow', period_type),
+        )
         
         # Map metric to dataframe and field
         metric_mapping = {
@@ -216,21 +290,18 @@ def financial_data_json(request, ticker):
         logger.error(f"Error fetching financial data for {ticker}: {e}")
         return JsonResponse({'error': str(e)}, status=500)
 
+@conditional_view(_comparison_page_state)
 def comparison_chart(request):
     """Render a page with peer comparison charts."""
-    tickers = request.GET.get('tickers', '')
-    tickers = [t.strip().upper() for t in tickers.split(',') if t.strip()]
+    tickers = _tickers(request)
     
     if not tickers:
         # Default to some large tech companies
         tickers = ['AAPL', 'MSFT', 'GOOGL', 'META', 'AMZN']
     
-    # Get company data for each ticker
-    companies = []
-    for ticker in tickers:
-        company = get_company_data(ticker)
-        if company:
-            companies.append(company)
+    # Fetched for every ticker at once, then stored in one write
+    found = get_companies_data(tickers)
+    companies = [found[ticker] for ticker in tickers if found.get(ticker)]
     
     # Available metrics for dropdown
     metrics = [
@@ -249,15 +320,80 @@ def comparison_chart(request):
         'default_metric': 'price_ytd'
     })
 
-def comparison_data_json(request):
+# Single-value comparison metrics read from the info dict, with the factor to display them in
+INFO_METRICS = {
+    'market_cap': ('marketCap', 1),
+    'pe_ratio': ('trailingPE', 1),
+    'profit_margin': ('profitMargins', 100),  # Convert to percentage
+    'dividend_yield': ('dividendYield', 100),  # Convert to percentage
+}
+
+def _ytd_changes(tickers, max_points=None):
+    """Return each ticker's YTD percentage change, aligned on a common date index."""
+    return _changes_since_start(get_price_histories(tickers, period='ytd'), max_points)
+
+@phase('pandas')
+def _changes_since_start(histories, max_points):
+    closes = pd.DataFrame({
+        # Compare by trading date, whatever the exchange's timezone
+        ticker: pd.Series(hist['Close'].to_numpy(dtype=float), index=hist.index.tz_localize(None).normalize())
+        for ticker, hist in histories.items()
+        if not hist.empty
+    })
+    if closes.empty:
+        return {}
+    
+    # A ticker without a bar on another exchange's session keeps its previous close
+    closes = closes.sort_index().ffill()
+    start_prices = closes.bfill().iloc[0]
+    changes = (closes - start_prices) / start_prices * 100
+    dates = closes.index.strftime('%Y-%m-%d')
+    positions = time_positions(closes.index)
+    
+    data = {}
+    for ticker in changes.columns:
+        values = changes[ticker].to_numpy()
+        rows = np.flatnonzero(~np.isnan(values))
+        if max_points is not None:
+            rows = rows[lttb_indices(values[rows], max_points, x=positions[rows])]
+        data[ticker] = [
+            {'date': dates[row], 'value': value}
+            for row, value in zip(rows.tolist(), values[rows].tolist())
+        ]
+    return data
+
+def _revenue_growth(ticker):
+    """Return year-over-year revenue growth points for a ticker."""
+    income_stmt = get_statement(ticker, 'income')
+    growth_values = []
+    
+    if 'Total Revenue' in income_stmt.index and len(income_stmt.columns) >= 2:
+        revenues = income_stmt.loc['Total Revenue']
+        for i in range(len(revenues) - 1):
+            if revenues.iloc[i+1] > 0:  # Avoid division by zero
+                growth = ((revenues.iloc[i] - revenues.iloc[i+1]) / revenues.iloc[i+1]) * 100
+                growth_values.append({
+                    'date': revenues.index[i].strftime('%Y-%m-%d'),
+                    'value': float(growth)
+                })
+    
+    return growth_values
+
+@track_access(lambda request: _tickers(request))
+@conditional_view(_comparison_state, max_age=_price_max_age)
+async def comparison_data_json(request):
     """Return JSON data for company comparison charts."""
-    tickers = request.GET.get('tickers', '')
-    tickers = [t.strip().upper() for t in tickers.split(',') if t.strip()]
+    tickers = _tickers(request)
     metric = request.GET.get('metric', 'price_ytd')
     
     if not tickers:
         return JsonResponse({'error': 'No tickers provided'}, status=400)
     
+    try:
+        max_points = parse_max_points(request.GET.get('max_points'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
     try:
         # Prepare result container
         result = {
@@ -265,82 +401,35 @@ def comparison_data_json(request):
             'data': {}
         }
         
-        for ticker in tickers:
-            ticker_obj = yf.Ticker(ticker)
-            
-            if metric == 'price_ytd':
-                # Get YTD price performance
-                hist = ticker_obj.history(period='ytd')
-                if not hist.empty:
-                    start_price = hist.iloc[0]['Close']
-                    prices = []
-                    
-                    for date, row in hist.iterrows():
-                        price = row['Close']
-                        change_pct = ((price - start_price) / start_price) * 100
-                        prices.append({
-                            'date': date.strftime('%Y-%m-%d'),
-                            'value': float(change_pct)
-                        })
-                    
-                    result['data'][ticker] = prices
-            
-            elif metric == 'market_cap':
-                # For metrics that are single values, we'll compare current values
-                info = ticker_obj.info
-                if 'marketCap' in info:
-                    result['data'][ticker] = [{
-                        'label': ticker,
-                        'value': info['marketCap']
-                    }]
-            
-            elif metric == 'pe_ratio':
-                info = ticker_obj.info
-                if 'trailingPE' in info:
-                    result['data'][ticker] = [{
-                        'label': ticker,
-                        'value': info['trailingPE']
-                    }]
-            
-            elif metric == 'revenue_growth':
-                # Calculate year-over-year revenue growth
-                income_stmt = ticker_obj.income_stmt
-                if 'Total Revenue' in income_stmt.index and len(income_stmt.columns) >= 2:
-                    revenues = income_stmt.loc['Total Revenue']
-                    growth_values = []
-                    
-                    for i in range(len(revenues) - 1):
-                        if revenues.iloc[i+1] > 0:  # Avoid division by zero
-                            growth = ((revenues.iloc[i] - revenues.iloc[i+1]) / revenues.iloc[i+1]) * 100
-                            growth_values.append({
-                                'date': revenues.index[i].strftime('%Y-%m-%d'),
-                                'value': float(growth)
-                            })
-                    
-                    result['data'][ticker] = growth_values
-            
-            elif metric == 'profit_margin':
-                info = ticker_obj.info
-                if 'profitMargins' in info:
-                    result['data'][ticker] = [{
-                        'label': ticker,
-                        'value': info['profitMargins'] * 100  # Convert to percentage
-                    }]
-            
-            elif metric == 'dividend_yield':
-                info = ticker_obj.info
-                if 'dividendYield' in info:
+        if metric == 'price_ytd':
+            # One batched download for every ticker's prices
+            result['data'] = await run_async(_ytd_changes, tickers, max_points)
+        
+        elif metric in INFO_METRICS:
+            # Fundamentals are fetched concurrently, so the slowest ticker sets the latency
+            key, scale = INFO_METRICS[metric]
+            infos = await gather_parallel(get_info, tickers)
+            for ticker in tickers:
+                value = (infos.get(ticker) or {}).get(key)
+                if value is not None:
                     result['data'][ticker] = [{
                         'label': ticker,
-                        'value': info['dividendYield'] * 100  # Convert to percentage
+                        'value': value * scale
                     }]
         
+        elif metric == 'revenue_growth':
+            growth = await gather_parallel(_revenue_growth, tickers)
+            for ticker in tickers:
+                if growth.get(ticker):
+                    result['data'][ticker] = growth[ticker]
+        
         return JsonResponse(result)
         
     except Exception as e:
         logger.error(f"Error fetching comparison data: {e}")
         return JsonResponse({'error': str(e)}, status=500)
 
+@conditional_view(_company_state)
 def technical_chart(request, ticker):
     """Render a page with technical analysis chart."""
     ticker = ticker.upper()
@@ -376,15 +465,54 @@ def technical_chart(request, ticker):
         'default_indicator': 'sma'
     })
 
-def technical_data_json(request, ticker):
+@track_access()
+@conditional_view(_technical_state, max_age=_price_max_age)
+async def technical_data_json(request, ticker):
     """Return JSON data for technical analysis chart."""
     ticker = ticker.upper()
     indicator = request.GET.get('indicator', 'sma')
+    requested = request.GET.get('indicators')
     period = request.GET.get('period', '6mo')
+    columnar = request.GET.get('format') == 'columnar'
+    
+    if requested:
+        # Any set of indicators, e.g. ?indicators=sma:20,sma:100,rsi:14,bollinger:20:2
+        try:
+            specs = parse_indicators(requested)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    else:
+        specs = DEFAULT_INDICATORS.get(indicator, [])
+    
+    try:
+        max_points = parse_max_points(request.GET.get('max_points'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
     try:
-        ticker_obj = yf.Ticker(ticker)
-        hist = ticker_obj.history(period=period)
+        hist = await run_async(get_price_history, ticker, period=period)
+        
+        # Calculate all requested indicators in one pass over the close prices
+        results = compute_indicators(hist['Close'].to_numpy(dtype=float), specs)
+        
+        if max_points is not None and len(hist) > max_points:
+            # Indicators are computed on every bar, then thinned at the rows kept for the close
+            rows = close_indices(hist, max_points)
+            hist = hist.iloc[rows]
+            results = take_rows(results, rows)
+        
+        if columnar:
+            # Prices and every indicator component as arrays aligned on t
+            return JsonResponse({
+                'ticker': ticker,
+                'indicator': indicator,
+                'period': period,
+                'as_of': hist.attrs.get('as_of'),
+                'format': 'columnar',
+                **price_columns(hist),
+                'indicators': [spec.label for spec in specs],
+                'columns': to_columns(results),
+            })
         
         # Prepare price data
         price_data = []
@@ -398,105 +526,25 @@ def technical_data_json(request, ticker):
                 'volume': int(row['Volume'])
             })
         
-        # Calculate indicator data
-        indicator_data = []
+        dates = hist.index.strftime('%Y-%m-%d').tolist()
         
-        if indicator == 'sma':
-            # Simple Moving Average with 20, 50, 200 day periods
-            sma_periods = [20, 50, 200]
-            
-            for period in sma_periods:
-                if len(hist) >= period:
-                    sma = hist['Close'].rolling(window=period).mean()
-                    
-                    for date, value in sma.items():
-                        if not pd.isna(value):
-                            indicator_data.append({
-                                'type': f'SMA{period}',
-                                'date': date.strftime('%Y-%m-%d'),
-                                'value': float(value)
-                            })
-        
-        elif indicator == 'ema':
-            # Exponential Moving Average with 12, 26 day periods
-            ema_periods = [12, 26]
-            
-            for period in ema_periods:
-                if len(hist) >= period:
-                    ema = hist['Close'].ewm(span=period, adjust=False).mean()
-                    
-                    for date, value in ema.items():
-                        if not pd.isna(value):
-                            indicator_data.append({
-                                'type': f'EMA{period}',
-                                'date': date.strftime('%Y-%m-%d'),
-                                'value': float(value)
-                            })
-        
-        elif indicator == 'rsi':
-            # Relative Strength Index (14-day period)
-            if len(hist) >= 15:  # Need at least 15 data points for 14-day RSI
-                delta = hist['Close'].diff()
-                gain = delta.clip(lower=0)
-                loss = -delta.clip(upper=0)
-                
-                avg_gain = gain.rolling(window=14).mean()
-                avg_loss = loss.rolling(window=14).mean()
-                
-                rs = avg_gain / avg_loss
-                rsi = 100 - (100 / (1 + rs))
-                
-                for date, value in rsi.items():
-                    if not pd.isna(value):
-                        indicator_data.append({
-                            'type': 'RSI',
-                            'date': date.strftime('%Y-%m-%d'),
-                            'value': float(value)
-                        })
-        
-        elif indicator == 'macd':
-            # MACD (12-day EMA - 26-day EMA), with 9-day EMA signal line
-            if len(hist) >= 26:
-                ema12 = hist['Close'].ewm(span=12, adjust=False).mean()
-                ema26 = hist['Close'].ewm(span=26, adjust=False).mean()
-                macd_line = ema12 - ema26
-                signal_line = macd_line.ewm(span=9, adjust=False).mean()
-                
-                for date in macd_line.index:
-                    if not pd.isna(macd_line[date]) and not pd.isna(signal_line[date]):
-                        indicator_data.append({
-                            'type': 'MACD',
-                            'date': date.strftime('%Y-%m-%d'),
-                            'value': float(macd_line[date]),
-                            'signal': float(signal_line[date])
-                        })
-        
-        elif indicator == 'bollinger':
-            # Bollinger Bands (20-day SMA with 2 standard deviations)
-            if len(hist) >= 20:
-                sma20 = hist['Close'].rolling(window=20).mean()
-                std20 = hist['Close'].rolling(window=20).std()
-                
-                upper_band = sma20 + (std20 * 2)
-                lower_band = sma20 - (std20 * 2)
-                
-                for date in sma20.index:
-                    if not pd.isna(sma20[date]) and not pd.isna(upper_band[date]) and not pd.isna(lower_band[date]):
-                        indicator_data.append({
-                            'type': 'Bollinger',
-                            'date': date.strftime('%Y-%m-%d'),
-                            'middle': float(sma20[date]),
-                            'upper': float(upper_band[date]),
-                            'lower': float(lower_band[date])
-                        })
-        
-        return JsonResponse({
+        response = {
             'ticker': ticker,
             'indicator': indicator,
             'period': period,
             'price_data': price_data,
-            'indicator_data': indicator_data
-        })
+            'as_of': hist.attrs.get('as_of'),
+        }
+        
+        if requested:
+            # Aligned columns: one array per indicator component, indexed like dates
+            response['indicators'] = [spec.label for spec in specs]
+            response['dates'] = dates
+            response['indicator_columns'] = to_columns(results)
+        else:
+            response['indicator_data'] = to_point_list(dates, specs, results)
+        
+        return JsonResponse(response)
         
     except Exception as e:
         logger.error(f"Error fetching technical data for {ticker}: {e}")
@@ -1,3 +1,52 @@
-from django.test import TestCase
+# company_profiles/tests.py
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from stock_data.company_cache import invalidate_company
+from stock_data.models import Company, FinancialData
+
+
+@mock.patch('stock_data.popularity.record_access')
+class CompanyDetailTests(TransactionTestCase):
+    """A company page whose payloads are cached waits on nothing upstream."""
+
+    def setUp(self):
+        cache.clear()
+        company = Company.objects.create(ticker='KO', name='Coca-Cola', sector='Consumer Defensive')
+        FinancialData.objects.create(company=company, market_cap=10**11)
+
+        patches = {
+            'get_info': mock.Mock(return_value={'companyOfficers': [{'name': 'James Quincey'}]}),
+            'get_price_history': mock.Mock(return_value=pd.DataFrame({'Close': [60.0]}, index=pd.DatetimeIndex(['2024-01-02']))),
+            'get_statement': mock.Mock(return_value=pd.DataFrame()),
+            'get_dividends': mock.Mock(return_value=pd.Series(dtype=float)),
+        }
+        for name, patched in patches.items():
+            self.enterContext(mock.patch(f'company_profiles.views.{name}', patched))
+        self.upstream = patches
+
+    def get(self):
+        response = self.client.get(reverse('company_profiles:detail', args=['KO']))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_cached_page_makes_no_upstream_calls(self, record_access):
+        self.assertEqual(self.get().context['peers'], [{'name': 'James Quincey'}])
+        calls = {name: patched.call_count for name, patched in self.upstream.items()}
+        self.get()
+        self.assertEqual({name: patched.call_count for name, patched in self.upstream.items()}, calls)
+
+        # Refreshing the company rebuilds the payloads
+        invalidate_company(['KO'])
+        self.get()
+        self.assertEqual(self.upstream['get_info'].call_count, 2)
+
+    def test_failed_officers_lookup_is_not_cached(self, record_access):
+        self.upstream['get_info'].side_effect = [RuntimeError('upstream unavailable'), {'companyOfficers': []}]
+        self.assertEqual(self.get().context['peers'], [])
+        self.get()
+        self.assertEqual(self.upstream['get_info'].call_count, 2)
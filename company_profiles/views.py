@@ -1,46 +1,97 @@
 # company_profiles/views.py
+import asyncio
 import json
 import logging
 
 import pandas as pd
-import yfinance as yf
+from django.db.models import Max
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from stock_data.models import Company, FinancialData
-from stock_data.utils import get_company_data
+from stock_data.aggregates import get_sector_context
+from stock_data.company_cache import Uncached, aget_company_payloads
+from stock_data.http_cache import conditional_view
+from stock_data.models import Company, FinancialData, SectorAggregate
+from stock_data.peers import get_peers
+from stock_data.popularity import track_access
+from stock_data.prices import REFRESH_AFTER, get_price_history, stored_as_of
+from stock_data.profiling import phase
+from stock_data.statements import get_statement, statements_as_of
+from stock_data.upstream import get_dividends, get_info, run_async
+from stock_data.utils import company_as_of, get_company_data
 
 logger = logging.getLogger(__name__)
 
-def company_detail(request, ticker):
-    """Display detailed company profile and financial information."""
-    ticker = ticker.upper()  # Ensure ticker is uppercase
-    company = get_company_data(ticker)
+# Metrics shown against the company's sector, in display order
+SECTOR_COMPARISON_METRICS = [
+    ('market_cap', 'Market Cap'),
+    ('pe_ratio', 'P/E Ratio'),
+    ('ps_ratio', 'P/S Ratio'),
+    ('pb_ratio', 'P/B Ratio'),
+    ('ev_ebitda', 'EV/EBITDA'),
+    ('fcf_yield', 'FCF Yield'),
+    ('quality_score', 'Quality Score'),
+    ('profit_margin', 'Profit Margin'),
+    ('operating_margin', 'Operating Margin'),
+    ('dividend_yield', 'Dividend Yield'),
+]
+
+def _company_state(request, ticker):
+    return company_as_of(ticker.upper())
+
+def _financials_state(request, ticker):
+    ticker = ticker.upper()
+    company, statements = company_as_of(ticker), statements_as_of(ticker)
+    if company is None or statements is None:
+        return None
+    return company + statements
+
+def _detail_state(request, ticker):
+    ticker = ticker.upper()
+    state = _financials_state(request, ticker)
+    if not state:
+        return None
     
-    if not company:
-        # Company not found
-        return render(request, 'company_profiles/company_not_found.html', {
-            'ticker': ticker
-        })
+    # Sector percentiles move when other companies in the sector refresh
+    sector_updated = (
+        SectorAggregate.objects
+        .filter(group_type='sector', group__in=Company.objects.filter(ticker=ticker).values('sector'))
+        .aggregate(Max('last_updated'))['last_updated__max']
+    )
+    return state + [stored_as_of(ticker, 'ytd', '1d')] + ([sector_updated] if sector_updated else [])
+
+def _peers_state(request, ticker):
+    ticker = ticker.upper()
+    state = company_as_of(ticker)
+    if not state:
+        return None
     
-    try:
-        # Get historical price data for charts
-        ticker_obj = yf.Ticker(ticker)
-        
-        # YTD price history for chart
-        hist_ytd = ticker_obj.history(period="ytd")
+    # Peer figures change when any peer is refreshed, and the group when its industry changes
+    peers_updated = (
+        FinancialData.objects.filter(company__peer_of__company_id=ticker)
+        .aggregate(Max('last_updated'))['last_updated__max']
+    )
+    group_updated = Company.objects.filter(ticker=ticker).values_list('peers_updated', flat=True).first()
+    return state + [timestamp for timestamp in (peers_updated, group_updated) if timestamp]
+
+def _price_data(ticker):
+    """YTD closes for the price chart, as JSON."""
+    hist_ytd = get_price_history(ticker, period="ytd")
+    with phase('pandas'):
         price_data = []
         for date, row in hist_ytd.iterrows():
             price_data.append({
                 'date': date.strftime('%Y-%m-%d'),
                 'price': round(float(row['Close']), 2)
             })
-        
-        # Get historical financial data for charts
-        income_stmt = ticker_obj.income_stmt
-        balance_sheet = ticker_obj.balance_sheet
-        cash_flow = ticker_obj.cashflow
-        
-        # Calculate growth metrics
+    return json.dumps(price_data)
+
+def _financial_history(ticker):
+    """Annual statement figures for the growth charts, as JSON."""
+    income_stmt = get_statement(ticker, 'income')
+    balance_sheet = get_statement(ticker, 'balance')
+    cash_flow = get_statement(ticker, 'cashflow')
+    
+    with phase('pandas'):
         financial_history = {
             'years': [col.strftime('%Y') for col in income_stmt.columns],
             'revenue': [float(income_stmt.loc['Total Revenue', col]) if 'Total Revenue' in income_stmt.index else 0 for col in income_stmt.columns],
@@ -51,36 +102,93 @@ def company_detail(request, ticker):
             'cash': [float(balance_sheet.loc['Cash And Cash Equivalents', col]) if 'Cash And Cash Equivalents' in balance_sheet.index else 0 for col in balance_sheet.columns],
             'debt': [float(balance_sheet.loc['Total Debt', col]) if 'Total Debt' in balance_sheet.index else 0 for col in balance_sheet.columns],
         }
-        
-        # Get dividend history
-        dividends = ticker_obj.dividends
+    
+    if any(stmt.attrs.get('fetch_failed') for stmt in (income_stmt, balance_sheet, cash_flow)):
+        # Built from a missing or outdated statement, so build it again next time
+        return Uncached(json.dumps(financial_history))
+    return json.dumps(financial_history)
+
+def _dividend_data(ticker):
+    """Dividend history for the dividend chart, as JSON."""
+    dividends = get_dividends(ticker)
+    with phase('pandas'):
         dividend_data = []
         for date, value in dividends.items():
             dividend_data.append({
                 'date': date.strftime('%Y-%m-%d'),
                 'dividend': float(value)
             })
+    return json.dumps(dividend_data)
+
+def _officers(ticker):
+    """The first few company officers, for the people section."""
+    try:
+        return get_info(ticker).get('companyOfficers', [])[:5]
+    except Exception as e:
+        logger.error(f"Error fetching officers for {ticker}: {e}")
+        return Uncached([])
+
+def company_payload_builders(ticker):
+    """The company page's cached payloads, as builders for get_company_payloads."""
+    return {
+        'price_data': (lambda: _price_data(ticker), REFRESH_AFTER['1d'].total_seconds()),
+        'financial_history': (lambda: _financial_history(ticker), None),
+        'dividend_data': (lambda: _dividend_data(ticker), None),
+        'officers': (lambda: _officers(ticker), None),
+    }
+
+@track_access()
+@conditional_view(_detail_state)
+async def company_detail(request, ticker):
+    """Display detailed company profile and financial information."""
+    ticker = ticker.upper()  # Ensure ticker is uppercase
+    company = await run_async(get_company_data, ticker)
+    
+    if not company:
+        # Company not found
+        return await run_async(render, request, 'company_profiles/company_not_found.html', {
+            'ticker': ticker
+        })
+    
+    try:
+        # Payloads are cached per ticker until the company is refreshed, so a cached
+        # page waits on nothing upstream; the missing ones and the sector context are gathered together
+        payloads, sector_context = await asyncio.gather(
+            aget_company_payloads(ticker, company_payload_builders(ticker)),
+            run_async(get_sector_context, company),
+        )
         
         # Peers comparison
-        peers = ticker_obj.info.get('companyOfficers', [])[:5]  # Use a different field as needed
+        peers = payloads['officers']  # Use a different field as needed
         # In a real implementation, you'd get actual peers
         
-        return render(request, 'company_profiles/company_detail.html', {
+        # Percentile ranks within the sector, read from the precomputed aggregates
+        sector_stats = sector_context.get('sector', {})
+        sector_comparison = [
+            {'label': label, **sector_stats[metric]}
+            for metric, label in SECTOR_COMPARISON_METRICS
+            if metric in sector_stats and sector_stats[metric]['percentile'] is not None
+        ]
+        
+        # Context processors read the session and user, so rendering stays off the event loop
+        return await run_async(render, request, 'company_profiles/company_detail.html', {
             'company': company,
-            'financial_history': json.dumps(financial_history),
-            'price_data': json.dumps(price_data),
-            'dividend_data': json.dumps(dividend_data),
+            'financial_history': payloads['financial_history'],
+            'price_data': payloads['price_data'],
+            'dividend_data': payloads['dividend_data'],
             'peers': peers,
+            'sector_comparison': sector_comparison,
         })
         
     except Exception as e:
         logger.error(f"Error rendering company detail for {ticker}: {e}")
         # Still show the company page but with error message
-        return render(request, 'company_profiles/company_detail.html', {
+        return await run_async(render, request, 'company_profiles/company_detail.html', {
             'company': company,
             'error': str(e)
         })
 
+@conditional_view(_financials_state)
 def company_financials(request, ticker):
     """Display detailed financial statements for a company."""
     ticker = ticker.upper()
@@ -90,11 +198,9 @@ def company_financials(request, ticker):
         return redirect('core:home')
     
     try:
-        ticker_obj = yf.Ticker(ticker)
-        
-        income_stmt = ticker_obj.income_stmt.fillna(0)
-        balance_sheet = ticker_obj.balance_sheet.fillna(0)
-        cash_flow = ticker_obj.cashflow.fillna(0)
+        income_stmt = get_statement(ticker, 'income').fillna(0)
+        balance_sheet = get_statement(ticker, 'balance').fillna(0)
+        cash_flow = get_statement(ticker, 'cashflow').fillna(0)
         
         # Format financial statements for template
         income_data = []
@@ -132,6 +238,7 @@ def company_financials(request, ticker):
             'error': f"Could not load financial statements: {str(e)}"
         })
 
+@conditional_view(_peers_state)
 def company_peers(request, ticker):
     """Compare company with its peers."""
     ticker = ticker.upper()
@@ -141,23 +248,9 @@ def company_peers(request, ticker):
         return redirect('core:home')
     
     try:
-        ticker_obj = yf.Ticker(ticker)
-        
-        # Get sector/industry peers
-        sector = company.sector
-        industry = company.industry
-        
-        if sector:
-            # In a real implementation, you would query companies with the same sector
-            # Here's a simple mockup
-            peer_tickers = ['AAPL', 'MSFT', 'GOOGL', 'META', 'AMZN']
-            peers = []
-            
-            for peer_ticker in peer_tickers:
-                if peer_ticker != ticker:
-                    peer_company = get_company_data(peer_ticker)
-                    if peer_company:
-                        peers.append(peer_company)
+        if company.sector:
+            # Industry and sector peers closest in market cap, precomputed at refresh time
+            peers = get_peers(company)
             
             # Prepare comparison metrics
             metrics = [
@@ -209,6 +302,7 @@ def company_peers(request, ticker):
             'error': f"Could not load peer comparison: {str(e)}"
         })
 
+@conditional_view(_company_state)
 def company_news(request, ticker):
     """Display latest news for a company."""
     ticker = ticker.upper()
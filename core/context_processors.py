@@ -1,10 +1,18 @@
+from stock_data.popularity import popular_companies as most_requested
+
+# Shown until enough companies have been requested to fill the list
+FEATURED_COMPANIES = [
+    ('AAPL', 'Apple Inc.'),
+    ('MSFT', 'Microsoft Corp.'),
+    ('GOOGL', 'Alphabet Inc.'),
+    ('AMZN', 'Amazon.com Inc.'),
+    ('META', 'Meta Platforms Inc.'),
+]
+
 def popular_companies(request):
-    companies = [
-        ('AAPL', 'Apple Inc.'),
-        ('MSFT', 'Microsoft Corp.'),
-        ('GOOGL', 'Alphabet Inc.'),
-        ('AMZN', 'Amazon.com Inc.'),
-        ('META', 'Meta Platforms Inc.'),
-    ]
+    companies = most_requested(len(FEATURED_COMPANIES))
     
-    return {'popular_companies': companies}
\ No newline at end of file
+    tickers = {ticker for ticker, _ in companies}
+    companies += [company for company in FEATURED_COMPANIES if company[0] not in tickers]
+    
+    return {'popular_companies': companies[:len(FEATURED_COMPANIES)]}
@@ -1,21 +1,57 @@
 # stock_data/admin.py
 from django.contrib import admin
 
-from .models import Company, FinancialData, SearchResult
+from .models import Company, CompanyPeer, FinancialData, FinancialStatement, PriceSeries, RefreshLease, SearchResult, SectorAggregate, TickerAccess
 
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
-    list_display = ('ticker', 'name', 'sector', 'country', 'last_updated')
+    list_display = ('ticker', 'name', 'exchange', 'sector', 'country', 'last_updated')
     search_fields = ('ticker', 'name')
-    list_filter = ('sector', 'country')
+    list_filter = ('exchange', 'sector', 'country')
+
+@admin.register(CompanyPeer)
+class CompanyPeerAdmin(admin.ModelAdmin):
+    list_display = ('company', 'rank', 'peer', 'match')
+    search_fields = ('company__ticker', 'peer__ticker')
+    list_filter = ('match',)
 
 @admin.register(FinancialData)
 class FinancialDataAdmin(admin.ModelAdmin):
     list_display = ('company', 'market_cap', 'current_price', 'pe_ratio', 'quality_score', 'last_updated')
     search_fields = ('company__ticker', 'company__name')
 
+@admin.register(SectorAggregate)
+class SectorAggregateAdmin(admin.ModelAdmin):
+    list_display = ('group', 'group_type', 'metric', 'count', 'q1', 'median', 'q3', 'last_updated')
+    search_fields = ('group',)
+    list_filter = ('group_type', 'metric')
+    exclude = ('sorted_values', 'members')
+
 @admin.register(SearchResult)
 class SearchResultAdmin(admin.ModelAdmin):
-    list_display = ('query', 'last_updated')
-    search_fields = ('query',)
\ No newline at end of file
+    list_display = ('query', 'normalized_query', 'complete', 'last_updated')
+    search_fields = ('query', 'normalized_query')
+    list_filter = ('complete',)
+
+@admin.register(FinancialStatement)
+class FinancialStatementAdmin(admin.ModelAdmin):
+    list_display = ('ticker', 'statement', 'period_type', 'line_item', 'period_end', 'value')
+    search_fields = ('ticker', 'line_item')
+    list_filter = ('statement', 'period_type')
+
+@admin.register(PriceSeries)
+class PriceSeriesAdmin(admin.ModelAdmin):
+    list_display = ('ticker', 'interval', 'start', 'last_fetched')
+    search_fields = ('ticker',)
+    list_filter = ('interval',)
+
+@admin.register(RefreshLease)
+class RefreshLeaseAdmin(admin.ModelAdmin):
+    list_display = ('key', 'owner', 'expires_at')
+    search_fields = ('key',)
+
+@admin.register(TickerAccess)
+class TickerAccessAdmin(admin.ModelAdmin):
+    list_display = ('ticker', 'count', 'score', 'score_updated')
+    search_fields = ('ticker',)
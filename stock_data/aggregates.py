@@ -0,0 +1,194 @@
+# stock_data/aggregates.py
+import bisect
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Company, SectorAggregate
+
+logger = logging.getLogger(__name__)
+
+# Valuation and quality metrics summarized per sector and industry
+AGGREGATE_METRICS = (
+    'market_cap', 'pe_ratio', 'ps_ratio', 'pb_ratio', 'ev_ebitda', 'fcf_yield',
+    'quality_score', 'profit_margin', 'operating_margin', 'dividend_yield',
+)
+GROUP_TYPES = ('sector', 'industry')
+# Tickers per JSON key lookup; each key adds a term to the query
+MEMBER_LOOKUP_BATCH = 100
+
+def _quantile(values, q):
+    """Linearly interpolated quantile of a sorted list, as numpy computes it."""
+    position = (len(values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+def _summarize(aggregate):
+    """Recompute the summary columns from the sorted values."""
+    values = aggregate.sorted_values
+    aggregate.count = len(values)
+    if values:
+        aggregate.percentiles = [_quantile(values, i / 100) for i in range(101)]
+        aggregate.q1, aggregate.median, aggregate.q3 = aggregate.percentiles[25], aggregate.percentiles[50], aggregate.percentiles[75]
+    else:
+        aggregate.percentiles = []
+        aggregate.q1 = aggregate.median = aggregate.q3 = None
+    aggregate.last_updated = timezone.now()
+
+def _remove(aggregate, ticker):
+    value = aggregate.members.pop(ticker, None)
+    if value is not None:
+        del aggregate.sorted_values[bisect.bisect_left(aggregate.sorted_values, value)]
+
+def _add(aggregate, ticker, value):
+    aggregate.members[ticker] = value
+    if value is not None:
+        bisect.insort(aggregate.sorted_values, value)
+
+def _group_filter(groups):
+    """Match the aggregate rows of a set of (group type, group) pairs."""
+    condition = Q(pk__in=[])
+    for group_type in GROUP_TYPES:
+        names = {group for kind, group in groups if kind == group_type}
+        if names:
+            condition |= Q(group_type=group_type, group__in=names)
+    return condition
+
+def update_aggregates(tickers):
+    """Move the given companies' current metrics into their sector and industry aggregates.
+
+    Each company's previous values are taken out of whichever groups hold them,
+    so only the touched groups are rewritten and nothing is rescanned.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return
+
+    fields = ['ticker', *GROUP_TYPES, *(f'financials__{metric}' for metric in AGGREGATE_METRICS)]
+    current = {}
+    for row in Company.objects.filter(ticker__in=tickers, financials__isnull=False).values_list(*fields):
+        groups = {(group_type, group) for group_type, group in zip(GROUP_TYPES, row[1:3]) if group}
+        values = {metric: None if value is None else float(value) for metric, value in zip(AGGREGATE_METRICS, row[3:])}
+        current[row[0]] = (groups, values)
+
+    wanted = {group for groups, _ in current.values() for group in groups}
+
+    with transaction.atomic():
+        aggregates = {
+            (aggregate.group_type, aggregate.group, aggregate.metric): aggregate
+            for aggregate in SectorAggregate.objects.select_for_update().filter(_group_filter(wanted))
+        }
+
+        # Every metric row of a group lists the same members, so one metric tells where a company was
+        first = AGGREGATE_METRICS[0]
+        moved = [
+            ticker for ticker in tickers
+            if ticker not in current or not current[ticker][0] or any(
+                ticker not in getattr(aggregates.get((*group, first)), 'members', {})
+                for group in current[ticker][0]
+            )
+        ]
+        if moved:
+            # New, deleted or regrouped companies; the JSON lookup only runs for them
+            previous = set()
+            for i in range(0, len(moved), MEMBER_LOOKUP_BATCH):
+                previous.update(
+                    SectorAggregate.objects.filter(metric=first, members__has_any_keys=moved[i:i + MEMBER_LOOKUP_BATCH])
+                    .values_list('group_type', 'group')
+                )
+            previous -= wanted
+            if previous:
+                for aggregate in SectorAggregate.objects.select_for_update().filter(_group_filter(previous)):
+                    aggregates[(aggregate.group_type, aggregate.group, aggregate.metric)] = aggregate
+
+        touched = set()
+        for key, aggregate in aggregates.items():
+            if any(ticker in aggregate.members for ticker in tickers):
+                for ticker in tickers:
+                    _remove(aggregate, ticker)
+                touched.add(key)
+
+        for ticker, (groups, values) in current.items():
+            for group_type, group in groups:
+                for metric in AGGREGATE_METRICS:
+                    key = (group_type, group, metric)
+                    if key not in aggregates:
+                        aggregates[key] = SectorAggregate(group_type=group_type, group=group, metric=metric)
+                    _add(aggregates[key], ticker, values[metric])
+                    touched.add(key)
+
+        created, updated, emptied = [], [], []
+        for key in touched:
+            aggregate = aggregates[key]
+            _summarize(aggregate)
+            if not aggregate.members:
+                if aggregate.pk:
+                    emptied.append(aggregate.pk)
+            elif aggregate.pk:
+                updated.append(aggregate)
+            else:
+                created.append(aggregate)
+
+        SectorAggregate.objects.bulk_create(created, batch_size=100)
+        SectorAggregate.objects.bulk_update(
+            updated,
+            ['count', 'median', 'q1', 'q3', 'percentiles', 'sorted_values', 'members', 'last_updated'],
+            batch_size=100,
+        )
+        SectorAggregate.objects.filter(pk__in=emptied).delete()
+
+def rebuild_aggregates():
+    """Recompute every aggregate from scratch, returning how many rows were written."""
+    with transaction.atomic():
+        SectorAggregate.objects.all().delete()
+        update_aggregates(Company.objects.filter(financials__isnull=False).values_list('ticker', flat=True))
+    return SectorAggregate.objects.count()
+
+def percentile_rank(percentiles, value):
+    """Place a value on a group's percentile table, from 0 to 100."""
+    if not percentiles or value is None:
+        return None
+    value = float(value)
+    low = bisect.bisect_left(percentiles, value)
+    high = bisect.bisect_right(percentiles, value)
+    if low < high:
+        # The value sits on one or more breakpoints; ties take the middle of their run
+        return (low + high - 1) / 2
+    if low == 0:
+        return 0.0
+    if low == len(percentiles):
+        return 100.0
+    below, above = percentiles[low - 1], percentiles[low]
+    return low - 1 + (value - below) / (above - below)
+
+def get_sector_context(company):
+    """Return each metric's standing within the company's sector and industry.
+
+    The result maps group type to metric to a dict of group, count, median,
+    quartiles and the company's percentile, read from at most one row per metric
+    and group without touching the full distributions.
+    """
+    financials = getattr(company, 'financials', None)
+    groups = {(group_type, getattr(company, group_type)) for group_type in GROUP_TYPES if getattr(company, group_type)}
+    if financials is None or not groups:
+        return {}
+
+    rows = SectorAggregate.objects.filter(_group_filter(groups), metric__in=AGGREGATE_METRICS).values(
+        'group_type', 'group', 'metric', 'count', 'median', 'q1', 'q3', 'percentiles'
+    )
+
+    context = {}
+    for row in rows:
+        value = getattr(financials, row['metric'])
+        context.setdefault(row['group_type'], {})[row['metric']] = {
+            'group': row['group'],
+            'count': row['count'],
+            'median': row['median'],
+            'q1': row['q1'],
+            'q3': row['q3'],
+            'percentile': percentile_rank(row['percentiles'], value),
+        }
+    return context
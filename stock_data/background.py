@@ -0,0 +1,45 @@
+# stock_data/background.py
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'STOCK_DATA_BACKGROUND_WORKERS', 2),
+    thread_name_prefix='stock-data-background',
+)
+_pending = set()
+_pending_lock = threading.Lock()
+
+def enqueue(key, func, *args, **kwargs):
+    """Run func on the background pool unless a job with the same key is already queued.
+
+    Returns True if the job was queued.
+    """
+    with _pending_lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+
+    _executor.submit(_run, key, func, args, kwargs)
+    return True
+
+def pending_count():
+    """Return the number of queued or running background jobs."""
+    with _pending_lock:
+        return len(_pending)
+
+def _run(key, func, args, kwargs):
+    """Run one background job, logging failures instead of losing them."""
+    try:
+        func(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"Background job {key} failed: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+        connection.close()
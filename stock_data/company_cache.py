@@ -0,0 +1,203 @@
+# stock_data/company_cache.py
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import register_collector
+from .upstream import run_async
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'company'
+# Payloads built from statements and dividends change only when the company is refreshed
+PAYLOAD_TIMEOUT = 6 * 60 * 60
+STATS_KEY = f'{KEY_PREFIX}:stats'
+# Hit and miss counts are added to the shared totals at most this often per process
+STATS_FLUSH_INTERVAL = 10
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+_last_flush = 0.0
+
+class Uncached:
+    """A built payload to serve but not store, such as one built from a failed fetch."""
+
+    def __init__(self, value):
+        self.value = value
+
+def _cache():
+    return caches[getattr(settings, 'STOCK_DATA_CACHE', 'default')]
+
+def _generation_key(ticker):
+    return f'{KEY_PREFIX}:{ticker}:generation'
+
+def _count(outcome, name):
+    """Count a hit or miss locally; counts reach the shared cache in batches."""
+    with _counts_lock:
+        _counts[(outcome, name)] += 1
+    if time.monotonic() - _last_flush >= STATS_FLUSH_INTERVAL:
+        flush_stats()
+
+def flush_stats():
+    """Add this process's hit and miss counts to the totals kept in the cache."""
+    global _last_flush
+
+    with _counts_lock:
+        counts = dict(_counts)
+        _counts.clear()
+        _last_flush = time.monotonic()
+    if not counts:
+        return
+
+    cache = _cache()
+    try:
+        cache.add(f'{STATS_KEY}:since', time.time(), timeout=None)
+        names = cache.get(f'{STATS_KEY}:names', set())
+        if not {name for _, name in counts} <= names:
+            cache.set(f'{STATS_KEY}:names', names | {name for _, name in counts}, timeout=None)
+
+        for (outcome, name), amount in counts.items():
+            key = f'{STATS_KEY}:{outcome}:{name}'
+            cache.add(key, 0, timeout=None)
+            try:
+                cache.incr(key, amount)
+            except ValueError:
+                # Evicted between add and incr; the count starts over
+                cache.set(key, amount, timeout=None)
+    except Exception as e:
+        logger.error(f"Error recording company cache stats: {e}")
+
+def _lookup(ticker, names):
+    """Return each payload's key and the payloads found in the cache, or (None, {}) if it is unreachable."""
+    cache = _cache()
+    try:
+        generation = cache.get(_generation_key(ticker))
+        if generation is None:
+            cache.add(_generation_key(ticker), time.time_ns(), timeout=None)
+            generation = cache.get(_generation_key(ticker))
+        keys = {name: f'{KEY_PREFIX}:{ticker}:{generation}:{name}' for name in names}
+        return keys, cache.get_many(list(keys.values()))
+    except Exception as e:
+        # An unreachable cache only costs the rebuild
+        logger.error(f"Error reading cached payloads for {ticker}: {e}")
+        return None, {}
+
+def _record(ticker, builders, keys, built):
+    """Count hits and misses and store the payloads that had to be built."""
+    if keys is None:
+        return
+    cache = _cache()
+    for name, (_, timeout) in builders.items():
+        if name not in built:
+            _count('hits', name)
+            continue
+        _count('misses', name)
+        if isinstance(built[name], Uncached):
+            # Built again on the next request, when the fetch may succeed
+            continue
+        try:
+            cache.set(keys[name], built[name], timeout=timeout or PAYLOAD_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error caching {name} for {ticker}: {e}")
+
+def _missing(builders, keys, found):
+    return [name for name in builders if keys is None or keys[name] not in found]
+
+def _payloads(builders, keys, found, built):
+    payloads = {}
+    for name in builders:
+        payload = built[name] if name in built else found[keys[name]]
+        payloads[name] = payload.value if isinstance(payload, Uncached) else payload
+    return payloads
+
+def get_company_payloads(ticker, builders):
+    """Return computed payloads for a ticker, building and storing the ones not cached.
+
+    builders maps each payload name to a (build, timeout) pair, where build
+    takes no arguments and timeout is in seconds (None for PAYLOAD_TIMEOUT).
+    A build may wrap its result in Uncached to keep it out of the cache.
+    """
+    keys, found = _lookup(ticker, builders)
+    built = {name: builders[name][0]() for name in _missing(builders, keys, found)}
+    _record(ticker, builders, keys, built)
+    return _payloads(builders, keys, found, built)
+
+async def aget_company_payloads(ticker, builders):
+    """Async get_company_payloads; payloads missing from the cache are built concurrently."""
+    keys, found = await run_async(_lookup, ticker, list(builders))
+    missing = _missing(builders, keys, found)
+    built = dict(zip(missing, await asyncio.gather(*(run_async(builders[name][0]) for name in missing))))
+    await run_async(_record, ticker, builders, keys, built)
+    return _payloads(builders, keys, found, built)
+
+def invalidate_company(tickers):
+    """Drop every cached payload of the given tickers, in this and every process sharing the cache."""
+    tickers = list(tickers)
+    if not tickers:
+        return
+    try:
+        # Moving to a new generation orphans the old keys, which then expire on their own
+        now = time.time_ns()
+        _cache().set_many({_generation_key(ticker): now for ticker in tickers}, timeout=None)
+    except Exception as e:
+        logger.error(f"Error invalidating cached payloads for {', '.join(tickers)}: {e}")
+
+def cache_stats():
+    """Return hits, misses and hit rate per payload and overall since the counters were reset."""
+    flush_stats()
+    cache = _cache()
+    names = sorted(cache.get(f'{STATS_KEY}:names', set()))
+    counts = cache.get_many([f'{STATS_KEY}:{outcome}:{name}' for name in names for outcome in ('hits', 'misses')])
+
+    def summary(hits, misses):
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+
+    payloads = {
+        name: summary(counts.get(f'{STATS_KEY}:hits:{name}', 0), counts.get(f'{STATS_KEY}:misses:{name}', 0))
+        for name in names
+    }
+    return {
+        'since': cache.get(f'{STATS_KEY}:since'),
+        'payloads': payloads,
+        'total': summary(sum(p['hits'] for p in payloads.values()), sum(p['misses'] for p in payloads.values())),
+    }
+
+def reset_cache_stats():
+    """Zero the hit and miss counters."""
+    with _counts_lock:
+        _counts.clear()
+    cache = _cache()
+    names = cache.get(f'{STATS_KEY}:names', set())
+    cache.delete_many(
+        [f'{STATS_KEY}:{outcome}:{name}' for name in names for outcome in ('hits', 'misses')]
+        + [f'{STATS_KEY}:names', f'{STATS_KEY}:since']
+    )
+
+@register_collector
+def _cache_metrics():
+    """Hit and miss totals of every process sharing the cache, for the metrics endpoint."""
+    payloads = cache_stats()['payloads']
+    return [
+        (
+            'stock_data_company_cache_requests_total',
+            'counter',
+            'Company page payload lookups across processes sharing the cache, by payload and outcome.',
+            [
+                ({'payload': name, 'outcome': outcome}, stats[key])
+                for name, stats in payloads.items()
+                for outcome, key in (('hit', 'hits'), ('miss', 'misses'))
+            ],
+        ),
+        (
+            'stock_data_company_cache_hit_ratio',
+            'gauge',
+            'Share of company page payload lookups served from the cache, by payload.',
+            [({'payload': name}, stats['hit_rate']) for name, stats in payloads.items() if stats['hit_rate'] is not None],
+        ),
+    ]
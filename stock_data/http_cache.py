@@ -0,0 +1,80 @@
+# stock_data/http_cache.py
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .upstream import run_async
+
+# Cache-Control lifetimes in seconds for responses without a more specific one
+PAGE_MAX_AGE = 300
+STATEMENT_MAX_AGE = {
+    'annual': 24 * 60 * 60,
+    'quarterly': 6 * 60 * 60,
+}
+
+def _validators(request, timestamps):
+    """Derive an ETag and Last-Modified from the timestamps of the data behind a response."""
+    if not timestamps or any(timestamp is None for timestamp in timestamps):
+        return None, None
+
+    key = '|'.join([request.get_full_path(), *(timestamp.isoformat() for timestamp in timestamps)])
+    return hashlib.sha1(key.encode()).hexdigest(), max(timestamps)
+
+def conditional_view(state, max_age=PAGE_MAX_AGE):
+    """Answer repeat GETs with 304 Not Modified while the stored data behind a view is unchanged.
+
+    state(request, *args, **kwargs) returns the update timestamps of everything
+    the view renders, or None (or a None entry) when the view would fetch fresh
+    data first, in which case the request is served in full. max_age is the
+    Cache-Control lifetime in seconds, or a callable taking the view's arguments.
+    Async views are supported; state then runs on the upstream executor.
+    """
+    def decorator(view):
+        def validators(request, *args, **kwargs):
+            # Computed once per request for both the ETag and Last-Modified checks
+            if not hasattr(request, '_data_validators'):
+                request._data_validators = _validators(request, state(request, *args, **kwargs))
+            return request._data_validators
+
+        conditional = condition(
+            etag_func=lambda request, *args, **kwargs: validators(request, *args, **kwargs)[0],
+            last_modified_func=lambda request, *args, **kwargs: validators(request, *args, **kwargs)[1],
+        )(view)
+
+        def finish(request, response, *args, **kwargs):
+            if response.status_code not in (200, 304):
+                # Errors are not worth revalidating against
+                response.headers.pop('ETag', None)
+                response.headers.pop('Last-Modified', None)
+                return response
+
+            if request.method in ('GET', 'HEAD') and not response.has_header('ETag'):
+                # The view fetched fresh data, so validate the next request against that
+                etag, last_modified = _validators(request, state(request, *args, **kwargs))
+                if etag:
+                    response['ETag'] = quote_etag(etag)
+                    response['Last-Modified'] = http_date(last_modified.timestamp())
+
+            lifetime = max_age(request, *args, **kwargs) if callable(max_age) else max_age
+            patch_cache_control(response, public=True, max_age=int(lifetime))
+            return response
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                # State functions query the database, so they run off the event loop
+                # before condition reads the validators they produce
+                await run_async(validators, request, *args, **kwargs)
+                response = await conditional(request, *args, **kwargs)
+                return await run_async(finish, request, response, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                return finish(request, conditional(request, *args, **kwargs), *args, **kwargs)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,82 @@
+# stock_data/locks.py
+import datetime
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import RefreshLease
+
+logger = logging.getLogger(__name__)
+
+# A lease outlives a crashed holder by at most this long
+LEASE_TTL = datetime.timedelta(seconds=60)
+# How long a caller waits for someone else's refresh before giving up
+LEASE_WAIT = 30
+LEASE_POLL_INTERVAL = 0.2
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+def _local_lock(key):
+    """Return the in-process lock for a key."""
+    with _local_locks_guard:
+        if key not in _local_locks:
+            _local_locks[key] = threading.Lock()
+        return _local_locks[key]
+
+def acquire_lease(key, ttl=LEASE_TTL):
+    """Try once to take the database lease on a key, returning the owner token or None."""
+    owner = uuid.uuid4().hex
+    now = timezone.now()
+
+    try:
+        with transaction.atomic():
+            RefreshLease.objects.create(key=key, owner=owner, expires_at=now + ttl)
+        return owner
+    except IntegrityError:
+        # Take the lease over only if its holder let it expire
+        taken = RefreshLease.objects.filter(key=key, expires_at__lt=now).update(owner=owner, expires_at=now + ttl)
+        return owner if taken else None
+
+def release_lease(key, owner):
+    """Release a lease if it is still held by owner."""
+    RefreshLease.objects.filter(key=key, owner=owner).delete()
+
+@contextmanager
+def single_flight(key, ttl=LEASE_TTL, wait=LEASE_WAIT):
+    """Let one caller at a time run the body for a key, across threads and processes.
+
+    Yields True once this caller holds the key, or False if another holder did
+    not finish within wait seconds. Callers should re-check whether the work is
+    still needed after acquiring, since the previous holder has usually done it.
+    """
+    deadline = time.monotonic() + wait
+    lock = _local_lock(key)
+
+    # Threads of this process queue here, so only one of them polls the database
+    if not lock.acquire(timeout=wait):
+        yield False
+        return
+
+    try:
+        owner = acquire_lease(key, ttl)
+        while owner is None and time.monotonic() < deadline:
+            time.sleep(LEASE_POLL_INTERVAL)
+            owner = acquire_lease(key, ttl)
+
+        if owner is None:
+            logger.warning(f"Gave up waiting for the refresh lease on {key}")
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            release_lease(key, owner)
+    finally:
+        lock.release()
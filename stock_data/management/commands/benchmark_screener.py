@@ -0,0 +1,192 @@
+# stock_data/management/commands/benchmark_screener.py
+import json
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from stock_data.models import Company, FinancialData
+from stock_data.screener import Screen
+from stock_data.views import screener_json
+
+SECTORS = {
+    'Technology': ['Software', 'Semiconductors', 'Hardware', 'IT Services'],
+    'Healthcare': ['Biotechnology', 'Medical Devices', 'Pharmaceuticals'],
+    'Financial Services': ['Banks', 'Insurance', 'Asset Management'],
+    'Energy': ['Oil & Gas', 'Renewables'],
+    'Consumer Cyclical': ['Retail', 'Autos', 'Restaurants', 'Apparel'],
+    'Industrials': ['Aerospace', 'Machinery', 'Transportation'],
+    'Utilities': ['Electric', 'Water'],
+    'Real Estate': ['REITs', 'Developers'],
+}
+EXCHANGES = ['NMS', 'NYQ', 'PCX', 'NGM']
+COUNTRIES = ['United States', 'United States', 'United States', 'Canada', 'United Kingdom', 'Germany']
+
+SCREENS = {
+    'largest': {},
+    'cheap tech': {'sector': 'Technology', 'pe_ratio_min': '0', 'pe_ratio_max': '15', 'sort': 'pe_ratio'},
+    'quality value': {'quality_score_min': '7', 'sort': '-quality_score,ev_ebitda'},
+    'income': {'dividend_yield_min': '0.03', 'payout_ratio_max': '0.8', 'sort': '-dividend_yield,-market_cap'},
+    'cash yield': {'fcf_yield_min': '0.05', 'market_cap_min': '1000000000', 'sort': '-fcf_yield'},
+}
+
+def maybe(rng, value, missing=0.05):
+    """Return value, or None for a share of companies that lack the metric."""
+    return None if rng.random() < missing else value
+
+def synthetic_universe(rows, seed=0):
+    """Build companies and financials with roughly realistic metric distributions."""
+    rng = random.Random(seed)
+    companies = []
+    financials = []
+
+    for i in range(rows):
+        ticker = f"S{i:05d}"
+        sector = rng.choice(list(SECTORS))
+        companies.append(Company(
+            ticker=ticker,
+            name=f"Synthetic Company {i}",
+            exchange=rng.choice(EXCHANGES),
+            sector=sector,
+            industry=rng.choice(SECTORS[sector]),
+            country=rng.choice(COUNTRIES),
+        ))
+        financials.append(FinancialData(
+            company_id=ticker,
+            market_cap=maybe(rng, int(10 ** rng.uniform(7, 12.5))),
+            current_price=Decimal(f"{rng.uniform(1, 800):.2f}"),
+            price_change_ytd=Decimal(f"{rng.gauss(5, 25):.2f}"),
+            pe_ratio=maybe(rng, Decimal(f"{rng.lognormvariate(3, 0.6):.2f}"), 0.15),
+            ps_ratio=maybe(rng, Decimal(f"{rng.lognormvariate(1, 0.8):.2f}")),
+            pb_ratio=maybe(rng, Decimal(f"{rng.lognormvariate(1, 0.7):.2f}")),
+            ev_ebitda=maybe(rng, Decimal(f"{rng.lognormvariate(2.5, 0.5):.2f}"), 0.1),
+            fcf_yield=maybe(rng, Decimal(f"{rng.gauss(0.04, 0.04):.4f}"), 0.1),
+            quality_score=maybe(rng, rng.randint(0, 9), 0.2),
+            profit_margin=maybe(rng, Decimal(f"{rng.gauss(0.1, 0.1):.4f}")),
+            operating_margin=maybe(rng, Decimal(f"{rng.gauss(0.15, 0.1):.4f}")),
+            dividend_yield=Decimal(f"{rng.uniform(0.005, 0.08):.4f}") if rng.random() < 0.4 else None,
+            payout_ratio=maybe(rng, Decimal(f"{rng.uniform(0, 1.2):.4f}"), 0.3),
+        ))
+
+    return companies, financials
+
+def timings(repeat, func):
+    """Return the wall time of each of several runs, in milliseconds."""
+    results = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        results.append((time.perf_counter() - started) * 1000)
+    return results
+
+def p95(values):
+    return statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]
+
+class Command(BaseCommand):
+    help = 'Benchmark the screener API on a synthetic universe in a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=10000,
+            help='Number of synthetic companies to screen',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Requests timed per screen',
+        )
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=20,
+            help='How deep to page before timing the deep page requests',
+        )
+        parser.add_argument(
+            '--budget',
+            type=float,
+            default=50.0,
+            help='Target p95 response time in milliseconds',
+        )
+        parser.add_argument(
+            '--without-indexes',
+            action='store_true',
+            help='Drop the screener indexes first, to measure what they are worth',
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Print the query plan of each screen',
+        )
+
+    def handle(self, *args, **options):
+        # Never touch the real database: build a disposable one with the current schema
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, options):
+        if options['without_indexes']:
+            with connection.schema_editor() as editor:
+                for index in FinancialData._meta.indexes:
+                    editor.remove_index(FinancialData, index)
+
+        started = time.perf_counter()
+        companies, financials = synthetic_universe(options['rows'])
+        Company.objects.bulk_create(companies, batch_size=1000)
+        FinancialData.objects.bulk_create(financials, batch_size=1000)
+        if connection.vendor in ('sqlite', 'postgresql'):
+            # Planner statistics, so the plans match a database that has been running a while
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(
+            f"{options['rows']} companies on {connection.vendor} "
+            f"({'without' if options['without_indexes'] else 'with'} screener indexes), "
+            f"loaded in {time.perf_counter() - started:.1f}s"
+        )
+
+        factory = RequestFactory()
+
+        def fetch(params):
+            response = screener_json(factory.get('/stock/api/screener/', params))
+            if response.status_code != 200:
+                raise RuntimeError(f"{params}: {response.status_code} {response.content.decode()}")
+            return json.loads(response.content)
+
+        self.stdout.write('')
+        self.stdout.write(f"{'Screen':<28}{'Rows':>6}{'Median':>10}{'p95':>10}")
+        worst = 0.0
+        for name, params in SCREENS.items():
+            if options['explain']:
+                self.stdout.write(Screen.from_params(params).queryset().explain())
+
+            # Walk the cursor down to a deep page, which keyset pagination should serve as fast as the first
+            deep = dict(params)
+            for _ in range(options['pages'] - 1):
+                page = fetch(deep)
+                if not page['next_cursor']:
+                    break
+                deep['cursor'] = page['next_cursor']
+
+            for label, request_params in ((name, params), (f"{name} (page {options['pages']})", deep)):
+                count = len(fetch(request_params)['results'])
+                results = timings(options['repeat'], lambda: fetch(request_params))
+                worst = max(worst, p95(results))
+                self.stdout.write(
+                    f"{label:<28}{count:>6}{statistics.median(results):>8.2f}ms{p95(results):>8.2f}ms"
+                )
+
+        self.stdout.write('')
+        message = f"Slowest p95 {worst:.2f}ms against a {options['budget']:.0f}ms budget"
+        if worst <= options['budget']:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(self.style.ERROR(message))
@@ -0,0 +1,31 @@
+# stock_data/management/commands/company_cache_stats.py
+import datetime
+
+from django.core.management.base import BaseCommand
+from stock_data.company_cache import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit rates of the cached company page payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Zero the counters after showing them',
+        )
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        since = datetime.datetime.fromtimestamp(stats['since']).strftime('%Y-%m-%d %H:%M') if stats['since'] else 'never'
+        self.stdout.write(f"Counting since {since}")
+
+        rows = list(stats['payloads'].items()) + [('total', stats['total'])]
+        self.stdout.write(f"{'Payload':<20}{'Hits':>10}{'Misses':>10}{'Hit rate':>10}")
+        for name, counts in rows:
+            rate = f"{counts['hit_rate']:.1%}" if counts['hit_rate'] is not None else '-'
+            self.stdout.write(f"{name:<20}{counts['hits']:>10}{counts['misses']:>10}{rate:>10}")
+
+        if options['reset']:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,34 @@
+# stock_data/management/commands/import_symbols.py
+from django.core.management.base import BaseCommand, CommandError
+from stock_data.symbols import BUNDLED_SYMBOLS, import_symbols, read_symbols
+
+
+class Command(BaseCommand):
+    help = 'Load ticker symbols into the local search index from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=str(BUNDLED_SYMBOLS),
+            help='CSV file with ticker, name and exchange columns (defaults to the bundled list)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of companies written per query',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            symbols = read_symbols(options['path'])
+        except (OSError, KeyError) as e:
+            raise CommandError(f"Could not read symbols from {options['path']}: {e}")
+        
+        self.stdout.write(f"Importing {len(symbols)} symbols...")
+        created, updated = import_symbols(symbols, batch_size=max(1, options['batch_size']))
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {created} new companies and updated {updated} existing ones."
+        ))
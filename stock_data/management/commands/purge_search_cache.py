@@ -0,0 +1,11 @@
+# stock_data/management/commands/purge_search_cache.py
+from django.core.management.base import BaseCommand
+from stock_data.search_cache import purge_search_cache
+
+
+class Command(BaseCommand):
+    help = 'Delete expired cached search results'
+
+    def handle(self, *args, **options):
+        deleted = purge_search_cache()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired search results."))
@@ -0,0 +1,11 @@
+# stock_data/management/commands/rebuild_peers.py
+from django.core.management.base import BaseCommand
+from stock_data.peers import rebuild_peers
+
+
+class Command(BaseCommand):
+    help = 'Recompute the peer groups of every stored company'
+
+    def handle(self, *args, **options):
+        companies = rebuild_peers()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt peer groups for {companies} companies."))
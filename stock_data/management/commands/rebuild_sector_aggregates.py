@@ -0,0 +1,11 @@
+# stock_data/management/commands/rebuild_sector_aggregates.py
+from django.core.management.base import BaseCommand
+from stock_data.aggregates import rebuild_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute sector and industry aggregates from all stored financial data'
+
+    def handle(self, *args, **options):
+        rows = rebuild_aggregates()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} sector and industry aggregates."))
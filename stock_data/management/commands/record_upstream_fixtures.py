@@ -0,0 +1,47 @@
+# stock_data/management/commands/record_upstream_fixtures.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from stock_data.replay import default_root
+from stock_data.testing import SyntheticTicker, record_ticker, write_manifest
+
+# Featured companies, so the popular refresh replays too, plus dividend payers from other sectors
+DEFAULT_TICKERS = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'JPM', 'KO', 'XOM']
+
+class Command(BaseCommand):
+    help = 'Record live yfinance responses for a fixed set of tickers, for replay by run_benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tickers',
+            nargs='*',
+            default=DEFAULT_TICKERS,
+            help='Tickers to record',
+        )
+        parser.add_argument(
+            '--output',
+            help='Fixture directory (default: benchmarks/fixtures)',
+        )
+        parser.add_argument(
+            '--synthetic',
+            action='store_true',
+            help='Generate made-up data instead of fetching from Yahoo Finance, e.g. where it is unreachable',
+        )
+
+    def handle(self, *args, **options):
+        root = options['output'] or default_root()
+        os.makedirs(root, exist_ok=True)
+
+        recorded = {}
+        for ticker in [ticker.upper() for ticker in options['tickers']]:
+            try:
+                recorded[ticker] = record_ticker(root, ticker, SyntheticTicker(ticker) if options['synthetic'] else None)
+                self.stdout.write(f"{ticker}: recorded")
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{ticker}: Error: {e}"))
+
+        if not recorded:
+            raise CommandError('Nothing was recorded; is Yahoo Finance reachable?')
+
+        write_manifest(root, recorded)
+        self.stdout.write(self.style.SUCCESS(f"Recorded {len(recorded)} tickers to {root}"))
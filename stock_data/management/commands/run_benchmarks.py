@@ -0,0 +1,339 @@
+# stock_data/management/commands/run_benchmarks.py
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from stock_data.background import pending_count
+from stock_data.popularity import flush_access_counts
+from stock_data.profiling import request_profile
+from stock_data.replay import default_root, load_manifest
+
+RESULTS_VERSION = 1
+# Requests traced per view for allocations, taking the median
+ALLOCATION_SAMPLES = 5
+# Changes smaller than these are noise, however large in percent
+NOISE_FLOOR = {'median_ms': 1.0, 'wall_ms': 5.0, 'peak_alloc_kib': 64.0}
+
+# (view name, whether it takes a ticker, query string); {ticker} and {tickers} are filled in per request
+VIEWS = [
+    ('core:home', False, ''),
+    ('stock_data:search_results', False, 'query={ticker}'),
+    ('stock_data:search_suggestions', False, 'query={ticker}'),
+    ('stock_data:screener', False, ''),
+    ('stock_data:refresh_data', True, ''),
+    ('stock_data:cache_stats', False, ''),
+    ('stock_data:scheduler_status', False, ''),
+    ('metrics', False, ''),
+    ('company_profiles:detail', True, ''),
+    ('company_profiles:financials', True, ''),
+    ('company_profiles:peers', True, ''),
+    ('company_profiles:news', True, ''),
+    ('charts:stock_price', True, ''),
+    ('charts:price_data', True, 'period=1y&interval=1d'),
+    ('charts:financial', True, ''),
+    ('charts:financial_data', True, 'metric=revenue'),
+    ('charts:comparison', False, 'tickers={tickers}'),
+    ('charts:comparison_data', False, 'tickers={tickers}&metric=price_ytd'),
+    ('charts:technical', True, ''),
+    ('charts:technical_data', True, 'period=6mo'),
+]
+
+# (label, command, options), run in this order against the store the views filled
+COMMANDS = [
+    ('update_stock_data', 'update_stock_data', {'all': True, 'rate': 1000}),
+    ('update_popular_stocks', 'update_popular_stocks', {'rate': 1000}),
+    ('score_piotroski', 'score_piotroski', {}),
+    ('rebuild_sector_aggregates', 'rebuild_sector_aggregates', {}),
+    ('run_refresh_scheduler', 'run_refresh_scheduler', {'once': True, 'rate': 1000, 'budget': 100000}),
+]
+
+def p95(values):
+    return statistics.quantiles(values, n=20)[-1] if len(values) > 1 else values[0]
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every view and the refresh commands against recorded upstream data '
+        '(see record_upstream_fixtures) in a throwaway database, writing the results as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixtures',
+            help='Fixture directory (default: benchmarks/fixtures)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Warm requests timed per view',
+        )
+        parser.add_argument(
+            '--output',
+            help='Results file (default: benchmarks/results/<timestamp>.json)',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Earlier results file to compare against',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20.0,
+            help='Percentage slowdown or allocation growth reported as a regression',
+        )
+        parser.add_argument(
+            '--skip-commands',
+            action='store_true',
+            help='Only benchmark the views',
+        )
+
+    def handle(self, *args, **options):
+        root = options['fixtures'] or default_root()
+        try:
+            manifest = load_manifest(root)
+        except FileNotFoundError:
+            raise CommandError(f"No upstream fixtures in {root}; record them with record_upstream_fixtures (--synthetic works offline) first")
+
+        # Never touch the real database or Yahoo: every request replays into a disposable store
+        with tempfile.TemporaryDirectory() as directory, override_settings(STOCK_DATA_UPSTREAM_FIXTURES=root):
+            if connection.vendor == 'sqlite':
+                # Async views write from executor threads, which an in-memory database locks out
+                connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            setup_test_environment()
+            try:
+                results = self.run(sorted(manifest['tickers']), options)
+            finally:
+                self.wait_for_background()
+                # Otherwise the access counts are flushed at exit, into the real database
+                flush_access_counts()
+                teardown_test_environment()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results['fixtures'] = {
+            'path': root,
+            'recorded_at': manifest['recorded_at'].isoformat(),
+            'tickers': sorted(manifest['tickers']),
+        }
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', 'results', f"{timezone.now():%Y%m%d-%H%M%S}.json",
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results, options['threshold'])
+
+    def wait_for_background(self, timeout=60):
+        """Let background revalidations and search enrichment finish before the store goes away."""
+        deadline = time.monotonic() + timeout
+        while pending_count() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def reset(self):
+        """Empty the store and caches so the next request starts cold."""
+        self.wait_for_background()
+        call_command('flush', interactive=False, verbosity=0)
+        for cache in caches.all():
+            cache.clear()
+
+    def client(self):
+        # Staff, so the staff-only views are measured doing their work rather than refusing
+        user, _ = User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def urls(self, view, tickers, count):
+        """count URLs for a view, cycling through the tickers."""
+        name, takes_ticker, query = view
+        urls = []
+        for i in range(count):
+            ticker = tickers[i % len(tickers)]
+            url = reverse(name, kwargs={'ticker': ticker}) if takes_ticker else reverse(name)
+            if query:
+                url += '?' + query.format(ticker=ticker, tickers=','.join(tickers))
+            urls.append(url)
+        return urls
+
+    def request(self, client, url):
+        """Make one request, returning its latency in milliseconds, profile and response."""
+        with request_profile() as profile:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, profile, response
+
+    def run(self, tickers, options):
+        iterations = max(1, options['iterations'])
+        self.stdout.write(f"{len(VIEWS)} views over {len(tickers)} recorded tickers, {iterations} warm requests each")
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'View':<34}{'Cold':>9}{'Median':>9}{'p95':>9}{'Req/s':>8}{'Peak KiB':>10}{'Queries':>9}{'Errors':>8}"
+        )
+
+        views = {}
+        for view in VIEWS:
+            # Cold: the first request for a ticker nothing has been fetched for yet
+            self.reset()
+            cold, _, response = self.request(self.client(), self.urls(view, tickers, 1)[0])
+            # Views that need a stored company answer 404 here; the status keeps that visible
+            views[view[0]] = {'cold_ms': round(cold, 2), 'cold_status': response.status_code}
+
+        # Warm: every view has been served for every ticker at least once
+        self.reset()
+        client = self.client()
+        for view in VIEWS:
+            for url in self.urls(view, tickers, len(tickers)):
+                client.get(url)
+        self.wait_for_background()
+
+        started = time.perf_counter()
+        for view in VIEWS:
+            latencies = []
+            errors = 0
+            for url in self.urls(view, tickers, iterations):
+                elapsed, _, response = self.request(client, url)
+                latencies.append(elapsed)
+                errors += response.status_code >= 400
+            views[view[0]].update({
+                'median_ms': round(statistics.median(latencies), 2),
+                'p95_ms': round(p95(latencies), 2),
+                'throughput_rps': round(1000 * len(latencies) / sum(latencies), 1),
+                'errors': errors,
+            })
+        mix_seconds = time.perf_counter() - started
+
+        # Allocations are traced on their own pass, since tracing slows every request down
+        tracemalloc.start()
+        try:
+            for view in VIEWS:
+                peaks = []
+                for url in self.urls(view, tickers, ALLOCATION_SAMPLES):
+                    tracemalloc.reset_peak()
+                    baseline, _ = tracemalloc.get_traced_memory()
+                    _, profile, _ = self.request(client, url)
+                    _, peak = tracemalloc.get_traced_memory()
+                    peaks.append(peak - baseline)
+                views[view[0]].update({
+                    'peak_alloc_kib': round(statistics.median(peaks) / 1024, 1),
+                    'queries': profile.count('db'),
+                    'upstream_calls': profile.count('yfinance'),
+                })
+        finally:
+            tracemalloc.stop()
+
+        for name, result in views.items():
+            self.stdout.write(
+                f"{name:<34}{result['cold_ms']:>7.1f}ms{result['median_ms']:>7.1f}ms{result['p95_ms']:>7.1f}ms"
+                f"{result['throughput_rps']:>8.1f}{result['peak_alloc_kib']:>10.0f}{result['queries']:>9}{result['errors']:>8}"
+            )
+        self.stdout.write(f"Warm mix: {len(VIEWS) * iterations / mix_seconds:.1f} requests/s")
+
+        commands = {} if options['skip_commands'] else self.run_commands()
+
+        return {
+            'version': RESULTS_VERSION,
+            'started': timezone.now().isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'mix_throughput_rps': round(len(VIEWS) * iterations / mix_seconds, 1),
+            'views': views,
+            'commands': commands,
+        }
+
+    def run_commands(self):
+        """Time each refresh command once against the store the views filled."""
+        flush_access_counts()
+        self.stdout.write('')
+        self.stdout.write(f"{'Command':<34}{'Wall':>9}{'Peak KiB':>10}{'Queries':>9}{'Upstream':>10}")
+
+        commands = {}
+        tracemalloc.start()
+        try:
+            for label, name, command_options in COMMANDS:
+                self.wait_for_background()
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                # Work on refresh worker threads is timed but not counted, as they do not share the profile
+                with request_profile() as profile:
+                    started = time.perf_counter()
+                    call_command(name, stdout=io.StringIO(), **command_options)
+                    elapsed = (time.perf_counter() - started) * 1000
+                _, peak = tracemalloc.get_traced_memory()
+
+                commands[label] = {
+                    'wall_ms': round(elapsed, 2),
+                    'peak_alloc_kib': round((peak - baseline) / 1024, 1),
+                    'queries': profile.count('db'),
+                    'upstream_calls': profile.count('yfinance'),
+                }
+                self.stdout.write(
+                    f"{label:<34}{elapsed:>7.1f}ms{commands[label]['peak_alloc_kib']:>10.0f}"
+                    f"{commands[label]['queries']:>9}{commands[label]['upstream_calls']:>10}"
+                )
+        finally:
+            tracemalloc.stop()
+        return commands
+
+    def compare(self, path, results, threshold):
+        """Report how far each timing and allocation moved since an earlier run."""
+        with open(path) as f:
+            previous = json.load(f)
+
+        self.stdout.write('')
+        self.stdout.write(f"Compared with {path} ({previous.get('git_commit') or 'unknown commit'})")
+        regressions = []
+        for section, metrics in (('views', ('median_ms', 'peak_alloc_kib')), ('commands', ('wall_ms', 'peak_alloc_kib'))):
+            for name, result in results.get(section, {}).items():
+                before = previous.get(section, {}).get(name)
+                if not before:
+                    continue
+                for metric in metrics:
+                    if not before.get(metric):
+                        continue
+                    change = (result[metric] - before[metric]) / before[metric] * 100
+                    if abs(result[metric] - before[metric]) < NOISE_FLOOR[metric]:
+                        continue
+                    line = f"{name:<34}{metric:<16}{before[metric]:>10.1f}{result[metric]:>10.1f}{change:>+8.1f}%"
+                    if change > threshold:
+                        regressions.append(name)
+                        self.stdout.write(self.style.ERROR(line))
+                    elif change < -threshold:
+                        self.stdout.write(self.style.SUCCESS(line))
+
+        if regressions:
+            raise CommandError(f"{len(set(regressions))} regressions beyond {threshold:.0f}%")
+        self.stdout.write(self.style.SUCCESS(f"No regressions beyond {threshold:.0f}%"))
@@ -0,0 +1,178 @@
+# stock_data/management/commands/run_refresh_scheduler.py
+import logging
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from stock_data.company_cache import get_company_payloads
+from stock_data.models import Company
+from stock_data.popularity import popular_companies
+from stock_data.refresh import RateLimiter, RefreshWriter, refresh_companies
+from stock_data.scheduler import ESTIMATED_CALLS_PER_REFRESH, RefreshQueue, record_cycle
+from stock_data.upstream import fetch_context
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Keep company data fresh, spending a fixed upstream budget on the most viewed and most stale companies first'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=300,
+            help='Seconds per cycle; the queue is rebuilt and the budget renewed each cycle',
+        )
+        parser.add_argument(
+            '--budget',
+            type=int,
+            default=600,
+            help='Upstream calls to spend per cycle',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=2.0,
+            help='Upstream requests per second shared by all workers',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Number of companies to refresh concurrently',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of refreshed companies written per transaction',
+        )
+        parser.add_argument(
+            '--warm',
+            type=int,
+            default=20,
+            help='Rebuild the cached company pages of this many of the most requested companies each cycle',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run a single cycle and exit',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the queue without refreshing anything',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.show_queue(RefreshQueue())
+            return
+
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            # Finish the refreshes in flight, then exit
+            signal.signal(signum, lambda *_: stopping.set())
+
+        limiter = RateLimiter(options['rate'])
+        cost = ESTIMATED_CALLS_PER_REFRESH
+        while not stopping.is_set():
+            started = time.monotonic()
+            cost = self.run_cycle(options, limiter, cost, stopping)
+            if options['once']:
+                break
+            stopping.wait(max(0.0, options['interval'] - (time.monotonic() - started)))
+
+    def run_cycle(self, options, limiter, cost, stopping):
+        """Refresh the highest priority companies until the cycle's budget is spent.
+
+        cost is the running estimate of upstream calls per refresh, which is
+        returned updated with what this cycle measured.
+        """
+        started = time.perf_counter()
+        queue = RefreshQueue()
+        depth, lag = len(queue), queue.lag
+        workers = max(1, options['workers'])
+        writer = RefreshWriter(batch_size=max(1, options['batch_size']))
+        spent = refreshed = errors = 0
+
+        while len(queue) and not stopping.is_set():
+            # Take only as many as the remaining budget should cover, at least a worker's worth
+            affordable = int((options['budget'] - spent) // max(cost, 1))
+            if affordable < 1:
+                break
+            tickers = queue.pop(min(affordable, workers * 4))
+
+            companies = Company.objects.in_bulk(tickers)
+            companies = [companies[ticker] for ticker in tickers if ticker in companies]
+            for result in refresh_companies(companies, workers=workers, limiter=limiter, writer=writer):
+                spent += result.upstream_calls
+                if result.ok:
+                    refreshed += 1
+                    # Moving average, so the batch size follows what refreshes really cost
+                    cost = 0.8 * cost + 0.2 * result.upstream_calls
+                else:
+                    errors += 1
+                    self.stdout.write(self.style.ERROR(f"{result.company.ticker}: Error: {result.error}"))
+
+        warmed = 0
+        if options['warm'] and spent < options['budget'] and not stopping.is_set():
+            warmed, calls = self.warm(options['warm'], limiter)
+            spent += calls
+
+        elapsed = time.perf_counter() - started
+        record_cycle({
+            'finished': timezone.now().isoformat(),
+            'depth': depth,
+            'lag_seconds': lag.total_seconds(),
+            'refreshed': refreshed,
+            'errors': errors,
+            'failed_writes': writer.failed,
+            'upstream_calls': spent,
+            'budget': options['budget'],
+            'remaining': len(queue),
+            'warmed': warmed,
+            'elapsed_seconds': elapsed,
+        })
+        self.stdout.write(self.style.SUCCESS(
+            f"{timezone.now():%Y-%m-%d %H:%M:%S} queue {depth} (lag {lag.total_seconds() / 60:.0f} min): "
+            f"refreshed {refreshed}, {errors} errors, warmed {warmed}, {spent}/{options['budget']} upstream calls "
+            f"in {elapsed:.1f}s, {len(queue)} left"
+        ))
+        return cost
+
+    def warm(self, count, limiter):
+        """Build the missing cached page payloads of the most requested companies.
+
+        Returns how many companies were warmed and the upstream calls it took.
+        """
+        from company_profiles.views import company_payload_builders
+
+        if isinstance(caches[getattr(settings, 'STOCK_DATA_CACHE', 'default')], LocMemCache):
+            # Web processes would never see what this process caches
+            return 0, 0
+
+        warmed = 0
+        with fetch_context(limiter=limiter) as context:
+            for ticker, _ in popular_companies(count):
+                try:
+                    get_company_payloads(ticker, company_payload_builders(ticker))
+                    warmed += 1
+                except Exception as e:
+                    logger.error(f"Error warming cached pages for {ticker}: {e}")
+        return warmed, context.calls
+
+    def show_queue(self, queue):
+        self.stdout.write(
+            f"{len(queue)} companies due, lag {queue.lag.total_seconds() / 60:.0f} min, "
+            f"oldest {queue.oldest.total_seconds() / 3600 if queue.oldest else 0:.1f} h, "
+            f"{queue.backing_off} backing off after failures"
+        )
+        for ticker, priority in queue.peek(20):
+            self.stdout.write(f"  {ticker:<10} {'new' if priority == float('inf') else f'{priority:.2f}':>8}")
@@ -0,0 +1,74 @@
+# stock_data/management/commands/score_piotroski.py
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from stock_data.aggregates import update_aggregates
+from stock_data.models import FinancialData
+from stock_data.piotroski import SIGNALS, score_tickers
+
+
+class Command(BaseCommand):
+    help = 'Recompute Piotroski F-scores for every stored company from its stored statements'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tickers',
+            nargs='*',
+            help='Only score these tickers',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the scores without saving them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of companies updated per statement',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        tickers = [ticker.upper() for ticker in options['tickers']] or None
+        financials = FinancialData.objects.only('company_id', 'quality_score')
+        if tickers:
+            financials = financials.filter(company_id__in=tickers)
+        financials = list(financials)
+
+        scores = score_tickers(tickers)
+        scores = scores[scores.index.isin({financial.company_id for financial in financials})]
+        scored_in = time.perf_counter() - started
+        # Companies without a full set of statements get no score rather than a misleading 0
+        by_ticker = {ticker: None if pd.isna(score) else int(score) for ticker, score in scores['score'].items()}
+
+        changed = []
+        for financial in financials:
+            score = by_ticker.get(financial.company_id)
+            if score != financial.quality_score:
+                financial.quality_score = score
+                changed.append(financial)
+
+        complete = int(scores['score'].notna().sum())
+        self.stdout.write(
+            f"Scored {len(by_ticker)} of {len(financials)} companies in {scored_in:.2f}s: "
+            f"{complete} complete, {len(by_ticker) - complete} missing data, "
+            f"{len(financials) - len(by_ticker)} without statements"
+        )
+        for signal in SIGNALS:
+            column = scores[signal]
+            self.stdout.write(f"  {signal:<24} {int(column.sum()):>6} pass {int(column.isna().sum()):>6} missing")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Dry run: {len(changed)} scores would change."))
+            return
+
+        with transaction.atomic():
+            FinancialData.objects.bulk_update(changed, ['quality_score'], batch_size=options['batch_size'])
+        update_aggregates([financial.company_id for financial in changed])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {len(changed)} scores in {time.perf_counter() - started:.2f}s."
+        ))
@@ -1,43 +1,58 @@
 # stock_data/management/commands/update_popular_stocks.py
-import time
-
 from core.context_processors import popular_companies
 from django.core.management.base import BaseCommand
-from stock_data.utils import get_company_data
+from stock_data.models import Company
+from stock_data.refresh import RateLimiter, RefreshWriter, refresh_companies
 
 
 class Command(BaseCommand):
     help = 'Update data for popular companies more frequently'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=2.0,
+            help='Upstream requests per second',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of refreshed companies written per transaction',
+        )
+
     def handle(self, *args, **options):
         # Get popular companies list
         popular = popular_companies(None)['popular_companies']
         tickers = [company[0] for company in popular]
         
+        # Companies not stored yet are created from their fetched info
+        existing = Company.objects.in_bulk(tickers)
+        companies = [existing.get(ticker) or Company(ticker=ticker, name=ticker) for ticker in tickers]
+        
         self.stdout.write(f"Updating data for {len(tickers)} popular companies...")
         
         updated_count = 0
         error_count = 0
+        limiter = RateLimiter(options['rate'])
+        writer = RefreshWriter(batch_size=max(1, options['batch_size']))
         
-        for ticker in tickers:
-            self.stdout.write(f"Updating {ticker}...", ending='')
+        for result in refresh_companies(companies, limiter=limiter, writer=writer):
+            ticker = result.company.ticker
             
-            try:
-                company = get_company_data(ticker)
-                if company:
-                    self.stdout.write(self.style.SUCCESS(" Done"))
-                    updated_count += 1
-                else:
-                    self.stdout.write(self.style.ERROR(" Failed"))
-                    error_count += 1
-                
-                # Sleep to avoid hitting API limits
-                time.sleep(1)
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f" Error: {str(e)}"))
+            if result.ok:
+                self.stdout.write(self.style.SUCCESS(f"{ticker}: Done in {result.elapsed:.2f}s"))
+                updated_count += 1
+            elif result.error:
+                self.stdout.write(self.style.ERROR(f"{ticker}: Error: {str(result.error)}"))
+                error_count += 1
+            else:
+                self.stdout.write(self.style.ERROR(f"{ticker}: Failed"))
                 error_count += 1
         
         self.stdout.write(self.style.SUCCESS(
             f"Updated {updated_count} popular companies successfully. {error_count} errors."
-        ))
\ No newline at end of file
+        ))
+        if writer.failed:
+            self.stdout.write(self.style.ERROR(f"{writer.failed} companies could not be saved."))
\ No newline at end of file
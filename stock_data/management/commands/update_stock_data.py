@@ -4,8 +4,8 @@ import time
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from stock_data.models import Company, FinancialData
-from stock_data.utils import fetch_company_info, fetch_financial_data
+from stock_data.models import Company
+from stock_data.refresh import RateLimiter, RefreshWriter, refresh_companies
 
 logger = logging.getLogger(__name__)
 
@@ -23,10 +23,31 @@ class Command(BaseCommand):
             type=int,
             help='Limit the number of companies to update',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of companies to refresh concurrently',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=2.0,
+            help='Upstream requests per second shared by all workers',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of refreshed companies written per transaction',
+        )
 
     def handle(self, *args, **options):
         update_all = options['all']
         limit = options.get('limit')
+        workers = max(1, options['workers'])
+        limiter = RateLimiter(options['rate'])
+        writer = RefreshWriter(batch_size=max(1, options['batch_size']))
         
         # Get companies that need updating (older than 24 hours)
         one_day_ago = timezone.now() - timezone.timedelta(hours=24)
@@ -40,47 +61,37 @@ class Command(BaseCommand):
             companies = companies[:limit]
         
         total_companies = companies.count()
-        self.stdout.write(f"Updating data for {total_companies} companies...")
+        self.stdout.write(
+            f"Updating data for {total_companies} companies "
+            f"with {workers} workers at {options['rate']:g} requests/s..."
+        )
         
         updated_count = 0
         error_count = 0
+        upstream_calls = 0
+        started = time.perf_counter()
         
-        for company in companies:
-            self.stdout.write(f"Updating {company.ticker}...", ending='')
+        for result in refresh_companies(companies, workers=workers, limiter=limiter, writer=writer):
+            ticker = result.company.ticker
             
-            try:
-                # Update company info
-                company_info = fetch_company_info(company.ticker)
-                if company_info:
-                    for key, value in company_info.items():
-                        if key != 'ticker' and hasattr(company, key):
-                            setattr(company, key, value)
-                    company.last_updated = timezone.now()
-                    company.save()
-                
-                # Update financial data
-                financial_data = fetch_financial_data(company.ticker)
-                if financial_data:
-                    financials, created = FinancialData.objects.get_or_create(company=company)
-                    
-                    for key, value in financial_data.items():
-                        if hasattr(financials, key):
-                            setattr(financials, key, value)
-                    
-                    financials.last_updated = timezone.now()
-                    financials.save()
-                
-                self.stdout.write(self.style.SUCCESS(" Done"))
+            if result.ok:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{ticker}: Done in {result.elapsed:.2f}s ({result.upstream_calls} upstream calls)"
+                ))
                 updated_count += 1
-                
-                # Sleep to avoid hitting API limits
-                time.sleep(1)
-                
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f" Error: {str(e)}"))
-                logger.error(f"Error updating {company.ticker}: {e}")
+                upstream_calls += result.upstream_calls
+            else:
+                self.stdout.write(self.style.ERROR(f"{ticker}: Error: {str(result.error)}"))
                 error_count += 1
         
+        elapsed = time.perf_counter() - started
         self.stdout.write(self.style.SUCCESS(
             f"Updated {updated_count} companies successfully. {error_count} errors."
-        ))
\ No newline at end of file
+        ))
+        if writer.failed:
+            self.stdout.write(self.style.ERROR(f"{writer.failed} companies could not be saved."))
+        if elapsed > 0:
+            self.stdout.write(
+                f"Took {elapsed:.1f}s: {(updated_count + error_count) / elapsed:.2f} companies/s, "
+                f"{upstream_calls / elapsed:.2f} upstream requests/s."
+            )
\ No newline at end of file
@@ -0,0 +1,130 @@
+# stock_data/metrics.py
+import bisect
+import threading
+
+# Values live in each server process; a scrape sees the process that served it
+_registry = []
+_collectors = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+class Histogram:
+    """Observations bucketed by upper bound per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._values.get(labels) or ([0] * len(self.buckets), 0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+def register_collector(collect):
+    """Add a callable returning (name, kind, help, [(labels dict, value)]) tuples, read at each scrape."""
+    _collectors.append(collect)
+    return collect
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels, labels.values())} {_number(value)}")
+
+    return '\n'.join(lines) + '\n'
+
+UPSTREAM_REQUESTS = Counter(
+    'stock_data_upstream_requests_total',
+    'Calls made to yfinance, by resource, calling endpoint and outcome.',
+    labels=('resource', 'endpoint', 'outcome'),
+)
+UPSTREAM_SECONDS = Histogram(
+    'stock_data_upstream_request_seconds',
+    'Time spent in yfinance calls, by resource and calling endpoint.',
+    labels=('resource', 'endpoint'),
+)
+UPSTREAM_SAVED = Counter(
+    'stock_data_upstream_requests_saved_total',
+    'yfinance calls answered from the request fetch context instead, by resource and endpoint.',
+    labels=('resource', 'endpoint'),
+)
+REQUEST_UPSTREAM_CALLS = Histogram(
+    'stock_data_request_upstream_calls',
+    'yfinance calls made per request, by endpoint.',
+    labels=('endpoint',),
+    buckets=(0, 1, 2, 5, 10, 20, 50),
+)
+DB_QUERIES = Counter(
+    'stock_data_db_queries_total',
+    'Database queries, by calling endpoint.',
+    labels=('endpoint',),
+)
+DB_SECONDS = Histogram(
+    'stock_data_db_query_seconds',
+    'Time spent in database queries, by calling endpoint.',
+    labels=('endpoint',),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
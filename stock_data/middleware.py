@@ -0,0 +1,124 @@
+# stock_data/middleware.py
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import tempfile
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import REQUEST_UPSTREAM_CALLS
+from .profiling import request_profile
+from .upstream import fetch_context
+
+logger = logging.getLogger(__name__)
+
+class FetchContextMiddleware:
+    """Share one fetch context across everything a request asks yfinance for."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Under ASGI the whole request stays on the event loop instead of a sync thread
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with fetch_context() as context:
+            context.request = request
+            response = self.get_response(request)
+        return self._annotate(request, response, context)
+
+    async def __acall__(self, request):
+        # Executor threads copy this context, so async views join the same fetch context
+        with fetch_context() as context:
+            context.request = request
+            response = await self.get_response(request)
+        return self._annotate(request, response, context)
+
+    def _annotate(self, request, response, context):
+        if request.resolver_match is not None:
+            REQUEST_UPSTREAM_CALLS.observe(context.calls, request.resolver_match.view_name)
+        if context.calls or context.saved:
+            logger.info(f"{request.path}: {context.calls} upstream calls, {context.saved} saved by coalescing")
+        response['X-Upstream-Calls'] = str(context.calls)
+        response['X-Upstream-Calls-Saved'] = str(context.saved)
+        return response
+
+class ProfilingMiddleware:
+    """Break each request's wall time down by phase in a Server-Timing header.
+
+    Enabled by STOCK_DATA_PROFILING. Requests slower than STOCK_DATA_SLOW_REQUEST_MS
+    are logged with their phase times and query and upstream call counts. Staff
+    can add ?profile=1 to capture one request with cProfile, and a
+    STOCK_DATA_PROFILE_SAMPLE_RATE fraction of requests is captured anyway.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'STOCK_DATA_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'STOCK_DATA_SLOW_REQUEST_MS', 1000)
+        self.sample_rate = getattr(settings, 'STOCK_DATA_PROFILE_SAMPLE_RATE', 0)
+        self.profile_dir = getattr(settings, 'STOCK_DATA_PROFILE_DIR', None) or tempfile.gettempdir()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _capture(self, request, user):
+        if 'profile' in request.GET and user is not None and user.is_staff:
+            return True
+        return random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with request_profile(capture=self._capture(request, getattr(request, 'user', None))) as profile:
+            response = self.get_response(request)
+        return self._report(request, response, profile)
+
+    async def __acall__(self, request):
+        # Only work on the event loop and on the executor threads this request awaits is captured
+        user = await request.auser() if hasattr(request, 'auser') else None
+        with request_profile(capture=self._capture(request, user)) as profile:
+            response = await self.get_response(request)
+        return self._report(request, response, profile)
+
+    def _report(self, request, response, profile):
+        response['Server-Timing'] = profile.server_timing()
+
+        record = {'method': request.method, 'path': request.get_full_path(), 'status': response.status_code, **profile.record()}
+        if record['total_ms'] >= self.slow_ms:
+            logger.warning(f"Slow request: {json.dumps(record)}")
+
+        if profile.capture:
+            response['X-Profile'] = self._save(request, profile)
+        return response
+
+    def _save(self, request, profile):
+        """Write the captured cProfile stats to a file, logging the costliest calls."""
+        name = f"{request.path.strip('/').replace('/', '-') or 'root'}-{int(time.time() * 1000)}.prof"
+        path = os.path.join(self.profile_dir, name)
+        report = io.StringIO()
+        try:
+            stats = pstats.Stats(*profile.profilers, stream=report)
+            stats.dump_stats(path)
+            stats.sort_stats('cumulative').print_stats(25)
+        except Exception as e:
+            logger.error(f"Error saving profile for {request.path}: {e}")
+            return ''
+        logger.info(f"Profiled {request.get_full_path()} to {path}\n{report.getvalue()}")
+        return name
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10)),
+                ('interval', models.CharField(max_length=5)),
+                ('timestamp', models.DateTimeField()),
+                ('open', models.FloatField(blank=True, null=True)),
+                ('high', models.FloatField(blank=True, null=True)),
+                ('low', models.FloatField(blank=True, null=True)),
+                ('close', models.FloatField(blank=True, null=True)),
+                ('volume', models.BigIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('ticker', 'interval', 'timestamp')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10)),
+                ('interval', models.CharField(max_length=5)),
+                ('start', models.DateTimeField(blank=True, null=True)),
+                ('tz_name', models.CharField(default='UTC', max_length=64)),
+                ('last_fetched', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('ticker', 'interval')},
+            },
+        ),
+    ]
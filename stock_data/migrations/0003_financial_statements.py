@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0002_price_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinancialStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10)),
+                ('statement', models.CharField(choices=[('income', 'Income Statement'), ('balance', 'Balance Sheet'), ('cashflow', 'Cash Flow')], max_length=10)),
+                ('period_type', models.CharField(choices=[('annual', 'Annual'), ('quarterly', 'Quarterly')], max_length=10)),
+                ('line_item', models.CharField(max_length=100)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('period_end', models.DateField()),
+                ('value', models.FloatField(blank=True, null=True)),
+                ('last_updated', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('ticker', 'statement', 'period_type', 'line_item', 'period_end')},
+            },
+        ),
+    ]
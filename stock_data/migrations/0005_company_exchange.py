@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0004_refresh_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='exchange',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
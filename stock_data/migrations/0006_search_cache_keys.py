@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:48
+
+import json
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def normalize_search_results(apps, schema_editor):
+    """Fill in normalized queries, keep the newest row per query and decode double-encoded results."""
+    SearchResult = apps.get_model('stock_data', 'SearchResult')
+    seen = set()
+    duplicates = []
+
+    for search in SearchResult.objects.order_by('-last_updated', '-pk'):
+        normalized = ' '.join(search.query.lower().split())
+        if normalized in seen:
+            duplicates.append(search.pk)
+            continue
+        seen.add(normalized)
+
+        search.normalized_query = normalized
+        if isinstance(search.results_json, str):
+            try:
+                search.results_json = json.loads(search.results_json)
+            except ValueError:
+                search.results_json = []
+        search.save(update_fields=['normalized_query', 'results_json'])
+
+    SearchResult.objects.filter(pk__in=duplicates).delete()
+
+
+def encode_search_results(apps, schema_editor):
+    """Restore the string-encoded results the previous code expects."""
+    SearchResult = apps.get_model('stock_data', 'SearchResult')
+    for search in SearchResult.objects.all():
+        search.results_json = json.dumps(search.results_json)
+        search.save(update_fields=['results_json'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0005_company_exchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchresult',
+            name='normalized_query',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='searchresult',
+            name='complete',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='searchresult',
+            name='last_updated',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(normalize_search_results, encode_search_results),
+        migrations.AlterField(
+            model_name='searchresult',
+            name='normalized_query',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0006_search_cache_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='company',
+            name='industry',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='sector',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.CreateModel(
+            name='CompanyPeer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('match', models.CharField(choices=[('industry', 'Same industry'), ('sector', 'Same sector')], max_length=10)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='peer_links', to='stock_data.company')),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='peer_of', to='stock_data.company')),
+            ],
+            options={
+                'ordering': ['company', 'rank'],
+                'unique_together': {('company', 'peer')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0007_company_peers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='financialdata',
+            index=models.Index(fields=['market_cap', 'company'], name='financials_market_cap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialdata',
+            index=models.Index(fields=['pe_ratio', 'company'], name='financials_pe_ratio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialdata',
+            index=models.Index(fields=['ev_ebitda', 'company'], name='financials_ev_ebitda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialdata',
+            index=models.Index(fields=['fcf_yield', 'company'], name='financials_fcf_yield_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialdata',
+            index=models.Index(fields=['quality_score', 'company'], name='financials_quality_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialdata',
+            index=models.Index(fields=['dividend_yield', 'company'], name='financials_dividend_idx'),
+        ),
+    ]
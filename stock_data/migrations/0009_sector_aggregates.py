@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0008_screener_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectorAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_type', models.CharField(choices=[('sector', 'Sector'), ('industry', 'Industry')], max_length=10)),
+                ('group', models.CharField(max_length=100)),
+                ('metric', models.CharField(max_length=30)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('median', models.FloatField(blank=True, null=True)),
+                ('q1', models.FloatField(blank=True, null=True)),
+                ('q3', models.FloatField(blank=True, null=True)),
+                ('percentiles', models.JSONField(default=list)),
+                ('sorted_values', models.JSONField(default=list)),
+                ('members', models.JSONField(default=dict)),
+                ('last_updated', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('group_type', 'group', 'metric')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0009_sector_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TickerAccess',
+            fields=[
+                ('ticker', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('score_updated', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0010_ticker_access'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='peers_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
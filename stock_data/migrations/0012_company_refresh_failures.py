@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_data', '0011_company_peers_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='refresh_failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='refresh_failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -9,20 +9,59 @@ class Company(models.Model):
     """Model to cache company data fetched from yfinance."""
     ticker = models.CharField(max_length=10, primary_key=True)
     name = models.CharField(max_length=255)
-    sector = models.CharField(max_length=100, null=True, blank=True)
-    industry = models.CharField(max_length=100, null=True, blank=True)
+    exchange = models.CharField(max_length=50, null=True, blank=True)
+    sector = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    industry = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     country = models.CharField(max_length=100, null=True, blank=True)
     website = models.URLField(max_length=255, null=True, blank=True)
     logo_url = models.URLField(max_length=255, null=True, blank=True)
     last_updated = models.DateTimeField(default=timezone.now)
+    # When the peer group was last computed, even if it came out empty
+    peers_updated = models.DateTimeField(null=True, blank=True)
+    # Background refreshes that failed in a row since the last successful one, and when the last did
+    refresh_failures = models.PositiveIntegerField(default=0)
+    refresh_failed_at = models.DateTimeField(null=True, blank=True)
     
     def is_stale(self):
         """Check if data needs updating (older than 24 hours)."""
         return timezone.now() - self.last_updated > datetime.timedelta(hours=24)
     
+    def freshness(self):
+        """Describe how current the stored data is, for templates and JSON."""
+        financials = FinancialData.objects.filter(company=self).first()
+        as_of = self.last_updated
+        if financials and financials.last_updated < as_of:
+            as_of = financials.last_updated
+        
+        return {
+            'as_of': as_of,
+            'stale': self.is_stale() or not financials or financials.is_stale(),
+            # Set by get_company_data when stale data is served during a background refresh
+            'refreshing': getattr(self, 'refreshing', False),
+        }
+    
     def __str__(self):
         return f"{self.ticker}: {self.name}"
 
+class CompanyPeer(models.Model):
+    """Precomputed peer of a company, ranked by market-cap proximity."""
+    MATCH_CHOICES = [
+        ('industry', 'Same industry'),
+        ('sector', 'Same sector'),
+    ]
+    
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='peer_links')
+    peer = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='peer_of')
+    rank = models.PositiveSmallIntegerField()
+    match = models.CharField(max_length=10, choices=MATCH_CHOICES)
+    
+    class Meta:
+        unique_together = ('company', 'peer')
+        ordering = ['company', 'rank']
+    
+    def __str__(self):
+        return f"{self.company_id} peer {self.rank}: {self.peer_id}"
+
 class FinancialData(models.Model):
     """Model to store financial metrics for companies."""
     company = models.OneToOneField(Company, on_delete=models.CASCADE, related_name='financials')
@@ -56,18 +95,146 @@ class FinancialData(models.Model):
     
     last_updated = models.DateTimeField(default=timezone.now)
     
+    class Meta:
+        # Screener sorts resume after (metric, ticker), so each index ends in the company
+        indexes = [
+            models.Index(fields=['market_cap', 'company'], name='financials_market_cap_idx'),
+            models.Index(fields=['pe_ratio', 'company'], name='financials_pe_ratio_idx'),
+            models.Index(fields=['ev_ebitda', 'company'], name='financials_ev_ebitda_idx'),
+            models.Index(fields=['fcf_yield', 'company'], name='financials_fcf_yield_idx'),
+            models.Index(fields=['quality_score', 'company'], name='financials_quality_idx'),
+            models.Index(fields=['dividend_yield', 'company'], name='financials_dividend_idx'),
+        ]
+    
+    def is_stale(self):
+        """Check if data needs updating (more than a day old)."""
+        return (timezone.now() - self.last_updated).days > 1
+    
     def __str__(self):
         return f"Financial Data for {self.company.ticker}"
 
+class SectorAggregate(models.Model):
+    """Distribution of one metric across a sector or industry, maintained incrementally."""
+    GROUP_CHOICES = [
+        ('sector', 'Sector'),
+        ('industry', 'Industry'),
+    ]
+    
+    group_type = models.CharField(max_length=10, choices=GROUP_CHOICES)
+    group = models.CharField(max_length=100)
+    metric = models.CharField(max_length=30)
+    count = models.PositiveIntegerField(default=0)
+    median = models.FloatField(null=True, blank=True)
+    q1 = models.FloatField(null=True, blank=True)
+    q3 = models.FloatField(null=True, blank=True)
+    # Value at each whole percentile, so pages rank a company without loading the distribution
+    percentiles = models.JSONField(default=list)
+    # Every value in order and each member's value (or null), for incremental updates
+    sorted_values = models.JSONField(default=list)
+    members = models.JSONField(default=dict)
+    last_updated = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ('group_type', 'group', 'metric')
+    
+    def __str__(self):
+        return f"{self.metric} across {self.group_type} {self.group}"
+
 class SearchResult(models.Model):
     """Model to cache search results for company names."""
+    MAX_AGE = datetime.timedelta(days=7)
+    
     query = models.CharField(max_length=255)
+    # Lowercased with collapsed whitespace, so equivalent queries share one row
+    normalized_query = models.CharField(max_length=255, unique=True)
     results_json = models.JSONField()  # Store list of matches as JSON
-    last_updated = models.DateTimeField(default=timezone.now)
+    # True when upstream returned every match it had, so longer queries can be narrowed from it
+    complete = models.BooleanField(default=False)
+    last_updated = models.DateTimeField(default=timezone.now, db_index=True)
     
     def is_stale(self):
         """Check if results are stale (older than 1 week)."""
-        return timezone.now() - self.last_updated > datetime.timedelta(days=7)
+        return timezone.now() - self.last_updated > self.MAX_AGE
+    
+    def __str__(self):
+        return f"Search for: {self.query}"
+
+class FinancialStatement(models.Model):
+    """Model to store financial statement line items fetched from yfinance."""
+    STATEMENT_CHOICES = [
+        ('income', 'Income Statement'),
+        ('balance', 'Balance Sheet'),
+        ('cashflow', 'Cash Flow'),
+    ]
+    PERIOD_CHOICES = [
+        ('annual', 'Annual'),
+        ('quarterly', 'Quarterly'),
+    ]
+    
+    ticker = models.CharField(max_length=10)
+    statement = models.CharField(max_length=10, choices=STATEMENT_CHOICES)
+    period_type = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    line_item = models.CharField(max_length=100)
+    position = models.PositiveSmallIntegerField(default=0)  # Row order as reported by yfinance
+    period_end = models.DateField()
+    value = models.FloatField(null=True, blank=True)
+    last_updated = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        # Also serves as the index for reading one statement of a ticker
+        unique_together = ('ticker', 'statement', 'period_type', 'line_item', 'period_end')
+    
+    def __str__(self):
+        return f"{self.ticker} {self.statement} ({self.period_type}): {self.line_item} {self.period_end}"
+
+class PriceSeries(models.Model):
+    """Model to track how much OHLCV history is stored locally for a ticker."""
+    ticker = models.CharField(max_length=10)
+    interval = models.CharField(max_length=5)
+    start = models.DateTimeField(null=True, blank=True)  # None once the full history is stored
+    tz_name = models.CharField(max_length=64, default='UTC')  # Exchange timezone of the bars
+    last_fetched = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ('ticker', 'interval')
+    
+    def __str__(self):
+        return f"{self.ticker} {self.interval} bars"
+
+class PriceBar(models.Model):
+    """Model to store OHLCV bars fetched from yfinance."""
+    ticker = models.CharField(max_length=10)
+    interval = models.CharField(max_length=5)
+    timestamp = models.DateTimeField()
+    open = models.FloatField(null=True, blank=True)
+    high = models.FloatField(null=True, blank=True)
+    low = models.FloatField(null=True, blank=True)
+    close = models.FloatField(null=True, blank=True)
+    volume = models.BigIntegerField(null=True, blank=True)
+    
+    class Meta:
+        # Also serves as the index for (ticker, interval) range reads
+        unique_together = ('ticker', 'interval', 'timestamp')
+    
+    def __str__(self):
+        return f"{self.ticker} {self.interval} @ {self.timestamp}"
+
+class TickerAccess(models.Model):
+    """Model to count how often each ticker's pages and charts are requested."""
+    ticker = models.CharField(max_length=10, primary_key=True)
+    count = models.PositiveBigIntegerField(default=0)  # Every request ever counted
+    # Requests with older ones decayed away, as of score_updated
+    score = models.FloatField(default=0)
+    score_updated = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"{self.ticker}: {self.count} requests"
+
+class RefreshLease(models.Model):
+    """Model to let only one process at a time refresh the data behind a key."""
+    key = models.CharField(max_length=100, primary_key=True)
+    owner = models.CharField(max_length=64)
+    expires_at = models.DateTimeField()
     
     def __str__(self):
-        return f"Search for: {self.query}"
\ No newline at end of file
+        return f"Lease on {self.key} until {self.expires_at}"
\ No newline at end of file
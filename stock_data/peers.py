@@ -0,0 +1,128 @@
+# stock_data/peers.py
+import logging
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Company, CompanyPeer
+
+logger = logging.getLogger(__name__)
+
+PEER_COUNT = 5
+
+def _distance(market_cap, peer_market_cap):
+    """Order key for a candidate peer: closest market cap first, unknown sizes last."""
+    if not peer_market_cap or peer_market_cap <= 0:
+        return math.inf
+    if not market_cap or market_cap <= 0:
+        # Without a size to compare to, the largest companies are the most useful peers
+        return -math.log(peer_market_cap)
+    return abs(math.log(peer_market_cap / market_cap))
+
+def compute_peers(tickers, count=PEER_COUNT):
+    """Rank peers for each ticker, same industry first and then same sector.
+
+    Returns a dict of ticker to a list of (peer ticker, match) pairs.
+    """
+    fields = ('ticker', 'sector', 'industry', 'financials__market_cap')
+    companies = list(Company.objects.filter(ticker__in=tickers).values_list(*fields))
+    sectors = {sector for _, sector, _, _ in companies if sector}
+
+    # One indexed query fetches every candidate for the whole batch
+    by_sector = defaultdict(list)
+    by_industry = defaultdict(list)
+    for candidate in Company.objects.filter(sector__in=sectors).values_list(*fields):
+        by_sector[candidate[1]].append(candidate)
+        if candidate[2]:
+            by_industry[(candidate[1], candidate[2])].append(candidate)
+
+    peers = {}
+    for ticker, sector, industry, market_cap in companies:
+        ranked = []
+        seen = {ticker}
+        pools = [('industry', by_industry.get((sector, industry), [])), ('sector', by_sector.get(sector, []))]
+
+        for match, pool in pools:
+            for candidate in sorted(pool, key=lambda c: (_distance(market_cap, c[3]), c[0])):
+                if len(ranked) >= count:
+                    break
+                if candidate[0] not in seen:
+                    seen.add(candidate[0])
+                    ranked.append((candidate[0], match))
+
+        peers[ticker] = ranked
+    return peers
+
+def _affected(tickers):
+    """The given companies plus those whose peer groups they may have entered or left.
+
+    Same-industry companies rank each other first, and companies already
+    listing one of them may need to drop it after its industry or size changed.
+    """
+    industries = set(
+        Company.objects.filter(ticker__in=tickers, industry__isnull=False)
+        .exclude(industry='')
+        .values_list('industry', flat=True)
+    )
+    related = Company.objects.filter(
+        Q(ticker__in=tickers) | Q(industry__in=industries) | Q(peer_links__peer_id__in=tickers)
+    )
+    return set(tickers) | set(related.values_list('ticker', flat=True))
+
+def update_peers(tickers, count=PEER_COUNT, include_related=True):
+    """Recompute and store the peer groups of the given companies.
+
+    With include_related, the groups of their industry members and of companies
+    listing them as peers are recomputed too, so peer groups stay symmetric
+    within an industry. Sector-wide fallback peers are kept current by rebuild_peers.
+    """
+    tickers = list(tickers)
+    if not tickers:
+        return
+
+    if include_related:
+        tickers = sorted(_affected(tickers))
+    peers = compute_peers(tickers, count=count)
+    links = [
+        CompanyPeer(company_id=ticker, peer_id=peer, rank=rank, match=match)
+        for ticker, ranked in peers.items()
+        for rank, (peer, match) in enumerate(ranked, start=1)
+    ]
+
+    with transaction.atomic():
+        CompanyPeer.objects.filter(company_id__in=tickers).delete()
+        CompanyPeer.objects.bulk_create(links, batch_size=500)
+        Company.objects.filter(ticker__in=tickers).update(peers_updated=timezone.now())
+
+def rebuild_peers(count=PEER_COUNT):
+    """Recompute every stored peer group, one sector at a time.
+
+    Returns the number of companies whose peers were recomputed.
+    """
+    sectors = Company.objects.order_by().values_list('sector', flat=True).distinct()
+    total = 0
+    for sector in sectors:
+        tickers = list(Company.objects.filter(sector=sector).values_list('ticker', flat=True))
+        update_peers(tickers, count=count, include_related=False)
+        total += len(tickers)
+    return total
+
+def _stored_peers(company):
+    return list(
+        Company.objects.filter(peer_of__company=company)
+        .select_related('financials')
+        .order_by('peer_of__rank')
+    )
+
+def get_peers(company):
+    """Return a company's stored peers with their financials, in one joined query."""
+    peers = _stored_peers(company)
+    if peers or not company.sector or company.peers_updated:
+        return peers
+
+    # Peer groups are computed at refresh time; fill them in once for companies refreshed before that
+    update_peers([company.ticker], include_related=False)
+    return _stored_peers(company)
@@ -0,0 +1,160 @@
+# stock_data/piotroski.py
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .models import FinancialStatement
+from .profiling import phase
+
+logger = logging.getLogger(__name__)
+
+# Annual line items the F-score reads, with the statement each comes from
+LINE_ITEMS = {
+    'Net Income': 'income',
+    'Total Revenue': 'income',
+    'Gross Profit': 'income',
+    'Total Assets': 'balance',
+    'Long Term Debt': 'balance',
+    'Current Assets': 'balance',
+    'Current Liabilities': 'balance',
+    'Ordinary Shares Number': 'balance',
+    'Share Issued': 'balance',
+    'Operating Cash Flow': 'cashflow',
+}
+
+# The nine signals, each worth one point
+SIGNALS = (
+    'positive_roa',
+    'positive_cfo',
+    'improving_roa',
+    'cfo_exceeds_net_income',
+    'lower_leverage',
+    'higher_current_ratio',
+    'no_dilution',
+    'higher_gross_margin',
+    'higher_asset_turnover',
+)
+
+@phase('pandas')
+def build_panel(records):
+    """Stack statement records into the latest and prior fiscal year per ticker.
+
+    records has ticker, statement, line_item, period_end and value columns.
+    Returns (current, previous) DataFrames indexed by ticker with one column per
+    line item; missing values are NaN.
+    """
+    records = records[
+        records['line_item'].map(LINE_ITEMS).eq(records['statement'])
+    ].copy()
+    records['period_end'] = pd.to_datetime(records['period_end'])
+    records['value'] = pd.to_numeric(records['value'])
+
+    # Years are ranked per statement, skipping columns yfinance reports with no values at all
+    periods = records.dropna(subset=['value'])[['ticker', 'statement', 'period_end']].drop_duplicates()
+    periods['year'] = periods.groupby(['ticker', 'statement'])['period_end'].rank(method='first', ascending=False)
+    records = records.merge(periods[periods['year'] <= 2], on=['ticker', 'statement', 'period_end'])
+
+    panel = records.pivot_table(index='ticker', columns=['year', 'line_item'], values='value', aggfunc='first')
+    tickers = panel.index
+
+    def year(rank):
+        if rank not in panel.columns.get_level_values(0):
+            return pd.DataFrame(np.nan, index=tickers, columns=list(LINE_ITEMS))
+        return panel[rank].reindex(columns=list(LINE_ITEMS))
+
+    return year(1.0), year(2.0)
+
+def _ratio(numerator, denominator):
+    """Divide, treating a zero denominator as missing."""
+    return numerator / denominator.where(denominator != 0)
+
+def _signal(passed, *inputs):
+    """A 1/0 signal that is NaN wherever one of its inputs is missing."""
+    known = np.logical_and.reduce([value.notna() for value in inputs])
+    return passed.astype(float).where(known)
+
+@phase('pandas')
+def score_panel(current, previous):
+    """Compute all nine F-score signals for every ticker at once.
+
+    Returns a DataFrame indexed by ticker with a nullable boolean column per
+    signal (NA where its inputs are missing), the number of missing signals,
+    and the score, which is NA unless every signal could be evaluated.
+    """
+    net_income = current['Net Income']
+    assets, prev_assets = current['Total Assets'], previous['Total Assets']
+    cfo = current['Operating Cash Flow']
+
+    roa = _ratio(net_income, assets)
+    prev_roa = _ratio(previous['Net Income'], prev_assets)
+
+    # Companies without long-term debt have no such line, which means zero rather than unknown
+    leverage = _ratio(current['Long Term Debt'].fillna(0), assets)
+    prev_leverage = _ratio(previous['Long Term Debt'].fillna(0), prev_assets)
+
+    current_ratio = _ratio(current['Current Assets'], current['Current Liabilities'])
+    prev_current_ratio = _ratio(previous['Current Assets'], previous['Current Liabilities'])
+
+    shares = current['Ordinary Shares Number'].fillna(current['Share Issued'])
+    prev_shares = previous['Ordinary Shares Number'].fillna(previous['Share Issued'])
+
+    margin = _ratio(current['Gross Profit'], current['Total Revenue'])
+    prev_margin = _ratio(previous['Gross Profit'], previous['Total Revenue'])
+
+    turnover = _ratio(current['Total Revenue'], assets)
+    prev_turnover = _ratio(previous['Total Revenue'], prev_assets)
+
+    signals = pd.DataFrame({
+        'positive_roa': _signal(roa > 0, roa),
+        'positive_cfo': _signal(cfo > 0, cfo),
+        'improving_roa': _signal(roa > prev_roa, roa, prev_roa),
+        'cfo_exceeds_net_income': _signal(cfo > net_income, cfo, net_income),
+        'lower_leverage': _signal(leverage < prev_leverage, leverage, prev_leverage),
+        'higher_current_ratio': _signal(current_ratio > prev_current_ratio, current_ratio, prev_current_ratio),
+        'no_dilution': _signal(shares <= prev_shares, shares, prev_shares),
+        'higher_gross_margin': _signal(margin > prev_margin, margin, prev_margin),
+        'higher_asset_turnover': _signal(turnover > prev_turnover, turnover, prev_turnover),
+    }, index=current.index)
+
+    missing = signals.isna().sum(axis=1)
+    scores = signals.astype('boolean')
+    scores['missing'] = missing
+    scores['score'] = signals.sum(axis=1).astype('Int64').mask(missing > 0)
+    return scores
+
+def load_records(tickers=None):
+    """Read the stored annual line items the F-score needs as records for build_panel."""
+    rows = FinancialStatement.objects.filter(period_type='annual', line_item__in=list(LINE_ITEMS))
+    if tickers is not None:
+        rows = rows.filter(ticker__in=list(tickers))
+    return pd.DataFrame.from_records(
+        list(rows.values_list('ticker', 'statement', 'line_item', 'period_end', 'value').iterator(chunk_size=10000)),
+        columns=['ticker', 'statement', 'line_item', 'period_end', 'value'],
+    )
+
+def statement_records(items):
+    """Turn (ticker, statements) pairs of fetched DataFrames into records for build_panel."""
+    frames = []
+    for ticker, statements in items:
+        for statement in ('income', 'balance', 'cashflow'):
+            df = statements.get((statement, 'annual'))
+            if df is None or df.empty:
+                continue
+            needed = df.loc[[item for item in df.index if item in LINE_ITEMS]]
+            rows, columns = needed.shape
+            frames.append(pd.DataFrame({
+                'ticker': ticker,
+                'statement': statement,
+                'line_item': np.repeat(needed.index.to_numpy(), columns),
+                'period_end': np.tile(needed.columns.to_numpy(), rows),
+                'value': needed.to_numpy(dtype=float).ravel(),
+            }))
+
+    if not frames:
+        return pd.DataFrame(columns=['ticker', 'statement', 'line_item', 'period_end', 'value'])
+    return pd.concat(frames, ignore_index=True)
+
+def score_tickers(tickers=None):
+    """Score stored companies from their stored statements in one pass."""
+    return score_panel(*build_panel(load_records(tickers)))
@@ -0,0 +1,158 @@
+# stock_data/popularity.py
+import atexit
+import datetime
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from .background import enqueue
+from .models import Company, TickerAccess
+
+logger = logging.getLogger(__name__)
+
+# Popularity halves after this long without requests
+HALF_LIFE = datetime.timedelta(days=3)
+# Tickers not requested for this long have decayed to nothing and are forgotten
+FORGET_AFTER = HALF_LIFE * 20
+# Counts reach the database at most this often per process
+FLUSH_INTERVAL = 30
+# The popular list is recomputed at most this often
+POPULAR_TIMEOUT = 5 * 60
+POPULAR_KEY = 'popularity:popular'
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+def _cache():
+    return caches[getattr(settings, 'STOCK_DATA_CACHE', 'default')]
+
+def record_access(tickers):
+    """Count a request for each ticker; counts reach the database in batches."""
+    with _counts_lock:
+        _counts.update(tickers)
+        due = time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if due:
+        # The upsert runs on the background pool, off the request path
+        enqueue('popularity:flush', flush_access_counts)
+
+def track_access(tickers=None):
+    """Count successful requests of a view toward its tickers' popularity.
+
+    tickers(request, *args, **kwargs) returns the tickers a request is for,
+    defaulting to the view's ticker URL argument. Applied outside
+    conditional_view, so revalidated (304) requests count too. Tickers that
+    are not stored companies are dropped when the counts are flushed.
+    """
+    def requested(request, *args, **kwargs):
+        return tickers(request, *args, **kwargs) if tickers else [kwargs['ticker'].upper()]
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                response = await view(request, *args, **kwargs)
+                if response.status_code in (200, 304):
+                    record_access(requested(request, *args, **kwargs))
+                return response
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                response = view(request, *args, **kwargs)
+                if response.status_code in (200, 304):
+                    record_access(requested(request, *args, **kwargs))
+                return response
+
+        return wrapper
+    return decorator
+
+def decayed(score, updated, now):
+    """Decay a score stored at updated to now."""
+    return score * 0.5 ** ((now - updated) / HALF_LIFE)
+
+def flush_access_counts():
+    """Add this process's counts to the stored ones in one batched upsert."""
+    global _last_flush
+
+    with _counts_lock:
+        counts = dict(_counts)
+        _counts.clear()
+        _last_flush = time.monotonic()
+    if not counts:
+        return
+
+    now = timezone.now()
+    try:
+        # Only tickers the symbol index knows are worth ranking; anything else is a typo or a probe
+        known = set(Company.objects.filter(ticker__in=list(counts)).values_list('ticker', flat=True))
+        counts = {ticker: count for ticker, count in counts.items() if ticker in known}
+        with transaction.atomic():
+            # Rows are locked where the database supports it, so flushes from other processes add up
+            stored = TickerAccess.objects.select_for_update().in_bulk(list(counts))
+            rows = []
+            for ticker, count in counts.items():
+                row = stored.get(ticker)
+                rows.append(TickerAccess(
+                    ticker=ticker,
+                    count=(row.count if row else 0) + count,
+                    score=(decayed(row.score, row.score_updated, now) if row else 0) + count,
+                    score_updated=now,
+                ))
+            TickerAccess.objects.bulk_create(
+                rows,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['ticker'],
+                update_fields=['count', 'score', 'score_updated'],
+            )
+            TickerAccess.objects.filter(score_updated__lt=now - FORGET_AFTER).delete()
+    except OperationalError as e:
+        logger.error(f"Error saving access counts for {len(counts)} tickers: {e}")
+        # Most likely a locked database, so keep them for the next flush
+        with _counts_lock:
+            _counts.update(counts)
+    except Exception as e:
+        # Retrying would fail the same way and hold back every later count
+        logger.error(f"Error saving access counts for {len(counts)} tickers, dropping them: {e}")
+
+# Counts since the last flush would otherwise be lost when the process exits
+atexit.register(flush_access_counts)
+
+def access_rates(now=None):
+    """Return recent requests per day for each tracked ticker, most requested first."""
+    now = now or timezone.now()
+    # A steady rate of r requests per day decays to a score of r * half-life / ln 2
+    per_day = math.log(2) / (HALF_LIFE / datetime.timedelta(days=1))
+    rows = TickerAccess.objects.filter(score_updated__gte=now - FORGET_AFTER).values_list('ticker', 'score', 'score_updated')
+    rates = {ticker: decayed(score, updated, now) * per_day for ticker, score, updated in rows}
+    return dict(sorted(rates.items(), key=lambda item: item[1], reverse=True))
+
+def popular_companies(limit=5):
+    """Return (ticker, name) of the most requested stored companies, recomputed every few minutes."""
+    cache = _cache()
+    try:
+        popular = cache.get(POPULAR_KEY)
+    except Exception as e:
+        logger.error(f"Error reading popular companies: {e}")
+        popular = None
+
+    if popular is None:
+        # Tracked tickers may since have been deleted, so only stored companies qualify
+        candidates = list(access_rates())[:limit * 4]
+        names = dict(Company.objects.filter(ticker__in=candidates).values_list('ticker', 'name'))
+        popular = [(ticker, names[ticker]) for ticker in candidates if ticker in names]
+        try:
+            cache.set(POPULAR_KEY, popular, timeout=POPULAR_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error caching popular companies: {e}")
+
+    return popular[:limit]
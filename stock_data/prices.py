@@ -0,0 +1,309 @@
+# stock_data/prices.py
+import datetime
+import logging
+import math
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.utils import timezone
+
+from .locks import single_flight
+from .models import PriceBar, PriceSeries
+from .profiling import phase
+from .upstream import download_histories, get_history, run_parallel
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# How long a stored series is served before its tail is fetched again
+REFRESH_AFTER = {
+    '1m': datetime.timedelta(minutes=1),
+    '2m': datetime.timedelta(minutes=2),
+    '5m': datetime.timedelta(minutes=5),
+    '15m': datetime.timedelta(minutes=15),
+    '30m': datetime.timedelta(minutes=30),
+    '60m': datetime.timedelta(hours=1),
+    '90m': datetime.timedelta(hours=1),
+    '1h': datetime.timedelta(hours=1),
+    '1d': datetime.timedelta(minutes=15),
+    '5d': datetime.timedelta(hours=1),
+    '1wk': datetime.timedelta(hours=1),
+    '1mo': datetime.timedelta(hours=6),
+    '3mo': datetime.timedelta(hours=6),
+}
+DEFAULT_REFRESH_AFTER = datetime.timedelta(minutes=15)
+
+def period_start(period, now=None):
+    """Return the earliest timestamp covered by a yfinance period string (None for 'max')."""
+    now = now or timezone.now()
+
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    if period.endswith('mo'):
+        return now - relativedelta(months=int(period[:-2]))
+    if period.endswith('y'):
+        return now - relativedelta(years=int(period[:-1]))
+    if period.endswith('d'):
+        # Day periods count trading sessions, so look back far enough to span weekends and holidays
+        days = int(period[:-1])
+        return now - datetime.timedelta(days=days * 2 + 4)
+
+    raise ValueError(f"Unsupported period '{period}'")
+
+def _session_count(period):
+    """Return N for trading-day periods like '5d', otherwise None."""
+    if period.endswith('d') and period[:-1].isdigit():
+        return int(period[:-1])
+    return None
+
+def _is_covered(series, start):
+    """Check if the stored series reaches back to the requested start."""
+    if series.start is None:
+        return True
+    return start is not None and series.start <= start
+
+def _clean(value, cast=float):
+    """Convert a pandas value to a database value, mapping NaN to None."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return cast(value)
+
+def _has_corporate_actions(hist, after=None):
+    """Check if the fetched bars contain a dividend or split that re-adjusts earlier prices."""
+    actions = hist.reindex(columns=['Dividends', 'Stock Splits']).fillna(0)
+    if after is not None:
+        actions = actions[actions.index > after]
+    return bool((actions != 0).any().any())
+
+def _store_bars(ticker, interval, hist):
+    """Upsert fetched bars into the local store."""
+    bars = [
+        PriceBar(
+            ticker=ticker,
+            interval=interval,
+            timestamp=date.to_pydatetime(),
+            open=_clean(row['Open']),
+            high=_clean(row['High']),
+            low=_clean(row['Low']),
+            close=_clean(row['Close']),
+            volume=_clean(row['Volume'], int),
+        )
+        for date, row in hist.reindex(columns=PRICE_COLUMNS).iterrows()
+    ]
+    PriceBar.objects.bulk_create(
+        bars,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['ticker', 'interval', 'timestamp'],
+        update_fields=['open', 'high', 'low', 'close', 'volume'],
+    )
+
+def _fetch_full(ticker, period, interval, start, series):
+    """Fetch a whole period upstream and replace what is stored for it."""
+    hist = get_history(ticker, period=period, interval=interval)
+    return _save_full(ticker, interval, start, series, hist)
+
+def _save_full(ticker, interval, start, series, hist):
+    """Replace the stored bars of a series with a freshly fetched period."""
+    if hist.empty:
+        return series
+
+    with transaction.atomic():
+        if series is None:
+            series = PriceSeries(ticker=ticker, interval=interval)
+        else:
+            # Adjusted prices before the fetched window may be on a different basis now
+            PriceBar.objects.filter(ticker=ticker, interval=interval).delete()
+        _store_bars(ticker, interval, hist)
+        series.start = start
+        series.tz_name = str(hist.index.tz or 'UTC')
+        series.last_fetched = timezone.now()
+        series.save()
+
+    return series
+
+def _last_bar(ticker, interval):
+    """Return the timestamp of the newest stored bar, if any."""
+    return (
+        PriceBar.objects.filter(ticker=ticker, interval=interval)
+        .order_by('-timestamp')
+        .values_list('timestamp', flat=True)
+        .first()
+    )
+
+def _fetch_tail(ticker, period, interval, start, series):
+    """Fetch only the bars after the newest stored one and append them."""
+    last_bar = _last_bar(ticker, interval)
+    if last_bar is None:
+        return _fetch_full(ticker, period, interval, start, series)
+
+    # Start at the last stored bar so a bar that was still forming gets its final values
+    hist = get_history(ticker, start=last_bar, interval=interval)
+    return _save_tail(ticker, period, interval, start, series, hist, last_bar)
+
+def _save_tail(ticker, period, interval, start, series, hist, last_bar):
+    """Append fetched bars from last_bar on, re-fetching everything after a corporate action."""
+    if _has_corporate_actions(hist, after=last_bar):
+        # Auto-adjusted history changes retroactively, so the stored bars are no longer valid
+        if series.start is None:
+            return _fetch_full(ticker, 'max', interval, None, series)
+        return _fetch_full(ticker, period, interval, start, series)
+
+    with transaction.atomic():
+        if not hist.empty:
+            _store_bars(ticker, interval, hist)
+        series.last_fetched = timezone.now()
+        series.save(update_fields=['last_fetched'])
+
+    return series
+
+def _read_bars(ticker, interval, period, start, tz_name):
+    """Read stored bars for the requested period as a yfinance-style DataFrame."""
+    bars = PriceBar.objects.filter(ticker=ticker, interval=interval)
+    sessions = _session_count(period)
+    if sessions:
+        # Count sessions back from the newest stored bar, which may be older than today
+        latest = bars.order_by('-timestamp').values_list('timestamp', flat=True).first()
+        start = period_start(period, now=latest) if latest else None
+    if start is not None:
+        bars = bars.filter(timestamp__gte=start)
+    rows = bars.order_by('timestamp').values_list('timestamp', 'open', 'high', 'low', 'close', 'volume')
+    return _bars_frame(list(rows), sessions, tz_name)
+
+@phase('pandas')
+def _bars_frame(rows, sessions, tz_name):
+    hist = pd.DataFrame.from_records(rows, columns=['Date'] + PRICE_COLUMNS)
+    hist.index = pd.DatetimeIndex(pd.to_datetime(hist.pop('Date'), utc=True)).tz_convert(tz_name)
+    hist.index.name = 'Date'
+
+    if sessions and not hist.empty:
+        # Keep only the last N trading sessions, as yfinance does for day periods
+        dates = hist.index.normalize()
+        hist = hist[dates.isin(dates.unique()[-sessions:])]
+
+    return hist
+
+def _empty_history():
+    """A history with no bars, shaped like a stored one so consumers need no special case."""
+    return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], tz='UTC', name='Date'), dtype=float)
+
+def _needs_tail(series, interval):
+    """Check if a stored series is old enough to fetch its tail again."""
+    return timezone.now() - series.last_fetched > REFRESH_AFTER.get(interval, DEFAULT_REFRESH_AFTER)
+
+def _read_history(ticker, period, interval, start, series):
+    """Read a stored series for the requested period, tagged with when it was fetched."""
+    if series is None:
+        return _empty_history()
+
+    hist = _read_bars(ticker, interval, period, start, series.tz_name)
+    hist.attrs['as_of'] = series.last_fetched
+    return hist
+
+def stored_as_of(ticker, period='ytd', interval='1d'):
+    """Return when the stored series was fetched, or None if serving it would fetch first."""
+    try:
+        start = period_start(period)
+    except ValueError:
+        return None
+    series = PriceSeries.objects.filter(ticker=ticker, interval=interval).first()
+    if series is None or not _is_covered(series, start) or _needs_tail(series, interval):
+        return None
+    return series.last_fetched
+
+def _refresh_series(ticker, period, interval, start, series):
+    """Fetch whatever the stored series is missing for the period, returning the series."""
+    try:
+        if series is None or not _is_covered(series, start):
+            return _fetch_full(ticker, period, interval, start, series)
+        if _needs_tail(series, interval):
+            return _fetch_tail(ticker, period, interval, start, series)
+    except Exception as e:
+        # Serve whatever is stored rather than failing the request
+        logger.error(f"Error fetching price history for {ticker} ({period}, {interval}): {e}")
+    return series
+
+def get_price_history(ticker, period='ytd', interval='1d'):
+    """Get OHLCV history from the local store, fetching only missing bars from yfinance."""
+    start = period_start(period)
+    series = PriceSeries.objects.filter(ticker=ticker, interval=interval).first()
+
+    if series is None or not _is_covered(series, start) or _needs_tail(series, interval):
+        # Only one caller fetches a series at a time; the others wait and read what it stored
+        with single_flight(f'prices:{ticker}:{interval}') as acquired:
+            series = PriceSeries.objects.filter(ticker=ticker, interval=interval).first()
+            if acquired:
+                series = _refresh_series(ticker, period, interval, start, series)
+
+    return _read_history(ticker, period, interval, start, series)
+
+def _download(tickers, series_by_ticker, **kwargs):
+    """Download several stored series at once, each in the timezone it is stored in."""
+    try:
+        fetched = download_histories(tickers, **kwargs)
+    except Exception as e:
+        logger.error(f"Error fetching price history for {', '.join(tickers)} ({kwargs}): {e}")
+        return {}
+
+    for ticker, hist in fetched.items():
+        if not hist.empty and hist.index.tz is not None:
+            fetched[ticker] = hist.tz_convert(series_by_ticker[ticker].tz_name)
+    return fetched
+
+def get_price_histories(tickers, period='ytd', interval='1d'):
+    """Get histories for several tickers, fetching what is missing in batched downloads.
+
+    Returns a dict of ticker to DataFrame, as get_price_history would for each.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    start = period_start(period)
+    series_by_ticker = {series.ticker: series for series in PriceSeries.objects.filter(ticker__in=tickers, interval=interval)}
+
+    new = []
+    full = []
+    tails = {}
+    for ticker in tickers:
+        series = series_by_ticker.get(ticker)
+        if series is None:
+            new.append(ticker)
+        elif not _is_covered(series, start):
+            full.append(ticker)
+        elif _needs_tail(series, interval):
+            last_bar = _last_bar(ticker, interval)
+            if last_bar is None:
+                full.append(ticker)
+            else:
+                tails[ticker] = last_bar
+
+    if new:
+        # A batched download reports one timezone for all tickers, so first fetches
+        # go through each ticker's own history call to learn its exchange timezone
+        fetched = run_parallel(lambda ticker: _fetch_full(ticker, period, interval, start, None), new)
+        series_by_ticker.update((ticker, series) for ticker, series in fetched.items() if series is not None)
+
+    if full:
+        for ticker, hist in _download(full, series_by_ticker, period=period, interval=interval).items():
+            try:
+                series_by_ticker[ticker] = _save_full(ticker, interval, start, series_by_ticker[ticker], hist)
+            except Exception as e:
+                logger.error(f"Error storing price history for {ticker} ({period}, {interval}): {e}")
+
+    if tails:
+        # One download from the oldest stored bar covers every tail
+        for ticker, hist in _download(list(tails), series_by_ticker, start=min(tails.values()), interval=interval).items():
+            last_bar = tails[ticker]
+            if not hist.empty:
+                hist = hist[hist.index >= last_bar]
+            try:
+                series_by_ticker[ticker] = _save_tail(ticker, period, interval, start, series_by_ticker[ticker], hist, last_bar)
+            except Exception as e:
+                logger.error(f"Error storing price history for {ticker} ({period}, {interval}): {e}")
+
+    return {
+        ticker: _read_history(ticker, period, interval, start, series_by_ticker.get(ticker))
+        for ticker in tickers
+    }
@@ -0,0 +1,160 @@
+# stock_data/profiling.py
+import contextvars
+import cProfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.template.backends.django import DjangoTemplates, Template
+
+# Server-Timing order; phases nobody entered are left out
+PHASES = ('get_company_data', 'yfinance', 'pandas', 'db', 'template')
+
+_active_profile = contextvars.ContextVar('stock_data_request_profile', default=None)
+_open_phases = contextvars.ContextVar('stock_data_open_phases', default=frozenset())
+# cProfile capture is costly, so only one request is captured at a time
+_capture_lock = threading.Lock()
+
+class RequestProfile:
+    """Wall time and entry counts per phase for one request.
+
+    Phases overlap: get_company_data includes the yfinance and db time spent
+    inside it, and phases running on several threads at once add up, so they
+    can exceed the total.
+    """
+
+    def __init__(self, capture=False):
+        self.started = time.perf_counter()
+        self.total = None
+        self.phases = {}
+        self.capture = capture
+        self.profilers = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            elapsed, count = self.phases.get(name, (0.0, 0))
+            self.phases[name] = (elapsed + seconds, count + 1)
+
+    def seconds(self, name):
+        return self.phases.get(name, (0.0, 0))[0]
+
+    def count(self, name):
+        return self.phases.get(name, (0.0, 0))[1]
+
+    def server_timing(self):
+        """Render the phases as a Server-Timing header value, in milliseconds."""
+        entries = []
+        for name in PHASES:
+            if name not in self.phases:
+                continue
+            elapsed, count = self.phases[name]
+            entries.append(f'{name};dur={elapsed * 1000:.1f};desc="{count}x"')
+        entries.append(f'total;dur={(self.total or 0) * 1000:.1f}')
+        return ', '.join(entries)
+
+    def record(self):
+        """The profile as a dict of plain values, for structured logs."""
+        return {
+            'total_ms': round((self.total or 0) * 1000, 1),
+            'phases_ms': {name: round(elapsed * 1000, 1) for name, (elapsed, _) in self.phases.items()},
+            'db_queries': self.count('db'),
+            'upstream_calls': self.count('yfinance'),
+        }
+
+def _start_profiler(profile):
+    """Run the calling thread under cProfile for the profile, or return None if cProfile is taken.
+
+    From Python 3.12 cProfile sees every thread through sys.monitoring, which
+    allows one profiler per process: the request thread's then covers its
+    worker threads, and a debugger or coverage tool can hold it already.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    with profile._lock:
+        profile.profilers.append(profiler)
+    return profiler
+
+@contextmanager
+def request_profile(capture=False):
+    """Profile everything run in this context, and in threads that copy it, as one request.
+
+    With capture, the calling thread runs under cProfile too, unless another
+    request is already being captured or cProfile is in use; profile.capture
+    says which happened.
+    """
+    profile = RequestProfile()
+    profiler = None
+    if capture and _capture_lock.acquire(blocking=False):
+        profiler = _start_profiler(profile)
+        if profiler is None:
+            _capture_lock.release()
+    profile.capture = profiler is not None
+    token = _active_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _capture_lock.release()
+        profile.total = time.perf_counter() - profile.started
+        _active_profile.reset(token)
+
+def current_profile():
+    """Return the active request profile, if any."""
+    return _active_profile.get()
+
+@contextmanager
+def phase(name):
+    """Attribute the wall time of a block, or of every call to a decorated function, to a phase.
+
+    Does nothing outside a request profile. Time inside a phase of the same
+    name that is already open is not counted twice.
+    """
+    profile = _active_profile.get()
+    if profile is None or name in _open_phases.get():
+        yield
+        return
+
+    token = _open_phases.set(_open_phases.get() | {name})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - started)
+        _open_phases.reset(token)
+
+@contextmanager
+def profile_thread():
+    """Run a worker thread under cProfile too when the request it works for is being captured."""
+    profile = _active_profile.get()
+    if profile is None or not profile.capture:
+        yield
+        return
+
+    profiler = _start_profiler(profile)
+    if profiler is None:
+        # Already covered by the request thread's profiler
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        with phase('template'):
+            return super().render(context, request)
+
+class ProfiledTemplates(DjangoTemplates):
+    """The Django template backend, timing every render as the template phase."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name).template, self)
@@ -0,0 +1,232 @@
+# stock_data/refresh.py
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import connection, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .aggregates import update_aggregates
+from .company_cache import invalidate_company
+from .models import Company, FinancialData
+from .peers import update_peers
+from .statements import fetch_statements, store_statements
+from .upstream import fetch_context
+from .utils import fetch_company_info, fetch_financial_data
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Token bucket shared by refresh workers to cap upstream requests per second."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then spend it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+class RefreshResult:
+    """Outcome of fetching fresh data for one company."""
+
+    def __init__(self, company, ok, elapsed, upstream_calls, error=None,
+                 company_info=None, financial_data=None, statements=None):
+        self.company = company
+        self.ok = ok
+        self.elapsed = elapsed
+        self.upstream_calls = upstream_calls
+        self.error = error
+        self.company_info = company_info
+        self.financial_data = financial_data
+        self.statements = statements
+
+class RefreshWriter:
+    """Accumulate refreshed companies and write them in batched transactions."""
+
+    COMPANY_FIELDS = ['name', 'exchange', 'sector', 'industry', 'country', 'website', 'logo_url', 'last_updated']
+    FINANCIAL_FIELDS = [
+        field.name for field in FinancialData._meta.concrete_fields
+        if field.name not in ('id', 'company')
+    ]
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+        self.failed = 0
+
+    def add(self, result):
+        """Queue a fetched result, flushing once a full batch is pending."""
+        self.pending.append(result)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all pending results in one transaction."""
+        if not self.pending:
+            return
+
+        results, self.pending = self.pending, []
+        now = timezone.now()
+        companies = []
+        financials = []
+        statements = []
+
+        for result in results:
+            company = result.company
+            if result.company_info:
+                for key, value in result.company_info.items():
+                    if key != 'ticker' and hasattr(company, key):
+                        setattr(company, key, value)
+                company.last_updated = now
+                companies.append(company)
+            elif company._state.adding:
+                # Nothing to create a new company from
+                continue
+
+            if result.financial_data:
+                financials.append(FinancialData(company=company, last_updated=now, **result.financial_data))
+            if result.statements:
+                statements.append((company.ticker, result.statements))
+
+        try:
+            with transaction.atomic():
+                # Upserts, so new and existing rows go through the same statement
+                Company.objects.bulk_create(
+                    companies,
+                    batch_size=self.batch_size,
+                    update_conflicts=True,
+                    unique_fields=['ticker'],
+                    update_fields=self.COMPANY_FIELDS,
+                )
+                FinancialData.objects.bulk_create(
+                    financials,
+                    batch_size=self.batch_size,
+                    update_conflicts=True,
+                    unique_fields=['company'],
+                    update_fields=self.FINANCIAL_FIELDS,
+                )
+                store_statements(statements)
+            self.written += len(results)
+        except Exception as e:
+            logger.error(f"Error writing batch of {len(results)} refreshed companies: {e}")
+            self.failed += len(results)
+            return
+
+        # Cached page payloads were built from the data just replaced
+        invalidate_company({result.company.ticker for result in results})
+
+        try:
+            update_peers([company.ticker for company in companies])
+        except Exception as e:
+            logger.error(f"Error updating peers for batch of {len(companies)} companies: {e}")
+
+        try:
+            update_aggregates([company.ticker for company in companies] + [financial.company_id for financial in financials])
+        except Exception as e:
+            logger.error(f"Error updating sector aggregates for batch of {len(results)} companies: {e}")
+
+def fetch_company_refresh(company, limiter=None):
+    """Fetch fresh info, financials and statements for a company without writing them."""
+    started = time.perf_counter()
+    ticker = company.ticker
+
+    with fetch_context(limiter=limiter, endpoint='refresh') as context:
+        company_info = fetch_company_info(ticker)
+        try:
+            statements = fetch_statements(ticker)
+        except Exception as e:
+            logger.error(f"Error fetching statements for {ticker}: {e}")
+            statements = {}
+        financial_data = fetch_financial_data(ticker, statements=statements)
+
+    # Nothing fresh came back, or a company that is not stored yet has no info to create it from
+    ok = (company_info is not None or financial_data is not None) and (company_info is not None or not company._state.adding)
+    return RefreshResult(
+        company, ok, time.perf_counter() - started, context.calls,
+        company_info=company_info, financial_data=financial_data, statements=statements,
+    )
+
+def refresh_company(company, limiter=None):
+    """Fetch fresh data for a company and save it.
+
+    Returns the RefreshResult, whose ok is only True if fresh data was both
+    fetched and written.
+    """
+    result = fetch_company_refresh(company, limiter=limiter)
+    if not result.ok:
+        return result
+
+    writer = RefreshWriter(batch_size=1)
+    writer.add(result)
+    if writer.failed:
+        result.ok = False
+    return result
+
+def record_failures(tickers):
+    """Count a failed refresh for each stored company, so the scheduler backs off retrying it."""
+    if not tickers:
+        return
+    try:
+        Company.objects.filter(ticker__in=tickers).update(
+            # A success since the last failure ends the run of failures
+            refresh_failures=Case(
+                When(refresh_failed_at__gt=F('last_updated'), then=F('refresh_failures') + 1),
+                default=1,
+            ),
+            refresh_failed_at=timezone.now(),
+        )
+    except Exception as e:
+        logger.error(f"Error recording failed refreshes of {len(tickers)} companies: {e}")
+
+def _fetch_in_worker(company, limiter):
+    """Fetch one company on a pool thread, capturing failures."""
+    started = time.perf_counter()
+    try:
+        return fetch_company_refresh(company, limiter=limiter)
+    except Exception as e:
+        logger.error(f"Error updating {company.ticker}: {e}")
+        return RefreshResult(company, False, time.perf_counter() - started, 0, error=e)
+    finally:
+        # Pool threads each hold their own connection (the price store is read while fetching)
+        connection.close()
+
+def refresh_companies(companies, workers=1, limiter=None, writer=None):
+    """Fetch companies on a worker pool, yielding a RefreshResult as each one finishes.
+
+    Successful results are handed to writer, which is flushed once every
+    company has been fetched; failed ones are recorded with record_failures.
+    """
+    writer = writer or RefreshWriter()
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_fetch_in_worker, company, limiter) for company in companies]
+            for future in as_completed(futures):
+                result = future.result()
+                if result.ok:
+                    writer.add(result)
+                if not result.ok or result.financial_data is None:
+                    # Saving just the info leaves the company as overdue as before
+                    failed.append(result.company.ticker)
+                yield result
+    finally:
+        writer.flush()
+        record_failures(failed)
@@ -0,0 +1,154 @@
+# stock_data/replay.py
+import datetime
+import json
+import os
+from functools import lru_cache
+
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from .statements import STATEMENT_ATTRIBUTES
+
+# Intervals recorded at period='max'; any other interval replays as no data, like an unknown ticker
+RECORDED_INTERVALS = ('1d', '1wk', '1mo')
+MANIFEST = 'manifest.json'
+
+def default_root():
+    """Where fixtures are recorded to and replayed from unless told otherwise."""
+    return os.path.join(settings.BASE_DIR, 'benchmarks', 'fixtures')
+
+def _path(root, ticker, name):
+    return os.path.join(root, ticker, name)
+
+@lru_cache(maxsize=8)
+def load_manifest(root):
+    """Return the manifest of a fixture directory."""
+    with open(os.path.join(root, MANIFEST)) as f:
+        manifest = json.load(f)
+    manifest['recorded_at'] = datetime.datetime.fromisoformat(manifest['recorded_at'])
+    return manifest
+
+@lru_cache(maxsize=512)
+def _read_frame(path, timezone_name=None):
+    """Read a recorded frame once per process; datetime indexes come back in timezone_name."""
+    frame = pd.read_csv(path, index_col=0)
+    if timezone_name is not None:
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.index, utc=True)).tz_convert(timezone_name)
+        frame.index.name = 'Date'
+    return frame
+
+def _shift(root, ticker, timezone_name):
+    """How far a ticker's recorded prices are moved forward so its newest bar falls in the current week.
+
+    Whole weeks keep every bar on the weekday it was recorded on, and periods
+    like ytd or 6mo find as much data as they did when recorded.
+    """
+    daily = _read_frame(_path(root, ticker, 'history_1d.csv'), timezone_name)
+    if daily.empty:
+        return datetime.timedelta(0)
+    weeks = (timezone.now() - daily.index[-1]).days // 7
+    return datetime.timedelta(weeks=max(0, weeks))
+
+class ReplayTicker:
+    """Stands in for yf.Ticker, answering from files written by record_ticker.
+
+    Unrecorded tickers raise FileNotFoundError rather than reaching the network.
+    """
+
+    def __init__(self, ticker, root):
+        self.ticker = ticker
+        self.root = root
+
+    def _timezone(self):
+        entry = load_manifest(self.root)['tickers'].get(self.ticker)
+        if entry is None:
+            raise FileNotFoundError(f"No recorded upstream data for {self.ticker} in {self.root}")
+        return entry['timezone']
+
+    def _dated(self, name):
+        timezone_name = self._timezone()
+        frame = _read_frame(_path(self.root, self.ticker, name), timezone_name).copy()
+        # Shift wall-clock times, so a bar recorded at midnight stays at midnight across DST changes
+        shifted = frame.index.tz_localize(None) + _shift(self.root, self.ticker, timezone_name)
+        frame.index = shifted.tz_localize(timezone_name, ambiguous=True, nonexistent='shift_forward').rename('Date')
+        return frame
+
+    @property
+    def info(self):
+        self._timezone()
+        with open(_path(self.root, self.ticker, 'info.json')) as f:
+            return json.load(f)
+
+    @property
+    def dividends(self):
+        dividends = self._dated('dividends.csv')
+        if dividends.empty:
+            return pd.Series(dtype=float, name='Dividends')
+        return dividends.iloc[:, 0].rename('Dividends')
+
+    def history(self, period=None, interval='1d', start=None, end=None, **kwargs):
+        """Slice the recorded period='max' history the way yfinance would serve the request."""
+        from .prices import _session_count, period_start
+
+        if interval not in RECORDED_INTERVALS:
+            return pd.DataFrame()
+        hist = self._dated(f'history_{interval}.csv')
+        if hist.empty:
+            return hist
+
+        if start is not None or end is not None:
+            if start is not None:
+                hist = hist[hist.index >= self._timestamp(start, hist)]
+            if end is not None:
+                hist = hist[hist.index < self._timestamp(end, hist)]
+            return hist
+
+        sessions = _session_count(period or '1mo')
+        if sessions:
+            dates = hist.index.normalize()
+            return hist[dates.isin(dates.unique()[-sessions:])]
+        begin = period_start(period or '1mo', now=hist.index[-1])
+        return hist if begin is None else hist[hist.index >= begin]
+
+    def _timestamp(self, value, hist):
+        value = pd.Timestamp(value)
+        return value.tz_localize(hist.index.tz) if value.tzinfo is None else value
+
+    def __getattr__(self, name):
+        if name in STATEMENT_ATTRIBUTES.values():
+            self._timezone()
+            frame = _read_frame(_path(self.root, self.ticker, f'{name}.csv')).copy()
+            frame.columns = pd.to_datetime(frame.columns)
+            return frame
+        raise AttributeError(name)
+
+def download(root, tickers, **kwargs):
+    """Replay yf.download(group_by='ticker') from the recorded histories of several tickers."""
+    manifest = load_manifest(root)
+    frames = {
+        ticker: ReplayTicker(ticker, root).history(**kwargs)
+        for ticker in tickers
+        if ticker in manifest['tickers']
+    }
+    frames = {ticker: hist for ticker, hist in frames.items() if not hist.empty}
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, axis=1)
+
+def search(root, query, max_results=10):
+    """Replay yf.Search quotes: recorded tickers whose symbol or name matches the query."""
+    query = query.lower()
+    quotes = []
+    for ticker in sorted(load_manifest(root)['tickers']):
+        info = ReplayTicker(ticker, root).info
+        name = info.get('longName') or info.get('shortName') or ticker
+        if ticker.lower().startswith(query) or query in name.lower():
+            quotes.append({
+                'symbol': ticker,
+                'shortname': info.get('shortName', name),
+                'longname': name,
+                'exchange': info.get('exchange', ''),
+                'quoteType': info.get('quoteType', 'EQUITY'),
+            })
+    return quotes[:max_results]
@@ -0,0 +1,136 @@
+# stock_data/scheduler.py
+import datetime
+import heapq
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Company
+from .popularity import access_rates
+
+logger = logging.getLogger(__name__)
+
+# A company nobody looks at is refreshed once a day
+REFRESH_INTERVAL = datetime.timedelta(hours=24)
+# However often a company is viewed, it is not refreshed more often than this
+MIN_REFRESH_INTERVAL = datetime.timedelta(minutes=30)
+# A company whose refreshes keep failing is retried after this, doubling with every failure in a row
+RETRY_AFTER = datetime.timedelta(minutes=30)
+MAX_RETRY_AFTER = datetime.timedelta(days=7)
+# Upstream calls one company refresh is assumed to cost until refreshes have been measured
+ESTIMATED_CALLS_PER_REFRESH = 10
+
+STATUS_KEY = 'scheduler:status'
+
+def access_weights():
+    """Return how much more often than daily each ticker deserves a refresh.
+
+    That is its recent requests per day, so a company viewed hourly is
+    refreshed about hourly; tickers not listed have weight 0.
+    """
+    return access_rates()
+
+def refresh_interval(weight):
+    """How long a company with the given access weight may go between refreshes."""
+    return max(MIN_REFRESH_INTERVAL, REFRESH_INTERVAL / (1 + weight))
+
+def retry_after(failures):
+    """How long after its last failed refresh a company is retried."""
+    return min(MAX_RETRY_AFTER, RETRY_AFTER * 2 ** min(max(failures - 1, 0), 16))
+
+class RefreshQueue:
+    """Companies due a refresh, most overdue relative to their access weight first.
+
+    A company's priority is its age divided by its refresh interval, so it
+    becomes due at 1 and a company viewed twice as often gets there twice as
+    fast. Companies without financials are due immediately. Companies whose
+    last refresh failed are left out until retry_after has passed.
+    """
+
+    def __init__(self, now=None, weights=None):
+        self.now = now or timezone.now()
+        self.weights = access_weights() if weights is None else weights
+        self._heap = []
+        self.lag = datetime.timedelta(0)
+        self.oldest = None
+        self.backing_off = 0
+
+        rows = Company.objects.values_list(
+            'ticker', 'last_updated', 'financials__last_updated', 'refresh_failures', 'refresh_failed_at',
+        )
+        for ticker, company_updated, financials_updated, failures, failed_at in rows.iterator(chunk_size=2000):
+            # Missing financials make the company as stale as it can be
+            updated = min(company_updated, financials_updated) if financials_updated else None
+            self._consider(ticker, updated, failures, failed_at)
+
+        heapq.heapify(self._heap)
+
+    def _consider(self, ticker, updated, failures=0, failed_at=None):
+        if failed_at and (updated is None or failed_at > updated) and self.now < failed_at + retry_after(failures):
+            # Failing again right away would only spend budget popular companies need
+            self.backing_off += 1
+            return
+
+        interval = refresh_interval(self.weights.get(ticker, 0))
+        if updated is None:
+            priority = float('inf')
+        else:
+            age = self.now - updated
+            self.oldest = max(self.oldest or age, age)
+            priority = age / interval
+        if priority < 1:
+            return
+
+        if updated is not None:
+            # How long the most overdue company has been waiting past its interval
+            self.lag = max(self.lag, self.now - updated - interval)
+        self._heap.append((-priority, ticker))
+
+    def __len__(self):
+        return len(self._heap)
+
+    def pop(self, count):
+        """Remove and return up to count tickers, highest priority first."""
+        return [heapq.heappop(self._heap)[1] for _ in range(min(count, len(self._heap)))]
+
+    def peek(self, count):
+        """Return up to count (ticker, priority) pairs without removing them."""
+        return [(ticker, -priority) for priority, ticker in heapq.nsmallest(count, self._heap)]
+
+def _cache():
+    return caches[getattr(settings, 'STOCK_DATA_CACHE', 'default')]
+
+def record_cycle(cycle):
+    """Publish the outcome of a scheduler cycle for scheduler_status."""
+    try:
+        _cache().set(STATUS_KEY, cycle, timeout=None)
+    except Exception as e:
+        logger.error(f"Error recording refresh scheduler status: {e}")
+
+def scheduler_status():
+    """Return the current queue depth and lag, and the last cycle the scheduler recorded.
+
+    Depth and lag are computed from the stored data, so they are current even
+    where the scheduler's own status is not visible (e.g. a per-process cache).
+    """
+    queue = RefreshQueue()
+    try:
+        last_cycle = _cache().get(STATUS_KEY)
+    except Exception as e:
+        logger.error(f"Error reading refresh scheduler status: {e}")
+        last_cycle = None
+
+    return {
+        'depth': len(queue),
+        'lag_seconds': queue.lag.total_seconds(),
+        'oldest_seconds': queue.oldest.total_seconds() if queue.oldest else None,
+        'backing_off': queue.backing_off,
+        # Companies without financials have no age, so no finite priority
+        'next': [
+            {'ticker': ticker, 'priority': None if priority == float('inf') else round(priority, 2)}
+            for ticker, priority in queue.peek(10)
+        ],
+        'last_cycle': last_cycle,
+    }
@@ -0,0 +1,185 @@
+# stock_data/screener.py
+import base64
+import binascii
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import FinancialData
+
+# FinancialData fields that can be range-filtered and sorted on
+SCREEN_METRICS = (
+    'market_cap', 'current_price', 'price_change_ytd',
+    'pe_ratio', 'ps_ratio', 'pb_ratio', 'ev_ebitda', 'fcf_yield',
+    'quality_score', 'profit_margin', 'operating_margin',
+    'dividend_yield', 'payout_ratio',
+)
+# Company fields that can be filtered by value, several separated by commas
+SCREEN_CATEGORIES = ('sector', 'industry', 'country', 'exchange')
+
+DEFAULT_SORT = '-market_cap'
+MAX_SORT_KEYS = 3
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+def _to_python(field, value):
+    """Convert a request value to the Python type of a FinancialData field."""
+    try:
+        return FinancialData._meta.get_field(field).to_python(value)
+    except ValidationError:
+        raise ValueError(f"Invalid value for {field}: '{value}'")
+
+def _json_value(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+def parse_sort(value):
+    """Parse a sort like '-quality_score,pe_ratio' into (field, descending) pairs."""
+    keys = []
+    for item in (value or DEFAULT_SORT).split(','):
+        item = item.strip()
+        field = item.lstrip('-')
+        if not field:
+            continue
+        if field not in SCREEN_METRICS:
+            raise ValueError(f"Cannot sort by '{field}'")
+        if field in (key for key, _ in keys):
+            raise ValueError(f"'{field}' appears twice in sort")
+        keys.append((field, item.startswith('-')))
+
+    if not keys:
+        raise ValueError("Sort must name at least one field")
+    if len(keys) > MAX_SORT_KEYS:
+        raise ValueError(f"At most {MAX_SORT_KEYS} sort fields are allowed")
+    return keys
+
+class Screen:
+    """A stock screen: range and category filters, a multi-key sort and a keyset page."""
+
+    def __init__(self, ranges=None, categories=None, sort=None, limit=DEFAULT_LIMIT, cursor=None):
+        self.ranges = ranges or {}
+        self.categories = categories or {}
+        self.sort = sort or parse_sort(DEFAULT_SORT)
+        self.limit = limit
+        self.after = self._decode_cursor(cursor) if cursor else None
+
+    @classmethod
+    def from_params(cls, params):
+        """Build a screen from request parameters, raising ValueError on bad input.
+
+        Ranges are <metric>_min and <metric>_max, categories are sector=A,B and
+        the like, sort is comma-separated with '-' for descending.
+        """
+        ranges = {}
+        for field in SCREEN_METRICS:
+            low, high = params.get(f'{field}_min'), params.get(f'{field}_max')
+            if low or high:
+                ranges[field] = (
+                    _to_python(field, low) if low else None,
+                    _to_python(field, high) if high else None,
+                )
+
+        categories = {}
+        for field in SCREEN_CATEGORIES:
+            values = [value.strip() for value in params.get(field, '').split(',') if value.strip()]
+            if values:
+                categories[field] = values
+
+        try:
+            limit = int(params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+
+        return cls(ranges, categories, parse_sort(params.get('sort')), limit, params.get('cursor'))
+
+    @property
+    def sort_string(self):
+        return ','.join(('-' if descending else '') + field for field, descending in self.sort)
+
+    def _keys(self):
+        # The ticker breaks ties, so every row has a unique position to resume after; it runs in
+        # the direction of the last key so a single-key sort is one walk along its index
+        return self.sort + [('company_id', self.sort[-1][1])]
+
+    def _encode_cursor(self, row):
+        # Decimals go in as strings so the cursor compares exactly equal to the stored value
+        after = [str(row[field]) if isinstance(row[field], Decimal) else row[field] for field, _ in self._keys()]
+        payload = {'sort': self.sort_string, 'after': after}
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+    def _decode_cursor(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            after = payload['after']
+            sort = payload['sort']
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise ValueError("Invalid cursor")
+        if sort != self.sort_string or len(after) != len(self._keys()):
+            raise ValueError("Cursor does not match the requested sort")
+        return [
+            value if field == 'company_id' else _to_python(field, value)
+            for (field, _), value in zip(self._keys(), after)
+        ]
+
+    def _seek(self):
+        """Rows strictly after the cursor in sort order: (a > x) or (a = x and b > y) or ..."""
+        keys = self._keys()
+        condition = Q()
+        for i, (field, descending) in enumerate(keys):
+            step = Q(**{f"{field}__{'lt' if descending else 'gt'}": self.after[i]})
+            for (previous, _), value in zip(keys[:i], self.after):
+                step &= Q(**{previous: value})
+            condition |= step
+
+        # A plain bound on the first key lets the database range-scan its index
+        first, descending = keys[0]
+        return Q(**{f"{first}__{'lte' if descending else 'gte'}": self.after[0]}) & condition
+
+    def queryset(self):
+        """Return the filtered, sorted FinancialData query for this page."""
+        financials = FinancialData.objects.all()
+
+        for field, (low, high) in self.ranges.items():
+            if low is not None:
+                financials = financials.filter(**{f'{field}__gte': low})
+            if high is not None:
+                financials = financials.filter(**{f'{field}__lte': high})
+        for field, values in self.categories.items():
+            financials = financials.filter(**{f'company__{field}__in': values})
+        for field, _ in self.sort:
+            # Companies missing a sort metric have no place in the order, so they are left out
+            financials = financials.filter(**{f'{field}__isnull': False})
+
+        if self.after is not None:
+            financials = financials.filter(self._seek())
+
+        ordering = [('-' if descending else '') + field for field, descending in self._keys()]
+        return financials.order_by(*ordering)
+
+    def results(self):
+        """Run the screen, returning the page of rows and the cursor for the next one."""
+        rows = list(
+            self.queryset()
+            .values('company_id', 'company__name', 'company__sector', 'company__industry', *SCREEN_METRICS)
+            [:self.limit + 1]
+        )
+
+        next_cursor = None
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            next_cursor = self._encode_cursor(rows[-1])
+
+        results = [
+            {
+                'ticker': row['company_id'],
+                'name': row['company__name'],
+                'sector': row['company__sector'],
+                'industry': row['company__industry'],
+                **{field: _json_value(row[field]) for field in SCREEN_METRICS},
+            }
+            for row in rows
+        ]
+        return results, next_cursor
@@ -0,0 +1,135 @@
+# stock_data/search_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import SearchResult
+
+logger = logging.getLogger(__name__)
+
+# In-process tier in front of the SearchResult table
+LRU_SIZE = 512
+LRU_TTL = 600
+# Shortest cached prefix a longer query may be narrowed from
+MIN_PREFIX_LENGTH = 2
+# Expired rows are purged at most this often per process, besides the cron job
+PURGE_INTERVAL = 3600
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+_last_purge = 0.0
+
+def normalize_query(query):
+    """Lowercase a query and collapse its whitespace."""
+    return ' '.join(query.lower().split())
+
+def _lru_get(key):
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _lru[key]
+            return None
+        _lru.move_to_end(key)
+        return entry[1]
+
+def _lru_put(key, results, complete):
+    with _lru_lock:
+        _lru[key] = (time.monotonic() + LRU_TTL, (results, complete))
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+def clear_lru():
+    """Drop every in-process entry."""
+    with _lru_lock:
+        _lru.clear()
+
+def _matches(result, query):
+    return query in result['ticker'].lower() or query in result['name'].lower()
+
+def _narrow(query):
+    """Answer query from the longest complete cached result for one of its prefixes."""
+    prefixes = [query[:end] for end in range(len(query) - 1, MIN_PREFIX_LENGTH - 1, -1)]
+    if not prefixes:
+        return None
+
+    for prefix in prefixes:
+        entry = _lru_get(prefix)
+        if entry is not None and entry[1]:
+            return [result for result in entry[0] if _matches(result, query)]
+
+    cutoff = timezone.now() - SearchResult.MAX_AGE
+    cached = (SearchResult.objects
+              .filter(normalized_query__in=prefixes, complete=True, last_updated__gte=cutoff)
+              .order_by(Length('normalized_query').desc())
+              .first())
+    if cached is None:
+        return None
+    _lru_put(cached.normalized_query, cached.results_json, True)
+    return [result for result in cached.results_json if _matches(result, query)]
+
+def get_cached_search(query):
+    """Return cached results for a query, or None when upstream has to be asked."""
+    key = normalize_query(query)
+    if not key:
+        return []
+
+    entry = _lru_get(key)
+    if entry is not None:
+        return entry[0]
+
+    cached = SearchResult.objects.filter(normalized_query=key).first()
+    if cached and not cached.is_stale():
+        _lru_put(key, cached.results_json, cached.complete)
+        return cached.results_json
+
+    # Everything matching "apple" is among the complete results for "appl"
+    results = _narrow(key)
+    if results is not None:
+        _lru_put(key, results, True)
+    return results
+
+def store_search(query, results, complete=False):
+    """Cache upstream results for a query; complete means upstream had no more matches."""
+    key = normalize_query(query)
+    if not key:
+        return
+
+    SearchResult.objects.update_or_create(
+        normalized_query=key,
+        defaults={
+            'query': query,
+            'results_json': results,
+            'complete': complete,
+            'last_updated': timezone.now(),
+        },
+    )
+    _lru_put(key, results, complete)
+    _purge_if_due()
+
+def purge_search_cache():
+    """Delete expired search results, returning how many were removed."""
+    deleted, _ = SearchResult.objects.filter(last_updated__lt=timezone.now() - SearchResult.MAX_AGE).delete()
+    return deleted
+
+def _purge_if_due():
+    """Purge expired rows now and then from the write path."""
+    global _last_purge
+
+    now = time.monotonic()
+    if now - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = now
+
+    try:
+        deleted = purge_search_cache()
+        if deleted:
+            logger.info(f"Purged {deleted} expired search results")
+    except Exception as e:
+        logger.error(f"Error purging search results: {e}")
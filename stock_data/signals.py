@@ -0,0 +1,42 @@
+# stock_data/signals.py
+import time
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .aggregates import update_aggregates
+from .metrics import DB_QUERIES, DB_SECONDS
+from .models import Company
+from .profiling import phase
+from .symbols import company_saved, invalidate_index
+from .upstream import current_endpoint
+
+
+@receiver(post_save, sender=Company)
+def company_changed(sender, instance, **kwargs):
+    """Rebuild the symbol index on the next search if a company's indexed fields changed."""
+    company_saved(instance)
+
+@receiver(post_delete, sender=Company)
+def company_deleted(sender, instance, **kwargs):
+    """Drop a deleted company from the symbol index and its sector and industry aggregates."""
+    invalidate_index()
+    update_aggregates([instance.ticker])
+
+def _measure_query(execute, sql, params, many, context):
+    endpoint = current_endpoint()
+    started = time.perf_counter()
+    try:
+        with phase('db'):
+            return execute(sql, params, many, context)
+    finally:
+        DB_QUERIES.inc(endpoint)
+        DB_SECONDS.observe(time.perf_counter() - started, endpoint)
+
+@receiver(connection_created)
+def measure_queries(sender, connection, **kwargs):
+    """Count and time every query on each new database connection, in every thread."""
+    # The wrapper outlives reconnections of the same connection object
+    if _measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_measure_query)
@@ -0,0 +1,148 @@
+# stock_data/statements.py
+import datetime
+import logging
+from collections import defaultdict
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import FinancialStatement
+from .profiling import phase
+from .upstream import get_statement_frame
+
+logger = logging.getLogger(__name__)
+
+# yfinance attribute for each (statement, period type)
+STATEMENT_ATTRIBUTES = {
+    ('income', 'annual'): 'income_stmt',
+    ('balance', 'annual'): 'balance_sheet',
+    ('cashflow', 'annual'): 'cashflow',
+    ('income', 'quarterly'): 'quarterly_income_stmt',
+    ('balance', 'quarterly'): 'quarterly_balance_sheet',
+    ('cashflow', 'quarterly'): 'quarterly_cashflow',
+}
+
+# Statements are refreshed with the company; this only bounds how old an unrefreshed copy can get
+STATEMENT_MAX_AGE = datetime.timedelta(days=7)
+
+def _fetch_statement(ticker, statement, period_type):
+    """Fetch one statement from yfinance."""
+    return get_statement_frame(ticker, STATEMENT_ATTRIBUTES[(statement, period_type)])
+
+def _statement_rows(ticker, statement, period_type, df, now):
+    """Flatten a statement DataFrame into FinancialStatement rows."""
+    rows = []
+    for position, (line_item, values) in enumerate(df.iterrows()):
+        for period_end, value in values.items():
+            rows.append(FinancialStatement(
+                ticker=ticker,
+                statement=statement,
+                period_type=period_type,
+                line_item=str(line_item)[:100],
+                position=position,
+                period_end=pd.Timestamp(period_end).date(),
+                value=None if pd.isna(value) else float(value),
+                last_updated=now,
+            ))
+    return rows
+
+def store_statements(items, batch_size=500):
+    """Replace the stored copies of many statements in one transaction.
+
+    items is an iterable of (ticker, statements) pairs, where statements is a
+    dict of DataFrames keyed by (statement, period type).
+    """
+    now = timezone.now()
+    rows = []
+    replaced = defaultdict(list)
+
+    for ticker, statements in items:
+        for (statement, period_type), df in statements.items():
+            if df is None or df.empty:
+                # Keep the previous copy rather than wiping it on an empty upstream response
+                continue
+            replaced[(statement, period_type)].append(ticker)
+            rows.extend(_statement_rows(ticker, statement, period_type, df, now))
+
+    if not rows:
+        return
+
+    with transaction.atomic():
+        for (statement, period_type), tickers in replaced.items():
+            FinancialStatement.objects.filter(
+                statement=statement, period_type=period_type, ticker__in=tickers
+            ).delete()
+        FinancialStatement.objects.bulk_create(rows, batch_size=batch_size)
+
+def store_statement(ticker, statement, period_type, df):
+    """Replace the stored copy of a statement with a freshly fetched DataFrame."""
+    store_statements([(ticker, {(statement, period_type): df})])
+
+def fetch_statements(ticker):
+    """Fetch every statement for a ticker from yfinance without storing it.
+
+    Returns a dict of DataFrames keyed by (statement, period type).
+    """
+    return {
+        (statement, period_type): _fetch_statement(ticker, statement, period_type)
+        for statement, period_type in STATEMENT_ATTRIBUTES
+    }
+
+def refresh_statements(ticker):
+    """Fetch every statement for a ticker from yfinance and store it."""
+    statements = fetch_statements(ticker)
+    store_statements([(ticker, statements)])
+    return statements
+
+@phase('pandas')
+def _to_frame(rows):
+    """Pivot stored rows back into a yfinance-shaped DataFrame."""
+    df = pd.DataFrame.from_records(rows, columns=['line_item', 'position', 'period_end', 'value'])
+    df['value'] = pd.to_numeric(df['value'])
+    df['period_end'] = pd.to_datetime(df['period_end'])
+
+    table = df.pivot(index='line_item', columns='period_end', values='value')
+
+    # Restore the reported row order and yfinance's newest-first columns
+    order = df.groupby('line_item')['position'].min().sort_values().index
+    table = table.reindex(index=order, columns=sorted(table.columns, reverse=True))
+    table.index.name = None
+    table.columns.name = None
+    return table
+
+def statements_as_of(ticker, period_type='annual', statements=('income', 'balance', 'cashflow')):
+    """Return when each stored statement was written, or None if one would be fetched first."""
+    updated = dict(
+        FinancialStatement.objects
+        .filter(ticker=ticker, period_type=period_type, statement__in=statements)
+        .values_list('statement')
+        .annotate(Max('last_updated'))
+    )
+    now = timezone.now()
+    if any(statement not in updated or now - updated[statement] > STATEMENT_MAX_AGE for statement in statements):
+        return None
+    return [updated[statement] for statement in statements]
+
+def get_statement(ticker, statement, period_type='annual'):
+    """Get a financial statement from the local store, fetching it once if missing."""
+    rows = list(
+        FinancialStatement.objects
+        .filter(ticker=ticker, statement=statement, period_type=period_type)
+        .values_list('line_item', 'position', 'period_end', 'value', 'last_updated')
+    )
+
+    if rows and timezone.now() - max(row[4] for row in rows) <= STATEMENT_MAX_AGE:
+        return _to_frame([row[:4] for row in rows])
+
+    try:
+        df = _fetch_statement(ticker, statement, period_type)
+        store_statement(ticker, statement, period_type, df)
+        return df
+    except Exception as e:
+        logger.error(f"Error fetching {period_type} {statement} statement for {ticker}: {e}")
+        # Serve the outdated copy rather than nothing, flagged so it is not cached as current
+        df = _to_frame([row[:4] for row in rows]) if rows else pd.DataFrame()
+        df.attrs['fetch_failed'] = True
+        return df
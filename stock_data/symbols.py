@@ -0,0 +1,194 @@
+# stock_data/symbols.py
+import bisect
+import csv
+import datetime
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.db import transaction
+
+from .models import Company
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_SYMBOLS = Path(__file__).resolve().parent / 'data' / 'symbols.csv'
+# Imported symbols count as never refreshed, so the first visit fetches their full data
+NEVER_UPDATED = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+# Other processes' changes show up after at most this many seconds
+INDEX_TTL = 300
+# Share of the query's trigrams a name must contain to count as a fuzzy match
+MIN_TRIGRAM_SIMILARITY = 0.5
+
+def _trigrams(text):
+    """Return the set of three-character slices of text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SymbolIndex:
+    """In-memory prefix and trigram index over ticker symbols and company names."""
+
+    def __init__(self, rows):
+        self.entries = []
+        self.positions = {}
+        self.tickers = []
+        self.names = []
+        self.words = []
+        self.trigrams = defaultdict(set)
+
+        for ticker, name, exchange in rows:
+            i = len(self.entries)
+            name = name or ticker
+            self.entries.append({'ticker': ticker, 'name': name, 'exchange': exchange or ''})
+            self.positions[ticker] = i
+
+            ticker, name = ticker.lower(), name.lower()
+            self.tickers.append((ticker, i))
+            self.names.append((name, i))
+            self.words.extend((word, i) for word in set(name.split()))
+            for gram in _trigrams(name) | _trigrams(ticker):
+                self.trigrams[gram].add(i)
+
+        # Sorted keys let a prefix lookup bisect to its first match
+        self.tickers.sort()
+        self.names.sort()
+        self.words.sort()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, ticker):
+        """Return the entry of a ticker, or None if it is not indexed."""
+        i = self.positions.get(ticker)
+        return None if i is None else self.entries[i]
+
+    @staticmethod
+    def _prefixed(keys, prefix):
+        """Yield the entry ids of sorted (key, id) pairs whose key starts with prefix."""
+        for position in range(bisect.bisect_left(keys, (prefix,)), len(keys)):
+            key, i = keys[position]
+            if not key.startswith(prefix):
+                break
+            yield i
+
+    def search(self, query, limit=10):
+        """Return up to limit entries matching query, best matches first.
+
+        Exact tickers rank first, then ticker prefixes, then names or name words
+        starting with the query, then names sharing most of its trigrams.
+        """
+        query = ' '.join(query.lower().split())
+        if not query:
+            return []
+
+        scores = {}
+
+        def rank(i, score):
+            if score > scores.get(i, 0):
+                scores[i] = score
+
+        for i in self._prefixed(self.tickers, query):
+            rank(i, 4 if self.entries[i]['ticker'].lower() == query else 3)
+        for i in self._prefixed(self.names, query):
+            rank(i, 2)
+        for i in self._prefixed(self.words, query):
+            rank(i, 2)
+
+        grams = _trigrams(query)
+        if grams:
+            shared = Counter(i for gram in grams for i in self.trigrams.get(gram, ()))
+            for i, count in shared.items():
+                similarity = count / len(grams)
+                if similarity >= MIN_TRIGRAM_SIMILARITY:
+                    rank(i, similarity)
+
+        best = sorted(scores, key=lambda i: (-scores[i], len(self.entries[i]['ticker']), self.entries[i]['ticker']))
+        return [dict(self.entries[i]) for i in best[:limit]]
+
+_index = None
+_index_built = 0.0
+_index_lock = threading.Lock()
+
+def get_index():
+    """Return the symbol index, rebuilding it from the Company table when invalid or old."""
+    global _index, _index_built
+
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_built > INDEX_TTL:
+            started = time.perf_counter()
+            _index = SymbolIndex(Company.objects.values_list('ticker', 'name', 'exchange').iterator())
+            _index_built = time.monotonic()
+            logger.debug(f"Built symbol index of {len(_index)} companies in {time.perf_counter() - started:.3f}s")
+        return _index
+
+def invalidate_index():
+    """Make the next search rebuild the symbol index."""
+    global _index
+    _index = None
+
+def company_saved(company):
+    """Make the next search rebuild the index if a saved company is new to it or was renamed.
+
+    Refreshes save every company they touch, mostly to move last_updated, so
+    anything the index does not show is left to INDEX_TTL.
+    """
+    index = _index
+    if index is None:
+        return
+    entry = index.get(company.ticker)
+    if entry is None or entry['name'] != (company.name or company.ticker) or entry['exchange'] != (company.exchange or ''):
+        invalidate_index()
+
+def search_symbols(query, limit=10):
+    """Search the local symbol index by ticker or company name."""
+    return get_index().search(query, limit)
+
+def read_symbols(path=BUNDLED_SYMBOLS):
+    """Read (ticker, name, exchange) rows from a CSV file with those columns."""
+    with open(path, newline='', encoding='utf-8') as f:
+        return [
+            (row['ticker'].strip().upper(), (row.get('name') or '').strip(), (row.get('exchange') or '').strip())
+            for row in csv.DictReader(f)
+            if (row.get('ticker') or '').strip()
+        ]
+
+def import_symbols(symbols, batch_size=500):
+    """Add unknown symbols to the Company table and fill in missing names and exchanges.
+
+    Returns the number of companies created and updated.
+    """
+    symbols = {ticker: (name, exchange) for ticker, name, exchange in symbols}
+    existing = Company.objects.in_bulk(list(symbols))
+    created = []
+    updated = []
+
+    for ticker, (name, exchange) in symbols.items():
+        company = existing.get(ticker)
+        if company is None:
+            created.append(Company(
+                ticker=ticker,
+                name=name or ticker,
+                exchange=exchange or None,
+                last_updated=NEVER_UPDATED,
+            ))
+            continue
+
+        changed = False
+        if exchange and not company.exchange:
+            company.exchange = exchange
+            changed = True
+        # Placeholder names are the ticker itself until the first refresh
+        if name and company.name == company.ticker:
+            company.name = name
+            changed = True
+        if changed:
+            updated.append(company)
+
+    with transaction.atomic():
+        Company.objects.bulk_create(created, batch_size=batch_size, ignore_conflicts=True)
+        Company.objects.bulk_update(updated, ['name', 'exchange'], batch_size=batch_size)
+
+    if created or updated:
+        invalidate_index()
+    return len(created), len(updated)
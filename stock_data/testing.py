@@ -0,0 +1,204 @@
+# stock_data/testing.py
+# Writes upstream fixtures for replay, from Yahoo or made up; used by tests and benchmarks only
+import json
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from django.utils import timezone
+
+from .replay import MANIFEST, RECORDED_INTERVALS, _path
+from .statements import STATEMENT_ATTRIBUTES
+
+# Synthetic tickers get this many years of trading days, ending today
+SYNTHETIC_YEARS = 3
+# Synthetic tickers are spread over these groups, so peers and sector aggregates have members to compare
+SYNTHETIC_GROUPS = [
+    ('Technology', 'Software - Infrastructure'),
+    ('Communication Services', 'Internet Content & Information'),
+    ('Consumer Defensive', 'Beverages - Non-Alcoholic'),
+]
+
+def record_ticker(root, ticker, ticker_obj=None):
+    """Fetch everything the app asks yfinance about a ticker and write it under root/ticker.
+
+    ticker_obj stands in for yf.Ticker(ticker), e.g. a SyntheticTicker.
+    Returns the ticker's manifest entry.
+    """
+    ticker_obj = ticker_obj or yf.Ticker(ticker)
+    os.makedirs(os.path.join(root, ticker), exist_ok=True)
+
+    info = ticker_obj.info
+    with open(_path(root, ticker, 'info.json'), 'w') as f:
+        json.dump(info, f, indent=1, sort_keys=True, default=str)
+
+    timezone_name = None
+    for interval in RECORDED_INTERVALS:
+        hist = ticker_obj.history(period='max', interval=interval)
+        hist.to_csv(_path(root, ticker, f'history_{interval}.csv'))
+        if timezone_name is None and isinstance(hist.index, pd.DatetimeIndex) and hist.index.tz is not None:
+            timezone_name = str(hist.index.tz)
+
+    ticker_obj.dividends.to_csv(_path(root, ticker, 'dividends.csv'))
+    for attribute in STATEMENT_ATTRIBUTES.values():
+        getattr(ticker_obj, attribute).to_csv(_path(root, ticker, f'{attribute}.csv'))
+
+    return {'timezone': timezone_name or info.get('exchangeTimezoneName') or 'UTC'}
+
+class SyntheticTicker:
+    """Stands in for yf.Ticker with made-up but plausible data, the same for a ticker on every run.
+
+    Only answers what record_ticker asks: history is always the whole
+    period='max' series.
+    """
+
+    timezone_name = 'America/New_York'
+
+    def __init__(self, ticker, end=None):
+        self.ticker = ticker
+        seed = zlib.crc32(ticker.encode())
+        self.rng = np.random.default_rng(seed)
+        self.sector, self.industry = SYNTHETIC_GROUPS[seed % len(SYNTHETIC_GROUPS)]
+
+        end = pd.Timestamp(end or timezone.now()).tz_convert(self.timezone_name).normalize()
+        dates = pd.bdate_range(end=end.tz_localize(None), periods=SYNTHETIC_YEARS * 252).tz_localize(self.timezone_name)
+        self.daily = self._daily(dates.rename('Date'))
+
+        self.shares = int(self.rng.uniform(1, 16) * 1e9)
+        self.revenue = float(self.daily['Close'].iloc[-1]) * self.shares * self.rng.uniform(0.05, 0.3)
+        self.growth = self.rng.uniform(-0.05, 0.2)
+
+    def _daily(self, dates):
+        """A random walk of closes, with quarterly dividends for most tickers."""
+        count = len(dates)
+        close = self.rng.uniform(20, 400) * np.exp(np.cumsum(self.rng.normal(0.0003, 0.015, count)))
+        spread = close * self.rng.uniform(0.002, 0.02, count)
+        daily = pd.DataFrame({
+            'Open': close + self.rng.normal(0, 0.5, count) * spread,
+            'High': close + spread,
+            'Low': close - spread,
+            'Close': close,
+            'Volume': self.rng.integers(1_000_000, 50_000_000, count),
+            'Dividends': 0.0,
+            'Stock Splits': 0.0,
+        }, index=dates).round({'Open': 2, 'High': 2, 'Low': 2, 'Close': 2})
+        daily['High'] = daily[['Open', 'High', 'Close']].max(axis=1)
+        daily['Low'] = daily[['Open', 'Low', 'Close']].min(axis=1)
+
+        if self.rng.random() < 0.75:
+            payout = round(float(close[0]) * self.rng.uniform(0.002, 0.008), 2)
+            daily.iloc[30::63, daily.columns.get_loc('Dividends')] = payout
+        return daily
+
+    def history(self, period='max', interval='1d', **kwargs):
+        if interval == '1d':
+            return self.daily.copy()
+        rule = {'1wk': 'W-MON', '1mo': 'MS'}.get(interval)
+        if rule is None:
+            return pd.DataFrame()
+        # yfinance labels weekly and monthly bars with the day they start on
+        bars = self.daily.resample(rule, label='left', closed='left').agg({
+            'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last',
+            'Volume': 'sum', 'Dividends': 'sum', 'Stock Splits': 'sum',
+        })
+        return bars.dropna(subset=['Close'])
+
+    @property
+    def dividends(self):
+        dividends = self.daily['Dividends']
+        return dividends[dividends != 0]
+
+    @property
+    def info(self):
+        price = float(self.daily['Close'].iloc[-1])
+        income = self._statement('income', 'annual')
+        net_income, revenue = income.loc['Net Income'].iloc[0], income.loc['Total Revenue'].iloc[0]
+        market_cap = price * self.shares
+        dividends = self.dividends
+        yearly_dividends = float(dividends[dividends.index > dividends.index.max() - pd.Timedelta(days=365)].sum()) if len(dividends) else 0.0
+        info = {
+            'symbol': self.ticker,
+            'longName': f'{self.ticker.title()} Synthetic Inc.',
+            'shortName': f'{self.ticker.title()} Synthetic',
+            'quoteType': 'EQUITY',
+            'exchange': 'NMS',
+            'exchangeTimezoneName': self.timezone_name,
+            'sector': self.sector,
+            'industry': self.industry,
+            'country': 'United States',
+            'website': f'https://www.{self.ticker.lower()}.example',
+            'currentPrice': price,
+            'marketCap': int(market_cap),
+            'sharesOutstanding': self.shares,
+            'trailingPE': market_cap / net_income if net_income > 0 else None,
+            'priceToSalesTrailing12Months': market_cap / revenue,
+            'priceToBook': market_cap / self._statement('balance', 'annual').loc['Stockholders Equity'].iloc[0],
+            'profitMargins': net_income / revenue,
+            'operatingMargins': income.loc['Operating Income'].iloc[0] / revenue,
+            'dividendYield': yearly_dividends / price,
+            'payoutRatio': yearly_dividends * self.shares / net_income if net_income > 0 else 0,
+        }
+        if len(dividends):
+            info['exDividendDate'] = int(dividends.index[-1].timestamp())
+        return info
+
+    def _statement(self, statement, period_type):
+        """A statement grown backwards from the latest revenue, newest period first."""
+        # Every call draws the same numbers, however many statements were asked for before
+        rng = np.random.default_rng([zlib.crc32(self.ticker.encode()), zlib.crc32(f'{statement}:{period_type}'.encode())])
+        annual = period_type == 'annual'
+        latest = self.daily.index[-1].tz_localize(None)
+        if annual:
+            periods = pd.date_range(end=latest - pd.offsets.YearEnd(), periods=4, freq='YE')[::-1]
+        else:
+            periods = pd.date_range(end=latest - pd.offsets.QuarterEnd(), periods=5, freq='QE')[::-1]
+        revenue = self.revenue / (1 + self.growth) ** (np.arange(len(periods)) / (1 if annual else 4)) / (1 if annual else 4)
+        noise = lambda low, high: rng.uniform(low, high, len(periods))
+
+        if statement == 'income':
+            rows = {
+                'Total Revenue': revenue,
+                'Gross Profit': revenue * noise(0.35, 0.6),
+                'Operating Income': revenue * noise(0.15, 0.3),
+                'EBITDA': revenue * noise(0.2, 0.35),
+                'Net Income': revenue * noise(0.05, 0.2),
+            }
+        elif statement == 'balance':
+            assets = revenue * (1 if annual else 4) * noise(1.2, 2.0)
+            rows = {
+                'Total Assets': assets,
+                'Current Assets': assets * noise(0.25, 0.4),
+                'Current Liabilities': assets * noise(0.15, 0.3),
+                'Long Term Debt': assets * noise(0.1, 0.25),
+                'Cash And Cash Equivalents': assets * noise(0.05, 0.15),
+                'Stockholders Equity': assets * noise(0.3, 0.5),
+                'Ordinary Shares Number': self.shares * noise(1.0, 1.05),
+                'Share Issued': self.shares * noise(1.05, 1.1),
+            }
+            rows['Total Debt'] = rows['Long Term Debt'] * noise(1.1, 1.3)
+        else:
+            operating = revenue * noise(0.15, 0.3)
+            capex = -revenue * noise(0.03, 0.08)
+            rows = {'Operating Cash Flow': operating, 'Capital Expenditure': capex, 'Free Cash Flow': operating + capex}
+
+        frame = pd.DataFrame(rows, index=periods).T.round(0)
+        if statement == 'income':
+            frame.loc['Basic EPS'] = (frame.loc['Net Income'] / self.shares).round(2)
+        return frame
+
+    def __getattr__(self, name):
+        for (statement, period_type), attribute in STATEMENT_ATTRIBUTES.items():
+            if attribute == name:
+                return self._statement(statement, period_type)
+        raise AttributeError(name)
+
+def write_manifest(root, tickers, recorded_at=None):
+    """Write the manifest listing the recorded tickers, replacing any earlier one."""
+    with open(os.path.join(root, MANIFEST), 'w') as f:
+        json.dump({
+            'recorded_at': (recorded_at or timezone.now()).isoformat(),
+            'tickers': tickers,
+        }, f, indent=1, sort_keys=True)
+
@@ -1,3 +1,650 @@
-from django.test import TestCase
+# stock_data/tests.py
+import datetime
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from django.db import OperationalError
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from . import background, popularity, symbols
+from .aggregates import AGGREGATE_METRICS, rebuild_aggregates, update_aggregates
+from .company_cache import (
+    Uncached, aget_company_payloads, cache_stats, get_company_payloads, invalidate_company, reset_cache_stats,
+)
+from .http_cache import conditional_view
+from .locks import acquire_lease, release_lease, single_flight
+from .models import (
+    Company, FinancialData, FinancialStatement, PriceBar, PriceSeries, RefreshLease, SearchResult, SectorAggregate,
+    TickerAccess,
+)
+from .prices import get_price_history
+from .refresh import RefreshResult, refresh_companies
+from .scheduler import RETRY_AFTER, RefreshQueue
+from .screener import Screen, parse_sort
+from .search_cache import clear_lru, get_cached_search, purge_search_cache, store_search
+from .statements import STATEMENT_MAX_AGE, get_statement, store_statement
+from .upstream import fetch_context, get_info
+from .utils import enrich_search, get_company_data, revalidate_company_data, search_companies
+
+
+def create_company(ticker, sector='Technology', industry='Software', **financials):
+    company = Company.objects.create(ticker=ticker, name=f'{ticker} Inc.', sector=sector, industry=industry)
+    FinancialData.objects.create(company=company, **financials)
+    return company
+
+
+class AggregateTests(TestCase):
+    """Incremental aggregate updates must end where a full rebuild does."""
+
+    def snapshot(self):
+        return {
+            (aggregate.group_type, aggregate.group, aggregate.metric): (
+                aggregate.count, aggregate.median, aggregate.q1, aggregate.q3,
+                aggregate.percentiles, aggregate.sorted_values, aggregate.members,
+            )
+            for aggregate in SectorAggregate.objects.all()
+        }
+
+    def test_incremental_updates_match_rebuild(self):
+        groups = [('Technology', 'Software'), ('Technology', 'Semiconductors'), ('Energy', 'Oil & Gas')]
+        tickers = []
+        for i in range(12):
+            sector, industry = groups[i % len(groups)]
+            create_company(
+                f'T{i}', sector, industry,
+                market_cap=(i + 1) * 10**9,
+                pe_ratio=Decimal(f'{10 + i * 1.5:.2f}'),
+                # Some metrics are missing, and some values are shared
+                profit_margin=None if i % 4 == 0 else Decimal('0.1500'),
+                quality_score=i % 9,
+            )
+            tickers.append(f'T{i}')
+
+        # Companies arrive in batches, as refreshes write them
+        update_aggregates(tickers[:5])
+        update_aggregates(tickers[5:])
+
+        # Metrics change, a company moves to another sector, and one is deleted
+        FinancialData.objects.filter(company_id='T1').update(market_cap=5 * 10**11, pe_ratio=Decimal('99.50'))
+        Company.objects.filter(ticker='T2').update(sector='Utilities', industry='Utilities - Regulated')
+        Company.objects.filter(ticker='T3').delete()
+        update_aggregates(['T1', 'T2', 'T3'])
+        # Updating a company again without changes leaves everything as it is
+        update_aggregates(['T4'])
+
+        incremental = self.snapshot()
+        rebuild_aggregates()
+        self.assertEqual(incremental, self.snapshot())
+
+        self.assertIn(('sector', 'Utilities', 'market_cap'), incremental)
+        self.assertNotIn('T3', incremental[('sector', 'Technology', 'market_cap')][6])
+        self.assertNotIn('T2', incremental[('industry', 'Semiconductors', 'market_cap')][6])
+
+    def test_emptied_groups_are_deleted(self):
+        create_company('SOLO', 'Utilities', 'Utilities - Regulated', market_cap=10**9)
+        update_aggregates(['SOLO'])
+        self.assertEqual(SectorAggregate.objects.filter(group='Utilities').count(), len(AGGREGATE_METRICS))
+
+        Company.objects.filter(ticker='SOLO').update(sector='Energy', industry='Oil & Gas')
+        update_aggregates(['SOLO'])
+        self.assertFalse(SectorAggregate.objects.filter(group='Utilities').exists())
+        self.assertEqual(SectorAggregate.objects.get(group='Energy', metric='market_cap').members, {'SOLO': 10.0**9})
+
+
+class ScreenTests(TestCase):
+    """Keyset pages must add up to the whole screen, in order and without repeats."""
+
+    def setUp(self):
+        for i in range(23):
+            create_company(
+                f'S{i:02d}',
+                # Ties on every sort key, so the ticker has to break them
+                market_cap=None if i % 7 == 0 else (i % 5) * 10**9,
+                pe_ratio=Decimal(f'{(i % 3) * 5 + 10}.25'),
+                quality_score=i % 4,
+            )
+
+    def pages(self, sort, limit):
+        tickers = []
+        cursor = None
+        while True:
+            rows, cursor = Screen(sort=parse_sort(sort), limit=limit, cursor=cursor).results()
+            self.assertLessEqual(len(rows), limit)
+            tickers.extend(row['ticker'] for row in rows)
+            if cursor is None:
+                return tickers
+
+    def test_pages_cover_the_whole_screen_in_order(self):
+        for sort in ('-market_cap', 'market_cap', '-quality_score,pe_ratio', 'pe_ratio,-market_cap'):
+            with self.subTest(sort=sort):
+                rows, cursor = Screen(sort=parse_sort(sort), limit=200).results()
+                self.assertIsNone(cursor)
+                everything = [row['ticker'] for row in rows]
+                for limit in (1, 4, 7):
+                    self.assertEqual(self.pages(sort, limit), everything)
+
+    def test_companies_missing_the_sort_metric_are_left_out(self):
+        tickers = self.pages('-market_cap', 5)
+        self.assertEqual(len(tickers), len(set(tickers)))
+        self.assertNotIn('S00', tickers)
+        self.assertIn('S00', self.pages('pe_ratio', 5))
+
+    def test_cursor_of_another_sort_is_rejected(self):
+        _, cursor = Screen(sort=parse_sort('-market_cap'), limit=3).results()
+        with self.assertRaises(ValueError):
+            Screen(sort=parse_sort('pe_ratio'), cursor=cursor)
+        with self.assertRaises(ValueError):
+            Screen(cursor='not-a-cursor')
+
+
+class LeaseTests(TestCase):
+    def test_lease_is_exclusive_until_released(self):
+        owner = acquire_lease('company:KO')
+        self.assertIsNotNone(owner)
+        self.assertIsNone(acquire_lease('company:KO'))
+        self.assertIsNotNone(acquire_lease('company:PEP'))
+
+        # Only the holder can release it
+        release_lease('company:KO', 'someone-else')
+        self.assertIsNone(acquire_lease('company:KO'))
+        release_lease('company:KO', owner)
+        self.assertIsNotNone(acquire_lease('company:KO'))
+
+    def test_expired_lease_is_taken_over(self):
+        RefreshLease.objects.create(key='company:KO', owner='crashed', expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        owner = acquire_lease('company:KO')
+        self.assertIsNotNone(owner)
+        self.assertEqual(RefreshLease.objects.get(key='company:KO').owner, owner)
+
+    def test_single_flight_holds_the_lease_for_its_body(self):
+        with single_flight('company:KO') as acquired:
+            self.assertTrue(acquired)
+            self.assertTrue(RefreshLease.objects.filter(key='company:KO').exists())
+        self.assertFalse(RefreshLease.objects.filter(key='company:KO').exists())
+
+    def test_single_flight_gives_up_on_a_held_lease(self):
+        owner = acquire_lease('company:KO')
+        with single_flight('company:KO', wait=0) as acquired:
+            self.assertFalse(acquired)
+        # The other holder's lease is left alone
+        self.assertEqual(RefreshLease.objects.get(key='company:KO').owner, owner)
+
+
+class SymbolIndexTests(TestCase):
+    def setUp(self):
+        symbols.invalidate_index()
+
+    def test_saving_a_company_keeps_the_index_unless_indexed_fields_change(self):
+        company = Company.objects.create(ticker='KO', name='Coca-Cola', exchange='NYQ')
+        index = symbols.get_index()
+
+        # Refreshes save companies just to move last_updated
+        company.last_updated = timezone.now()
+        company.save()
+        self.assertIs(symbols.get_index(), index)
+
+        company.name = 'The Coca-Cola Company'
+        company.save()
+        self.assertIsNot(symbols.get_index(), index)
+        self.assertEqual(symbols.search_symbols('coca')[0]['name'], 'The Coca-Cola Company')
+
+    def test_new_and_deleted_companies_reach_the_index(self):
+        Company.objects.create(ticker='KO', name='Coca-Cola')
+        self.assertEqual(len(symbols.get_index()), 1)
+        Company.objects.create(ticker='PEP', name='PepsiCo')
+        self.assertEqual([entry['ticker'] for entry in symbols.search_symbols('pep')], ['PEP'])
+        Company.objects.filter(ticker='PEP').delete()
+        self.assertEqual(symbols.search_symbols('pep'), [])
+
+    def test_upstream_search_results_are_suggested_without_storing_companies(self):
+        clear_lru()
+        Company.objects.create(ticker='NVDA', name='NVIDIA Corporation')
+        quotes = [
+            {'symbol': 'NVDA', 'longname': 'NVIDIA Corporation', 'exchange': 'NMS', 'quoteType': 'EQUITY'},
+            {'symbol': 'NVDL', 'longname': 'GraniteShares 2x Long NVDA', 'exchange': 'NGM', 'quoteType': 'ETF'},
+            {'symbol': 'NVDA.MX', 'shortname': 'NVIDIA', 'exchange': 'MEX', 'quoteType': 'FUTURE'},
+        ]
+        with mock.patch('stock_data.utils.enqueue') as enqueue:
+            self.assertEqual([result['ticker'] for result in search_companies('nvd')], ['NVDA'])
+        enqueue.assert_called_once()
+
+        with mock.patch('stock_data.utils.search_quotes', return_value=quotes):
+            enrich_search('nvd')
+        self.assertFalse(Company.objects.filter(ticker='NVDL').exists())
+
+        with mock.patch('stock_data.utils.enqueue') as enqueue:
+            self.assertEqual([result['ticker'] for result in search_companies('nvd')], ['NVDA', 'NVDL'])
+            # Narrowed from the complete results cached for the shorter query
+            self.assertIn('NVDL', [result['ticker'] for result in search_companies('nvdl')])
+        enqueue.assert_not_called()
+
+
+class RefreshBackoffTests(TestCase):
+    """Companies whose refreshes keep failing must not take every scheduler cycle."""
+
+    def fail(self, ticker):
+        company = Company.objects.get(ticker=ticker)
+        with mock.patch('stock_data.refresh.fetch_company_refresh', return_value=RefreshResult(company, False, 0.0, 1)):
+            list(refresh_companies([company]))
+        return Company.objects.get(ticker=ticker)
+
+    def test_failing_company_backs_off_exponentially(self):
+        Company.objects.create(ticker='GONE', name='Delisted')
+        self.assertEqual(RefreshQueue(weights={}).pop(10), ['GONE'])
+
+        company = self.fail('GONE')
+        self.assertEqual(company.refresh_failures, 1)
+        queue = RefreshQueue(weights={})
+        self.assertEqual((len(queue), queue.backing_off), (0, 1))
+        self.assertEqual(RefreshQueue(now=company.refresh_failed_at + RETRY_AFTER, weights={}).pop(10), ['GONE'])
+
+        company = self.fail('GONE')
+        self.assertEqual(company.refresh_failures, 2)
+        self.assertEqual(len(RefreshQueue(now=company.refresh_failed_at + RETRY_AFTER, weights={})), 0)
+        self.assertEqual(len(RefreshQueue(now=company.refresh_failed_at + RETRY_AFTER * 2, weights={})), 1)
+
+    def test_success_ends_the_run_of_failures(self):
+        old = timezone.now() - datetime.timedelta(days=3)
+        company = create_company('KO', market_cap=10**9)
+        Company.objects.filter(ticker='KO').update(last_updated=old)
+        FinancialData.objects.filter(company=company).update(last_updated=old)
+        self.fail('KO')
+        self.fail('KO')
+
+        # Refreshed successfully since, then failing again starts over
+        Company.objects.filter(ticker='KO').update(last_updated=timezone.now())
+        self.assertEqual(self.fail('KO').refresh_failures, 1)
+
+
+def price_frame(start, days, dividends=None):
+    """Daily bars shaped like yfinance history, closing at 100, 101, ..."""
+    index = pd.date_range(start, periods=days, freq='D', tz='America/New_York', name='Date')
+    close = [100.0 + i for i in range(days)]
+    return pd.DataFrame({
+        'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': [1000] * days,
+        'Dividends': [0.0] * days if dividends is None else dividends, 'Stock Splits': [0.0] * days,
+    }, index=index)
+
+
+class PriceStoreTests(TestCase):
+    """Stored series are served locally and only their missing bars are fetched."""
+
+    def setUp(self):
+        self.start = timezone.now().astimezone(datetime.timezone.utc).date() - datetime.timedelta(days=10)
+
+    def expire(self):
+        PriceSeries.objects.update(last_fetched=timezone.now() - datetime.timedelta(hours=1))
+
+    def test_fresh_series_is_served_without_fetching(self):
+        with mock.patch('stock_data.prices.get_history', return_value=price_frame(self.start, 5)) as get_history:
+            first = get_price_history('KO', period='1mo')
+            second = get_price_history('KO', period='1mo')
+        get_history.assert_called_once_with('KO', period='1mo', interval='1d')
+        self.assertEqual(len(second), 5)
+        self.assertEqual(first['Close'].tolist(), second['Close'].tolist())
+
+    def test_stale_series_fetches_only_its_tail(self):
+        with mock.patch('stock_data.prices.get_history', return_value=price_frame(self.start, 5)):
+            get_price_history('KO', period='1mo')
+        self.expire()
+
+        # The tail starts at the last stored bar, whose values may have changed since
+        tail = price_frame(self.start + datetime.timedelta(days=4), 3)
+        with mock.patch('stock_data.prices.get_history', return_value=tail) as get_history:
+            hist = get_price_history('KO', period='1mo')
+        last_bar = price_frame(self.start, 5).index[-1]
+        get_history.assert_called_once_with('KO', start=last_bar, interval='1d')
+        self.assertEqual(hist['Close'].tolist(), [100.0, 101.0, 102.0, 103.0, 100.0, 101.0, 102.0])
+        self.assertEqual(PriceBar.objects.filter(ticker='KO').count(), 7)
+
+    def test_corporate_action_in_the_tail_refetches_the_period(self):
+        with mock.patch('stock_data.prices.get_history', return_value=price_frame(self.start, 5)):
+            get_price_history('KO', period='1mo')
+        self.expire()
+
+        tail = price_frame(self.start + datetime.timedelta(days=4), 3, dividends=[0.0, 0.5, 0.0])
+        adjusted = price_frame(self.start + datetime.timedelta(days=1), 6)
+        with mock.patch('stock_data.prices.get_history', side_effect=[tail, adjusted]) as get_history:
+            hist = get_price_history('KO', period='1mo')
+        self.assertEqual(get_history.call_args_list[1], mock.call('KO', period='1mo', interval='1d'))
+        # Bars stored before the dividend were on the old adjustment basis and are gone
+        self.assertEqual(hist.index.tolist(), adjusted.index.tolist())
+        self.assertEqual(PriceBar.objects.filter(ticker='KO').count(), 6)
+
+
+def statement_frame(revenue, net_income):
+    """An income statement shaped like yfinance's, newest period first."""
+    periods = [pd.Timestamp('2024-12-31'), pd.Timestamp('2023-12-31')]
+    return pd.DataFrame([revenue, net_income], index=['Total Revenue', 'Net Income'], columns=periods)
+
+
+class StatementStoreTests(TestCase):
+    """Statements are read back from the store as yfinance returned them."""
+
+    def test_stored_statement_reads_back_without_fetching(self):
+        df = statement_frame([400.0, 350.0], [40.0, float('nan')])
+        store_statement('KO', 'income', 'annual', df)
+        with mock.patch('stock_data.statements.get_statement_frame') as fetch:
+            stored = get_statement('KO', 'income')
+        fetch.assert_not_called()
+        pd.testing.assert_frame_equal(stored, df, check_column_type=False)
+
+    def test_empty_response_keeps_the_stored_copy(self):
+        store_statement('KO', 'income', 'annual', statement_frame([400.0, 350.0], [40.0, 35.0]))
+        store_statement('KO', 'income', 'annual', pd.DataFrame())
+        self.assertEqual(FinancialStatement.objects.filter(ticker='KO').count(), 4)
+
+        store_statement('KO', 'income', 'annual', statement_frame([500.0, 400.0], [50.0, 40.0]))
+        self.assertEqual(get_statement('KO', 'income').loc['Total Revenue'].tolist(), [500.0, 400.0])
+
+    def test_failed_fetch_serves_the_outdated_copy_flagged(self):
+        store_statement('KO', 'income', 'annual', statement_frame([400.0, 350.0], [40.0, 35.0]))
+        FinancialStatement.objects.update(last_updated=timezone.now() - STATEMENT_MAX_AGE * 2)
+        with mock.patch('stock_data.statements.get_statement_frame', side_effect=RuntimeError('down')):
+            stored = get_statement('KO', 'income')
+        self.assertEqual(stored.loc['Net Income'].tolist(), [40.0, 35.0])
+        self.assertTrue(stored.attrs['fetch_failed'])
+
+
+class CountingTicker:
+    """Stands in for yf.Ticker, counting the upstream lookups made through it."""
+    created = []
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.lookups = 0
+        self.created.append(self)
+
+    @property
+    def info(self):
+        self.lookups += 1
+        if self.ticker == 'DOWN':
+            raise RuntimeError('upstream unavailable')
+        return {'symbol': self.ticker}
+
+
+@mock.patch('stock_data.upstream.yf.Ticker', CountingTicker)
+class FetchCoalescingTests(TestCase):
+    """A request makes each upstream call once, however many callers need it."""
+
+    def setUp(self):
+        CountingTicker.created = []
+
+    def test_repeated_calls_share_one_ticker_and_one_lookup(self):
+        with fetch_context() as context:
+            for _ in range(3):
+                self.assertEqual(get_info('KO'), {'symbol': 'KO'})
+            get_info('PEP')
+            # A nested context joins the request's context rather than starting over
+            with fetch_context() as nested:
+                self.assertIs(nested, context)
+                get_info('KO')
+        self.assertEqual((context.calls, context.saved), (2, 3))
+        self.assertEqual(sorted(ticker.ticker for ticker in CountingTicker.created), ['KO', 'PEP'])
+
+        # Outside a context nothing is shared
+        get_info('KO')
+        get_info('KO')
+        self.assertEqual(len(CountingTicker.created), 4)
+
+    def test_failures_are_not_memoized(self):
+        with fetch_context() as context:
+            for _ in range(2):
+                with self.assertRaises(RuntimeError):
+                    get_info('DOWN')
+        self.assertEqual((context.calls, context.saved), (0, 0))
+        self.assertEqual(CountingTicker.created[0].lookups, 2)
+
+
+@override_settings(STOCK_DATA_STALE_WHILE_REVALIDATE=True, STOCK_DATA_MAX_STALENESS_HOURS=24 * 7)
+class StaleWhileRevalidateTests(TestCase):
+    """Stale companies are served at once and refreshed in the background."""
+
+    def age(self, ticker, days):
+        updated = timezone.now() - datetime.timedelta(days=days)
+        Company.objects.filter(ticker=ticker).update(last_updated=updated)
+        FinancialData.objects.filter(company_id=ticker).update(last_updated=updated)
+
+    def test_stale_company_is_served_and_refreshed_in_the_background(self):
+        create_company('KO', market_cap=10**9)
+        self.age('KO', 3)
+        with mock.patch('stock_data.utils.enqueue') as enqueue, \
+                mock.patch('stock_data.utils._refresh_company_data') as refresh:
+            company = get_company_data('KO')
+        refresh.assert_not_called()
+        enqueue.assert_called_once_with('company:KO', revalidate_company_data, 'KO')
+        self.assertTrue(company.freshness()['stale'])
+        self.assertTrue(company.freshness()['refreshing'])
+
+    def test_data_past_the_hard_limit_is_refreshed_before_serving(self):
+        create_company('KO', market_cap=10**9)
+        self.age('KO', 8)
+        with mock.patch('stock_data.utils.enqueue') as enqueue, \
+                mock.patch('stock_data.utils._refresh_company_data') as refresh:
+            get_company_data('KO')
+        enqueue.assert_not_called()
+        refresh.assert_called_once_with('KO')
+
+    @override_settings(STOCK_DATA_STALE_WHILE_REVALIDATE=False)
+    def test_off_unless_enabled(self):
+        create_company('KO', market_cap=10**9)
+        self.age('KO', 3)
+        with mock.patch('stock_data.utils.enqueue') as enqueue, \
+                mock.patch('stock_data.utils._refresh_company_data') as refresh:
+            get_company_data('KO')
+        enqueue.assert_not_called()
+        refresh.assert_called_once_with('KO')
+
+    def test_background_jobs_are_deduplicated_per_key(self):
+        started, release = threading.Event(), threading.Event()
+
+        def job():
+            started.set()
+            release.wait(5)
+
+        self.assertTrue(background.enqueue('test:KO', job))
+        started.wait(5)
+        self.assertFalse(background.enqueue('test:KO', job))
+        release.set()
+
+
+class SearchCacheTests(TestCase):
+    """Searches are cached once per normalized query and narrowed from complete prefixes."""
+
+    def setUp(self):
+        clear_lru()
+        self.results = [
+            {'ticker': 'AAPL', 'name': 'Apple Inc.', 'exchange': 'NMS'},
+            {'ticker': 'APLE', 'name': 'Apple Hospitality REIT', 'exchange': 'NYQ'},
+            {'ticker': 'APP', 'name': 'AppLovin Corporation', 'exchange': 'NMS'},
+        ]
+
+    def test_queries_are_normalized(self):
+        store_search('  Apple ', self.results[:2], complete=True)
+        clear_lru()
+        self.assertEqual(get_cached_search('APPLE'), self.results[:2])
+        self.assertEqual(SearchResult.objects.count(), 1)
+
+    def test_longer_queries_are_narrowed_from_a_complete_prefix(self):
+        store_search('app', self.results, complete=True)
+        clear_lru()
+        self.assertEqual([result['ticker'] for result in get_cached_search('apple')], ['AAPL', 'APLE'])
+        self.assertEqual([result['ticker'] for result in get_cached_search('applov')], ['APP'])
+
+    def test_incomplete_prefixes_are_not_narrowed(self):
+        # Upstream stopped at its result limit, so other matches for longer queries may exist
+        store_search('app', self.results, complete=False)
+        clear_lru()
+        self.assertIsNone(get_cached_search('apple'))
+
+    def test_expired_results_are_ignored_and_purged(self):
+        store_search('app', self.results, complete=True)
+        SearchResult.objects.update(last_updated=timezone.now() - SearchResult.MAX_AGE * 2)
+        clear_lru()
+        self.assertIsNone(get_cached_search('app'))
+        self.assertIsNone(get_cached_search('apple'))
+        self.assertEqual(purge_search_cache(), 1)
+
+
+class ConditionalViewTests(TestCase):
+    """Repeat requests for unchanged data are answered with 304 Not Modified."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.updated = [timezone.now()]
+        self.renders = 0
+        self.status = 200
+
+    def state(self, request):
+        return self.updated
+
+    def view(self, request):
+        self.renders += 1
+        return HttpResponse('page', status=self.status)
+
+    def get(self, view, path='/page/', etag=None):
+        return view(self.factory.get(path, headers={'If-None-Match': etag} if etag else {}))
+
+    def test_unchanged_data_is_not_modified(self):
+        view = conditional_view(self.state, max_age=60)(self.view)
+        response = self.get(view)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        repeat = self.get(view, etag=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(self.renders, 1)
+
+        # Another query string is another response
+        self.assertEqual(self.get(view, '/page/?period=1y', etag=response['ETag']).status_code, 200)
+
+        self.updated = [timezone.now() + datetime.timedelta(seconds=1)]
+        changed = self.get(view, etag=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_data_that_would_be_fetched_is_served_in_full(self):
+        self.updated = [None]
+        view = conditional_view(self.state)(self.view)
+        response = self.get(view)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_errors_carry_no_validators(self):
+        self.status = 500
+        response = self.get(conditional_view(self.state)(self.view))
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_async_views(self):
+        async def view(request):
+            return self.view(request)
+
+        view = conditional_view(self.state)(view)
+        response = async_to_sync(view)(self.factory.get('/page/'))
+        repeat = async_to_sync(view)(self.factory.get('/page/', headers={'If-None-Match': response['ETag']}))
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(self.renders, 1)
+
+
+class CompanyCacheTests(TestCase):
+    """Company payloads are built once per generation and dropped when the company is refreshed."""
+
+    def setUp(self):
+        cache.clear()
+        self.builds = []
+
+    def builders(self, ticker, uncached=False):
+        def build(name):
+            self.builds.append((ticker, name))
+            value = f'{ticker} {name}'
+            return Uncached(value) if uncached and name == 'officers' else value
+
+        return {name: (lambda name=name: build(name), None) for name in ('prices', 'officers')}
+
+    def test_payloads_are_built_until_invalidated(self):
+        self.assertEqual(get_company_payloads('KO', self.builders('KO')), {'prices': 'KO prices', 'officers': 'KO officers'})
+        get_company_payloads('KO', self.builders('KO'))
+        get_company_payloads('PEP', self.builders('PEP'))
+        self.assertEqual(len(self.builds), 4)
+
+        # Only the invalidated ticker moves to a new generation
+        invalidate_company(['KO'])
+        get_company_payloads('KO', self.builders('KO'))
+        get_company_payloads('PEP', self.builders('PEP'))
+        self.assertEqual(self.builds[4:], [('KO', 'prices'), ('KO', 'officers')])
+
+    def test_uncached_payloads_are_served_but_built_again(self):
+        for _ in range(2):
+            payloads = async_to_sync(aget_company_payloads)('KO', self.builders('KO', uncached=True))
+            self.assertEqual(payloads['officers'], 'KO officers')
+        self.assertEqual(self.builds, [('KO', 'prices'), ('KO', 'officers'), ('KO', 'officers')])
+
+    def test_hits_and_misses_are_counted(self):
+        reset_cache_stats()
+        for _ in range(3):
+            get_company_payloads('KO', self.builders('KO'))
+        stats = cache_stats()
+        self.assertEqual(stats['payloads']['prices'], {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3})
+        self.assertEqual(stats['total']['hits'], 4)
+
+
+@mock.patch('stock_data.popularity.enqueue')
+class PopularityTests(TestCase):
+    """Request counts reach the database in batches, for stored companies only."""
+
+    def setUp(self):
+        cache.clear()
+        popularity._counts.clear()
+        self.addCleanup(popularity._counts.clear)
+        for ticker in ('KO', 'PEP'):
+            Company.objects.create(ticker=ticker, name=ticker)
+
+    def test_flush_adds_counts_of_stored_companies(self, enqueue):
+        popularity.record_access(['KO', 'KO', 'PEP', 'NOTATICKER'])
+        popularity.flush_access_counts()
+        popularity.record_access(['KO'])
+        popularity.flush_access_counts()
+
+        counts = dict(TickerAccess.objects.values_list('ticker', 'count'))
+        self.assertEqual(counts, {'KO': 3, 'PEP': 1})
+        self.assertEqual(list(popularity.access_rates()), ['KO', 'PEP'])
+        self.assertEqual(popularity.popular_companies(limit=1), [('KO', 'KO')])
+
+    def test_scores_decay(self, enqueue):
+        now = timezone.now()
+        TickerAccess.objects.create(ticker='KO', count=8, score=8, score_updated=now - popularity.HALF_LIFE)
+        TickerAccess.objects.create(ticker='PEP', count=5, score=5, score_updated=now)
+        self.assertEqual(list(popularity.access_rates(now)), ['PEP', 'KO'])
+        self.assertAlmostEqual(popularity.decayed(8, now - popularity.HALF_LIFE * 2, now), 2)
+
+    def test_counts_are_kept_while_the_database_is_locked(self, enqueue):
+        popularity.record_access(['KO'])
+        with mock.patch.object(TickerAccess.objects, 'select_for_update', side_effect=OperationalError('database is locked')):
+            popularity.flush_access_counts()
+        self.assertEqual(popularity._counts, {'KO': 1})
+        popularity.flush_access_counts()
+        self.assertEqual(TickerAccess.objects.get(ticker='KO').count, 1)
+
+    def test_counts_that_cannot_be_saved_are_dropped(self, enqueue):
+        popularity.record_access(['KO'])
+        with mock.patch.object(TickerAccess.objects, 'select_for_update', side_effect=ValueError('bad row')):
+            popularity.flush_access_counts()
+        self.assertEqual(popularity._counts, {})
+
+    def test_only_successful_requests_count(self, enqueue):
+        @popularity.track_access()
+        def view(request, ticker):
+            return HttpResponse(status=404 if ticker == 'gone' else 200)
+
+        request = RequestFactory().get('/')
+        view(request, ticker='ko')
+        view(request, ticker='gone')
+        self.assertEqual(popularity._counts, {'KO': 1})
@@ -0,0 +1,297 @@
+# stock_data/upstream.py
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+import yfinance as yf
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .metrics import UPSTREAM_REQUESTS, UPSTREAM_SAVED, UPSTREAM_SECONDS
+from .profiling import phase, profile_thread
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on threads fanning out per-ticker fetches for one request
+MAX_PARALLEL_FETCHES = 8
+# Threads shared by every async request for blocking upstream and database calls
+DEFAULT_ASYNC_WORKERS = 32
+
+_active_context = contextvars.ContextVar('stock_data_fetch_context', default=None)
+
+class FetchContext:
+    """Memoize upstream yfinance resources per ticker for the lifetime of one request."""
+
+    def __init__(self, limiter=None, endpoint=None):
+        self.limiter = limiter
+        # What the calls are made for in metrics: the request's view, or a job name
+        self.request = None
+        self.endpoint = endpoint
+        self._tickers = {}
+        self._results = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.saved = 0
+
+    def ticker(self, ticker):
+        """Return one shared yf.Ticker per symbol."""
+        with self._lock:
+            if ticker not in self._tickers:
+                self._tickers[ticker] = _ticker(ticker)
+            return self._tickers[ticker]
+
+    def fetch(self, key, loader, resource='other'):
+        """Return the memoized result for key, calling loader on the first request only."""
+        with self._lock:
+            if key in self._results:
+                self.saved += 1
+                UPSTREAM_SAVED.inc(resource, current_endpoint())
+                return self._results[key]
+
+        if self.limiter is not None:
+            # Only real upstream calls spend the rate budget, not memoized hits
+            self.limiter.acquire()
+
+        # Failures are not memoized so a later caller can retry
+        value = loader()
+
+        with self._lock:
+            self.calls += 1
+            self._results.setdefault(key, value)
+        return value
+
+@contextmanager
+def fetch_context(limiter=None, endpoint=None):
+    """Open a fetch context, or join the one already active for this request."""
+    context = _active_context.get()
+    if context is not None:
+        yield context
+        return
+
+    context = FetchContext(limiter=limiter, endpoint=endpoint)
+    token = _active_context.set(context)
+    try:
+        yield context
+    finally:
+        _active_context.reset(token)
+        logger.debug(f"Upstream calls: {context.calls} made, {context.saved} saved")
+
+def _replay_root():
+    return getattr(settings, 'STOCK_DATA_UPSTREAM_FIXTURES', None)
+
+def _ticker(ticker):
+    """Return a yf.Ticker, or its recorded stand-in when upstream fixtures are configured."""
+    root = _replay_root()
+    if root:
+        # Imported here since replay reads statement and price helpers that import this module
+        from .replay import ReplayTicker
+        return ReplayTicker(ticker, root)
+    return yf.Ticker(ticker)
+
+def current_context():
+    """Return the active fetch context, if any."""
+    return _active_context.get()
+
+def current_endpoint():
+    """Name what the active fetch context serves, for metric labels: a view name, a job, or none."""
+    context = _active_context.get()
+    if context is None:
+        return 'none'
+    match = getattr(context.request, 'resolver_match', None)
+    if match is not None:
+        return match.view_name
+    return context.endpoint or 'none'
+
+def _call(resource, loader):
+    """Call loader, counting and timing it as one upstream request."""
+    endpoint = current_endpoint()
+    started = time.perf_counter()
+    try:
+        with phase('yfinance'):
+            value = loader()
+    except Exception:
+        UPSTREAM_REQUESTS.inc(resource, endpoint, 'error')
+        raise
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, resource, endpoint)
+    UPSTREAM_REQUESTS.inc(resource, endpoint, 'ok')
+    return value
+
+def _fetch(ticker, key, resource, loader):
+    """Call loader through the active fetch context when there is one."""
+    context = _active_context.get()
+    if context is None:
+        return _call(resource, lambda: loader(_ticker(ticker)))
+    return context.fetch((ticker, key), lambda: _call(resource, lambda: loader(context.ticker(ticker))), resource)
+
+def get_info(ticker):
+    """Fetch the yfinance info dict for a ticker."""
+    return _fetch(ticker, 'info', 'info', lambda ticker_obj: ticker_obj.info)
+
+def get_history(ticker, **kwargs):
+    """Fetch OHLCV history for a ticker; kwargs are passed to yf.Ticker.history."""
+    key = ('history',) + tuple(sorted((name, str(value)) for name, value in kwargs.items()))
+    return _fetch(ticker, key, 'history', lambda ticker_obj: ticker_obj.history(**kwargs))
+
+def get_dividends(ticker):
+    """Fetch the dividend history for a ticker."""
+    return _fetch(ticker, 'dividends', 'dividends', lambda ticker_obj: ticker_obj.dividends)
+
+def get_statement_frame(ticker, attribute):
+    """Fetch a financial statement DataFrame by its yf.Ticker attribute name."""
+    return _fetch(ticker, attribute, 'statements', lambda ticker_obj: getattr(ticker_obj, attribute))
+
+def search_quotes(query, max_results=10):
+    """Search Yahoo Finance for symbols matching a query, returning its quote dicts."""
+    def search():
+        root = _replay_root()
+        if root:
+            from .replay import search as replay_search
+            return replay_search(root, query, max_results=max_results)
+        return yf.Search(query, max_results=max_results, news_count=0, lists_count=0).quotes
+
+    def loader():
+        return _call('search', search)
+
+    context = _active_context.get()
+    if context is None:
+        return loader()
+    return context.fetch(('search', query.lower(), max_results), loader, 'search')
+
+def download_histories(tickers, **kwargs):
+    """Fetch OHLCV history for several tickers in one batched download.
+
+    kwargs are passed to yf.download. Returns a dict of ticker to a DataFrame shaped
+    like yf.Ticker.history; tickers without data map to an empty DataFrame.
+    """
+    tickers = list(tickers)
+
+    def download():
+        root = _replay_root()
+        if root:
+            from .replay import download as replay_download
+            return replay_download(root, tickers, **kwargs)
+        return yf.download(
+            tickers,
+            group_by='ticker',
+            actions=True,
+            auto_adjust=True,
+            ignore_tz=False,
+            threads=True,
+            progress=False,
+            **kwargs,
+        )
+
+    def loader():
+        return _call('download', download)
+
+    context = _active_context.get()
+    if context is None:
+        frame = loader()
+    else:
+        key = ('download',) + tuple(sorted((name, str(value)) for name, value in kwargs.items()))
+        frame = context.fetch((tuple(tickers), key), loader, 'download')
+
+    histories = {}
+    for ticker in tickers:
+        if frame is None or frame.empty or ticker not in frame.columns.get_level_values(0):
+            histories[ticker] = pd.DataFrame()
+            continue
+        hist = frame[ticker]
+        # Rows are the union of every ticker's sessions, so drop the ones this ticker lacks
+        histories[ticker] = hist.dropna(how='all', subset=[column for column in ('Open', 'High', 'Low', 'Close') if column in hist])
+    return histories
+
+def _call_in_thread(func, *args, **kwargs):
+    try:
+        with profile_thread():
+            return func(*args, **kwargs)
+    finally:
+        # Threads of a throwaway pool each open their own database connection
+        connection.close()
+
+def _call_in_worker(func, *args, **kwargs):
+    # Workers of the shared executor keep their connection between calls, as request threads do
+    close_old_connections()
+    try:
+        with profile_thread():
+            return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+def run_parallel(func, items, max_workers=MAX_PARALLEL_FETCHES):
+    """Call func(item) for every item on a thread pool, inside the caller's fetch context.
+
+    Returns a dict of item to result. Failures are logged and left out.
+    """
+    items = list(dict.fromkeys(items))
+    results = {}
+
+    if len(items) <= 1:
+        # Not worth a thread
+        for item in items:
+            try:
+                results[item] = func(item)
+            except Exception as e:
+                logger.error(f"Error fetching {item}: {e}")
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        # Each task runs in its own copy of the context, so they all join the active fetch context
+        futures = {
+            item: pool.submit(contextvars.copy_context().run, _call_in_thread, func, item)
+            for item in items
+        }
+        for item, future in futures.items():
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                logger.error(f"Error fetching {item}: {e}")
+    return results
+
+_async_executor = None
+_async_executor_lock = threading.Lock()
+
+def _executor():
+    global _async_executor
+
+    with _async_executor_lock:
+        if _async_executor is None:
+            _async_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'STOCK_DATA_ASYNC_WORKERS', DEFAULT_ASYNC_WORKERS),
+                thread_name_prefix='upstream',
+            )
+        return _async_executor
+
+async def run_async(func, *args, **kwargs):
+    """Await a blocking call on the bounded upstream executor, inside the caller's fetch context.
+
+    Lets async views wait on yfinance and the database without holding the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _executor(),
+        lambda: context.run(_call_in_worker, func, *args, **kwargs),
+    )
+
+async def gather_parallel(func, items):
+    """Async counterpart of run_parallel: await func(item) for every item concurrently.
+
+    Returns a dict of item to result. Failures are logged and left out.
+    """
+    items = list(dict.fromkeys(items))
+    outcomes = await asyncio.gather(*(run_async(func, item) for item in items), return_exceptions=True)
+
+    results = {}
+    for item, outcome in zip(items, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Error fetching {item}: {outcome}")
+        else:
+            results[item] = outcome
+    return results
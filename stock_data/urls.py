@@ -9,4 +9,7 @@ urlpatterns = [
     path('search/', views.search_results, name='search_results'),
     path('refresh/<str:ticker>/', views.refresh_company_data, name='refresh_data'),
     path('api/search-suggestions/', views.search_suggestions, name='search_suggestions'),
+    path('api/screener/', views.screener_json, name='screener'),
+    path('api/cache-stats/', views.cache_stats_json, name='cache_stats'),
+    path('api/scheduler/', views.scheduler_status_json, name='scheduler_status'),
 ]
\ No newline at end of file
@@ -1,24 +1,37 @@
 # stock_data/utils.py
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
 
 import pandas as pd
-import yfinance as yf
+from django.conf import settings
 from django.utils import timezone
 
+from .aggregates import update_aggregates
+from .background import enqueue
+from .company_cache import invalidate_company
+from .locks import single_flight
+from .peers import update_peers
+from .piotroski import build_panel, score_panel, statement_records
+from .prices import get_price_history
+from .profiling import phase
+from .search_cache import get_cached_search, store_search
+from .statements import refresh_statements
+from .symbols import search_symbols
+from .upstream import MAX_PARALLEL_FETCHES, fetch_context, get_dividends, get_info, search_quotes
+
 logger = logging.getLogger(__name__)
 
 def fetch_company_info(ticker):
     """Fetch basic company information from yfinance."""
     try:
-        ticker_obj = yf.Ticker(ticker)
-        info = ticker_obj.info
+        info = get_info(ticker)
         
         return {
             'ticker': ticker,
             'name': info.get('longName', ticker),
+            'exchange': info.get('exchange'),
             'sector': info.get('sector'),
             'industry': info.get('industry'),
             'country': info.get('country'),
@@ -29,19 +42,23 @@ def fetch_company_info(ticker):
         logger.error(f"Error fetching company info for {ticker}: {e}")
         return None
 
-def fetch_financial_data(ticker):
-    """Fetch and calculate financial metrics for a company."""
+def fetch_financial_data(ticker, statements=None):
+    """Fetch and calculate financial metrics for a company.
+
+    Statements are fetched and stored unless already fetched ones are passed in.
+    """
     try:
-        ticker_obj = yf.Ticker(ticker)
-        info = ticker_obj.info
+        info = get_info(ticker)
         
-        # Get financial statements
-        income_stmt = ticker_obj.income_stmt
-        balance_sheet = ticker_obj.balance_sheet
-        cash_flow = ticker_obj.cashflow
+        # Get financial statements, storing them for every other statement consumer
+        if statements is None:
+            statements = refresh_statements(ticker)
+        income_stmt = statements[('income', 'annual')]
+        balance_sheet = statements[('balance', 'annual')]
+        cash_flow = statements[('cashflow', 'annual')]
         
         # Calculate YTD price change
-        hist = ticker_obj.history(period="ytd")
+        hist = get_price_history(ticker, period="ytd")
         if not hist.empty:
             start_price = hist.iloc[0]['Close']
             current_price = info.get('currentPrice', hist.iloc[-1]['Close'])
@@ -66,7 +83,7 @@ def fetch_financial_data(ticker):
         quality_score = calculate_piotroski_score(income_stmt, balance_sheet, cash_flow)
         
         # Get dividend info
-        dividends = ticker_obj.dividends
+        dividends = get_dividends(ticker)
         if not dividends.empty:
             div_yield = info.get('dividendYield', 0) * 100  # Convert to percentage
             payout = info.get('payoutRatio', 0) * 100  # Convert to percentage
@@ -103,130 +120,177 @@ def fetch_financial_data(ticker):
         return None
 
 def calculate_piotroski_score(income_stmt, balance_sheet, cash_flow):
-    """Calculate Piotroski F-Score (0-9) based on financial statements."""
-    score = 0
+    """Calculate Piotroski F-Score (0-9), or None when the statements cannot support it."""
+    statements = {
+        ('income', 'annual'): income_stmt,
+        ('balance', 'annual'): balance_sheet,
+        ('cashflow', 'annual'): cash_flow,
+    }
     
     try:
-        # Get the most recent and previous year data
-        current_year = income_stmt.columns[0]
-        prev_year = income_stmt.columns[1] if len(income_stmt.columns) > 1 else None
-        
-        if prev_year:
-            # 1. Positive Net Income
-            if income_stmt.loc['Net Income', current_year] > 0:
-                score += 1
-                
-            # 2. Positive ROA
-            current_assets = balance_sheet.loc['Total Assets', current_year]
-            if current_assets > 0 and income_stmt.loc['Net Income', current_year] / current_assets > 0:
-                score += 1
-                
-            # 3. Positive Operating Cash Flow
-            if cash_flow.loc['Operating Cash Flow', current_year] > 0:
-                score += 1
-                
-            # 4. OCF > Net Income
-            if cash_flow.loc['Operating Cash Flow', current_year] > income_stmt.loc['Net Income', current_year]:
-                score += 1
-                
-            # 5. Decreasing Long Term Debt ratio
-            prev_assets = balance_sheet.loc['Total Assets', prev_year]
-            current_debt = balance_sheet.loc['Long Term Debt', current_year] if 'Long Term Debt' in balance_sheet.index else 0
-            prev_debt = balance_sheet.loc['Long Term Debt', prev_year] if 'Long Term Debt' in balance_sheet.index else 0
-            
-            if (current_debt / current_assets) < (prev_debt / prev_assets):
-                score += 1
-                
-            # 6. Increasing Current Ratio
-            current_current_assets = balance_sheet.loc['Current Assets', current_year] if 'Current Assets' in balance_sheet.index else 0
-            current_current_liab = balance_sheet.loc['Current Liabilities', current_year] if 'Current Liabilities' in balance_sheet.index else 1
-            prev_current_assets = balance_sheet.loc['Current Assets', prev_year] if 'Current Assets' in balance_sheet.index else 0
-            prev_current_liab = balance_sheet.loc['Current Liabilities', prev_year] if 'Current Liabilities' in balance_sheet.index else 1
-            
-            current_ratio = current_current_assets / current_current_liab if current_current_liab else 0
-            prev_ratio = prev_current_assets / prev_current_liab if prev_current_liab else 0
-            
-            if current_ratio > prev_ratio:
-                score += 1
-                
-            # 7. No New Shares Issued
-            current_shares = balance_sheet.loc['Common Stock', current_year] if 'Common Stock' in balance_sheet.index else 0
-            prev_shares = balance_sheet.loc['Common Stock', prev_year] if 'Common Stock' in balance_sheet.index else 0
-            
-            if current_shares <= prev_shares:
-                score += 1
-                
-            # 8. Increasing Gross Margin
-            current_gross = income_stmt.loc['Gross Profit', current_year] / income_stmt.loc['Total Revenue', current_year] if 'Gross Profit' in income_stmt.index and income_stmt.loc['Total Revenue', current_year] else 0
-            prev_gross = income_stmt.loc['Gross Profit', prev_year] / income_stmt.loc['Total Revenue', prev_year] if 'Gross Profit' in income_stmt.index and income_stmt.loc['Total Revenue', prev_year] else 0
-            
-            if current_gross > prev_gross:
-                score += 1
-                
-            # 9. Increasing Asset Turnover
-            current_turnover = income_stmt.loc['Total Revenue', current_year] / current_assets if current_assets else 0
-            prev_turnover = income_stmt.loc['Total Revenue', prev_year] / prev_assets if prev_assets else 0
-            
-            if current_turnover > prev_turnover:
-                score += 1
-    
+        # Same scoring as the batch job, on a panel of one
+        scores = score_panel(*build_panel(statement_records([('', statements)])))
     except Exception as e:
         logger.error(f"Error calculating Piotroski score: {e}")
-        # Return 0 or a default value on error
-        return 0
-        
-    return score
+        return None
+    
+    if scores.empty or pd.isna(scores['score'].iloc[0]):
+        return None
+    return int(scores['score'].iloc[0])
+
+# Quote types worth adding to the symbol index
+SEARCHABLE_QUOTE_TYPES = ('EQUITY', 'ETF')
+SEARCH_MAX_RESULTS = 10
 
-def search_companies(query):
-    """Search for companies by name or partial ticker using yfinance."""
+def search_companies(query, limit=10, enrich=True):
+    """Search for companies by ticker or name in the local symbol index.
+    
+    Symbols found by an earlier upstream search but not stored yet come from the search cache.
+    """
+    results = search_symbols(query, limit)
+    
+    if len(results) < limit:
+        cached = get_cached_search(query)
+        if cached is not None:
+            found = {result['ticker'] for result in results}
+            results += [result for result in cached if result['ticker'] not in found][:limit - len(results)]
+        elif enrich:
+            # Upstream search only fills the search cache, so the next search finds more
+            enqueue(f'search:{query.lower()}', enrich_search, query)
+    
+    return results
+
+def enrich_search(query):
+    """Search upstream for a query and cache the symbols it finds.
+
+    Companies are only stored once a page asks for them or symbols are
+    imported, so searches do not fill the table with placeholders. Returns
+    the results as ticker/name/exchange dicts.
+    """
+    from stock_data.models import Company
+
+    cached = get_cached_search(query)
+    if cached is not None:
+        return cached
+    
     try:
-        # Search using yfinance's search functionality
-        search_results = yf.Ticker(query).search()
-        
-        if not search_results:
-            # Try using tickers module for common companies
-            from yahoo_fin import stock_info
-            tickers = stock_info.tickers_sp500() + stock_info.tickers_nasdaq() + stock_info.tickers_dow()
-            
-            # Filter tickers that contain the query (case insensitive)
-            matches = [t for t in tickers if query.lower() in t.lower()]
-            
-            results = []
-            for match in matches[:10]:  # Limit to 10 results
-                try:
-                    info = yf.Ticker(match).info
-                    results.append({
-                        'ticker': match,
-                        'name': info.get('longName', match),
-                        'exchange': info.get('exchange', ''),
-                    })
-                except:
-                    pass
-            
-            return results
-        
-        # Process yfinance search results
-        results = []
-        for item in search_results[:10]:  # Limit to 10 results
-            results.append({
-                'ticker': item.get('symbol'),
-                'name': item.get('shortname', item.get('longname', item.get('symbol'))),
-                'exchange': item.get('exchange', ''),
-            })
-        
-        return results
-        
+        quotes = search_quotes(query, max_results=SEARCH_MAX_RESULTS)
     except Exception as e:
         logger.error(f"Error searching for companies with query '{query}': {e}")
         return []
     
+    max_length = Company._meta.get_field('ticker').max_length
+    results = []
+    for item in quotes:
+        symbol = item.get('symbol')
+        if not symbol or len(symbol) > max_length or item.get('quoteType') not in SEARCHABLE_QUOTE_TYPES:
+            continue
+        results.append({
+            'ticker': symbol,
+            'name': item.get('longname') or item.get('shortname') or symbol,
+            'exchange': item.get('exchange', ''),
+        })
+    
+    # Fewer quotes than asked for means upstream had nothing more to return
+    store_search(query, results, complete=len(quotes) < SEARCH_MAX_RESULTS)
+    
+    return results
+    
+def _financials_stale(financials):
+    """Check if financial data is missing or needs updating."""
+    return not financials or financials.is_stale()
+
+def _can_serve_stale(company, financials):
+    """Check if stale data may be served while it is refreshed in the background."""
+    if not getattr(settings, 'STOCK_DATA_STALE_WHILE_REVALIDATE', False) or not financials:
+        return False
+    
+    # Past the hard limit the user waits for fresh data instead
+    max_staleness = timedelta(hours=getattr(settings, 'STOCK_DATA_MAX_STALENESS_HOURS', 24 * 7))
+    oldest = min(company.last_updated, financials.last_updated)
+    return timezone.now() - oldest <= max_staleness
+
+def company_as_of(ticker):
+    """Return when the stored company and financials were updated, or None if either is stale."""
+    from stock_data.models import Company
+
+    company = Company.objects.select_related('financials').filter(ticker=ticker).first()
+    financials = getattr(company, 'financials', None)
+    if not company or company.is_stale() or _financials_stale(financials):
+        return None
+    return [company.last_updated, financials.last_updated]
+
+@phase('get_company_data')
+@fetch_context()  # Lets the info lookups in both fetch functions share one upstream call
 def get_company_data(ticker):
     """Get or create company data for the given ticker."""
-    from django.utils import timezone
+    from stock_data.models import Company, FinancialData
+
+    company = Company.objects.filter(ticker=ticker).first()
+    financials = FinancialData.objects.filter(company=company).first() if company else None
+    if company and not company.is_stale() and not _financials_stale(financials):
+        return company
+    
+    if company and _can_serve_stale(company, financials):
+        # Serve what is stored now and refresh it off the request path
+        enqueue(f'company:{ticker}', revalidate_company_data, ticker)
+        company.refreshing = True
+        return company
+    
+    # Only one caller refreshes a ticker at a time; the others wait and reuse its result
+    with single_flight(f'company:{ticker}') as acquired:
+        if not acquired:
+            # The refresher is taking too long, so serve whatever is stored
+            return Company.objects.filter(ticker=ticker).first()
+        return _refresh_company_data(ticker)
+
+def revalidate_company_data(ticker):
+    """Refresh a ticker in the background, unless another caller is already refreshing it."""
+    with fetch_context(endpoint='revalidate'), single_flight(f'company:{ticker}', wait=0) as acquired:
+        if acquired:
+            _refresh_company_data(ticker)
+
+def get_companies_data(tickers):
+    """Get or create company data for several tickers, as get_company_data would for each.
+
+    Upstream fetches run in parallel but everything fetched is written in one
+    batch, since concurrent writers lock each other out of SQLite. Returns a
+    dict of ticker to Company for the tickers that could be found.
+    """
+    from stock_data.models import Company
+    from stock_data.refresh import RefreshWriter, refresh_companies
+
+    stored = Company.objects.select_related('financials').in_bulk(tickers)
+    companies = {}
+    missing = []
+    for ticker in tickers:
+        company = stored.get(ticker)
+        financials = getattr(company, 'financials', None)
+        if company and not company.is_stale() and not _financials_stale(financials):
+            companies[ticker] = company
+        elif company and _can_serve_stale(company, financials):
+            enqueue(f'company:{ticker}', revalidate_company_data, ticker)
+            company.refreshing = True
+            companies[ticker] = company
+        else:
+            missing.append(company or Company(ticker=ticker, name=ticker))
+
+    if missing:
+        writer = RefreshWriter(batch_size=len(missing))
+        for _ in refresh_companies(missing, workers=min(MAX_PARALLEL_FETCHES, len(missing)), writer=writer):
+            pass
+        # Read back what was written, so companies whose fetch or write failed are left out
+        companies.update(Company.objects.in_bulk([company.ticker for company in missing]))
+
+    return companies
+
+def _refresh_company_data(ticker):
+    """Create or refresh stored company data, re-checking what is stale first."""
     from stock_data.models import Company, FinancialData
 
     # Try to get existing company
     company = Company.objects.filter(ticker=ticker).first()
+    refreshed = False
     
     if not company:
         # Fetch company info from yfinance
@@ -236,6 +300,7 @@ def get_company_data(ticker):
         
         # Create new company record
         company = Company.objects.create(**company_info)
+        refreshed = True
     elif company.is_stale():
         # Update stale company info
         company_info = fetch_company_info(ticker)
@@ -245,11 +310,12 @@ def get_company_data(ticker):
                     setattr(company, key, value)
             company.last_updated = timezone.now()
             company.save()
+            refreshed = True
     
     # Get or create financial data
     financials = FinancialData.objects.filter(company=company).first()
     
-    if not financials or (timezone.now() - financials.last_updated).days > 1:
+    if _financials_stale(financials):
         # Fetch or update financial data
         financial_data = fetch_financial_data(ticker)
         if financial_data:
@@ -261,5 +327,21 @@ def get_company_data(ticker):
                         setattr(financials, key, value)
                 financials.last_updated = timezone.now()
                 financials.save()
+            refreshed = True
+    
+    if refreshed:
+        invalidate_company([ticker])
+        
+        # Peer ranks depend on sector, industry and market cap, which may have just changed.
+        # The company is saved by now, so failing to maintain these must not fail the request
+        try:
+            update_peers([ticker])
+        except Exception as e:
+            logger.error(f"Error updating peers for {ticker}: {e}")
+        
+        try:
+            update_aggregates([ticker])
+        except Exception as e:
+            logger.error(f"Error updating sector aggregates for {ticker}: {e}")
     
     return company
\ No newline at end of file
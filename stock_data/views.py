@@ -1,13 +1,18 @@
 # stock_data/views.py
-import json
+import hmac
 import logging
 
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.utils import timezone
 
-from .models import Company, FinancialData, SearchResult
-from .utils import fetch_company_info, fetch_financial_data, search_companies
+from .company_cache import cache_stats
+from .metrics import render as render_metrics
+from .models import Company
+from .refresh import refresh_company
+from .scheduler import scheduler_status
+from .screener import Screen
+from .utils import enrich_search, search_companies
 
 logger = logging.getLogger(__name__)
 
@@ -18,27 +23,8 @@ def search_results(request):
     if not query:
         return redirect('core:home')
     
-    # Check for cached search results
-    cached_search = SearchResult.objects.filter(query__iexact=query).first()
-    
-    if cached_search and not cached_search.is_stale():
-        # Use cached results
-        results = json.loads(cached_search.results_json)
-    else:
-        # Perform new search
-        results = search_companies(query)
-        
-        # Cache the results
-        if results:
-            if cached_search:
-                cached_search.results_json = json.dumps(results)
-                cached_search.last_updated = timezone.now()
-                cached_search.save()
-            else:
-                SearchResult.objects.create(
-                    query=query,
-                    results_json=json.dumps(results),
-                )
+    # Ask upstream right away only when nothing is known locally
+    results = search_companies(query, enrich=False) or enrich_search(query)
     
     return render(request, 'stock_data/search_results.html', {
         'query': query,
@@ -51,70 +37,18 @@ def refresh_company_data(request, ticker):
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
     company = get_object_or_404(Company, ticker=ticker)
-    
-    # Fetch fresh company information
-    company_info = fetch_company_info(ticker)
-    if company_info:
-        for key, value in company_info.items():
-            if key != 'ticker' and hasattr(company, key):
-                setattr(company, key, value)
-        company.last_updated = timezone.now()
-        company.save()
-    
-    # Fetch fresh financial data
-    financial_data = fetch_financial_data(ticker)
-    if financial_data:
-        financials, created = FinancialData.objects.get_or_create(company=company)
-        
-        for key, value in financial_data.items():
-            if hasattr(financials, key):
-                setattr(financials, key, value)
-        
-        financials.last_updated = timezone.now()
-        financials.save()
-    
-    return JsonResponse({'status': 'success', 'message': f'Data for {ticker} refreshed successfully'})
-
-def get_company_data(ticker):
-    """Get or create company data for the given ticker."""
-    # Try to get existing company
-    company = Company.objects.filter(ticker=ticker).first()
-    
-    if not company:
-        # Fetch company info from yfinance
-        company_info = fetch_company_info(ticker)
-        if not company_info:
-            return None
-        
-        # Create new company record
-        company = Company.objects.create(**company_info)
-    elif company.is_stale():
-        # Update stale company info
-        company_info = fetch_company_info(ticker)
-        if company_info:
-            for key, value in company_info.items():
-                if key != 'ticker' and hasattr(company, key):
-                    setattr(company, key, value)
-            company.last_updated = timezone.now()
-            company.save()
-    
-    # Get or create financial data
-    financials = FinancialData.objects.filter(company=company).first()
-    
-    if not financials or (timezone.now() - financials.last_updated).days > 1:
-        # Fetch or update financial data
-        financial_data = fetch_financial_data(ticker)
-        if financial_data:
-            if not financials:
-                financials = FinancialData.objects.create(company=company, **financial_data)
-            else:
-                for key, value in financial_data.items():
-                    if hasattr(financials, key):
-                        setattr(financials, key, value)
-                financials.last_updated = timezone.now()
-                financials.save()
-    
-    return company
+    if not refresh_company(company).ok:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Data for {ticker} could not be refreshed',
+            'freshness': company.freshness(),
+        }, status=502)
+    
+    return JsonResponse({
+        'status': 'success',
+        'message': f'Data for {ticker} refreshed successfully',
+        'freshness': company.freshness(),
+    })
 
 # stock_data/views.py
 def search_suggestions(request):
@@ -124,26 +58,59 @@ def search_suggestions(request):
     if not query or len(query) < 2:
         return JsonResponse({'suggestions': []})
     
-    # Check cache for suggestions
-    cached_search = SearchResult.objects.filter(query__iexact=query).first()
+    # Answered from the local symbol index without waiting on upstream
+    suggestions = search_companies(query)
     
-    if cached_search and not cached_search.is_stale():
-        # Use cached results
-        suggestions = json.loads(cached_search.results_json)
-    else:
-        # Perform new search
-        suggestions = search_companies(query)
+    return JsonResponse({'suggestions': suggestions})
+
+def screener_json(request):
+    """Return a page of companies matching the screen's filters, in sort order."""
+    try:
+        screen = Screen.from_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    try:
+        results, next_cursor = screen.results()
         
-        # Cache the results
-        if suggestions:
-            if cached_search:
-                cached_search.results_json = json.dumps(suggestions)
-                cached_search.last_updated = timezone.now()
-                cached_search.save()
-            else:
-                SearchResult.objects.create(
-                    query=query,
-                    results_json=json.dumps(suggestions),
-                )
+        return JsonResponse({
+            'results': results,
+            'next_cursor': next_cursor,
+            'sort': screen.sort_string,
+            'limit': screen.limit,
+        })
+    
+    except Exception as e:
+        logger.error(f"Error running screen: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+def cache_stats_json(request):
+    """Return company page cache hit rates."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    return JsonResponse(cache_stats())
+
+def scheduler_status_json(request):
+    """Return the refresh queue depth and lag, and the scheduler's last cycle."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    return JsonResponse(scheduler_status())
+
+def _metrics_scraper(request):
+    """Check if a request comes from a configured scraper, which does not log in."""
+    token = getattr(settings, 'STOCK_DATA_METRICS_TOKEN', None)
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+        return True
+    # Behind a reverse proxy on the same host every request comes from its address,
+    # so the allowlist is empty unless the deployment opts in
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'STOCK_DATA_METRICS_ALLOWED_IPS', [])
+
+def metrics(request):
+    """Export upstream, database and cache metrics in the Prometheus text format."""
+    if not request.user.is_staff and not _metrics_scraper(request):
+        return HttpResponse('Permission denied', status=403, content_type='text/plain')
     
-    return JsonResponse({'suggestions': suggestions})
\ No newline at end of file
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
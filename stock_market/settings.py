@@ -53,13 +53,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'stock_data.middleware.ProfilingMiddleware',
+    'stock_data.middleware.FetchContextMiddleware',
 ]
 
 ROOT_URLCONF = 'stock_market.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, with rendering time reported by ProfilingMiddleware
+        'BACKEND': 'stock_data.profiling.ProfiledTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,6 +87,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Lets the shared async executor's threads reuse their connection between calls
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so a writer waits for it
+            # (up to timeout seconds) instead of failing to upgrade a read lock midway
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -106,14 +117,66 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Computed company page payloads are kept in the default cache. Local memory works for a
+# single process; with several server processes use a shared backend so refreshes made by
+# the update commands invalidate every process, for example:
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379',
+#     }
+# }
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Cache alias used for company payloads and their hit rate counters
+STOCK_DATA_CACHE = 'default'
+
+# Company data is kept fresh by the long-running run_refresh_scheduler command, which
+# refreshes the most viewed and most stale companies first within a fixed upstream budget
 CRONJOBS = [
-    # Run update_stock_data every 6 hours for all stocks
-    ('0 */6 * * *', 'django.core.management.call_command', ['update_stock_data']),
-    
-    # Run update for popular companies more frequently (every 30 minutes)
-    ('*/30 * * * *', 'django.core.management.call_command', ['update_popular_stocks']),
+    # Delete expired search results daily
+    ('15 3 * * *', 'django.core.management.call_command', ['purge_search_cache']),
+    # Refreshes keep industry peers current; this catches up the sector-wide fallback peers
+    ('45 3 * * *', 'django.core.management.call_command', ['rebuild_peers']),
 ]
 
+# Stock data freshness
+# Serve stale company data immediately and refresh it in the background
+STOCK_DATA_STALE_WHILE_REVALIDATE = False
+
+# Company data older than this is always refreshed before it is served
+STOCK_DATA_MAX_STALENESS_HOURS = 24 * 7
+
+# Threads available for background refreshes in each server process
+STOCK_DATA_BACKGROUND_WORKERS = 2
+
+# Threads shared by async views for upstream and database calls in each server process.
+# Under ASGI (e.g. uvicorn stock_market.asgi:application) this bounds how many slow
+# upstream calls one worker waits on at once
+STOCK_DATA_ASYNC_WORKERS = 32
+
+# Scrapers of /metrics that do not log in as staff send this as a bearer token
+STOCK_DATA_METRICS_TOKEN = None
+# Addresses also allowed to scrape /metrics; leave empty behind a reverse proxy on the same host
+STOCK_DATA_METRICS_ALLOWED_IPS = []
+
+# Request profiling: a Server-Timing header splitting each response into get_company_data,
+# yfinance, pandas, db and template time. Slower requests are logged with their breakdown,
+# and staff can add ?profile=1 to a URL to capture that request with cProfile
+STOCK_DATA_PROFILING = False
+STOCK_DATA_SLOW_REQUEST_MS = 1000
+# Fraction of all requests captured with cProfile, written to STOCK_DATA_PROFILE_DIR
+STOCK_DATA_PROFILE_SAMPLE_RATE = 0
+STOCK_DATA_PROFILE_DIR = None
+
+# Directory of recorded yfinance responses (see record_upstream_fixtures) to serve instead of
+# calling Yahoo; run_benchmarks sets it for its own run. Leave unset in production
+STOCK_DATA_UPSTREAM_FIXTURES = None
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -1,6 +1,7 @@
 # stock_market/urls.py
 from django.contrib import admin
 from django.urls import include, path
+from stock_data.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -8,4 +9,5 @@ urlpatterns = [
     path('stock/', include('stock_data.urls')),
     path('company/', include('company_profiles.urls')),
     path('charts/', include('charts.urls')),
+    path('metrics', metrics, name='metrics'),
 ]
\ No newline at end of file